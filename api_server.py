@@ -1,11 +1,20 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import RedirectResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import TYPE_CHECKING, Any, Dict, Optional, List, Literal
 import asyncio
+import hmac
+import json
+import os
+import time
 from agency import create_agency
 import uvicorn
 
+if TYPE_CHECKING:
+    from city_explorer.directory import DirectoryEngine, SearchQuery, SearchResult
+    from city_explorer.directory.registry import Dataset
+
 # Initialize FastAPI app
 app = FastAPI(
     title="BuyBlack City Guide API",
@@ -37,12 +46,44 @@ class ChatResponse(BaseModel):
 
 class BusinessSearchRequest(BaseModel):
     category: str
+    city: str = "Oakland"
     keyword: Optional[str] = ""
     limit: Optional[int] = 10
+    sort: Literal["relevance", "rating", "distance", "least_busy"] = "relevance"
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    radius_m: Optional[float] = None
+    open_at: Optional[str] = None  # "now" or ISO datetime, e.g. "2025-06-14T18:30"
+    max_busyness: Optional[int] = None  # 0-100, typical crowd level at open_at
+    attributes: List[str] = []  # e.g. ["wheelchair accessible", "vegan"]
+    cursor: Optional[str] = None  # next_cursor of the previous page
 
 class BusinessSearchResponse(BaseModel):
     businesses: List[dict]
-    total_found: int
+    total_found: int  # all matches, not just this page
+    next_cursor: Optional[str] = None  # pass back as cursor for the next page
+    facets: dict = {}  # {"category"|"subtypes"|"borough": [{"value", "count"}]} over all matches
+
+class BusinessUpsertRequest(BaseModel):
+    city: str = "Oakland"
+    id: Optional[int] = None  # existing business to change
+    place_id: Optional[str] = None  # or the Google place of a business to change or add
+    fields: Dict[str, Any]  # e.g. {"phone": "+1 510-555-0100"} or {"business_status": "CLOSED_PERMANENTLY"}
+
+# Most queries accepted by /api/businesses/search/batch
+MAX_BATCH_QUERIES = 20
+
+class BusinessBatchSearchRequest(BaseModel):
+    queries: List[BusinessSearchRequest]
+
+class BusinessBatchSearchResult(BusinessSearchResponse):
+    error: Optional[str] = None  # set when this query's arguments were invalid
+    elapsed_ms: float  # time spent on this query alone
+
+class BusinessBatchSearchResponse(BaseModel):
+    results: List[BusinessBatchSearchResult]  # one per query, in request order
+    shared_ms: float  # category matching shared by all queries
+    elapsed_ms: float
 
 class ItineraryRequest(BaseModel):
     city: str
@@ -56,6 +97,10 @@ class ItineraryResponse(BaseModel):
     duration_days: int
 
 # API Endpoints
+#
+# Directory endpoints are plain functions: FastAPI runs them in its thread
+# pool, so index builds, snapshot rebuilds, log fsyncs and ranking never
+# block the event loop that serves every other request.
 @app.get("/")
 async def root():
     return {
@@ -101,31 +146,91 @@ async def chat_with_agency(request: ChatRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
+def _search_query(request: BusinessSearchRequest) -> "SearchQuery":
+    """Engine query for a search request; raises ValueError on inconsistent arguments"""
+    from dataclasses import replace
+    from city_explorer.tools.BuyBlackDirectorySearch import BuyBlackDirectorySearch
+    
+    tool = BuyBlackDirectorySearch(
+        category=request.category,
+        keyword=request.keyword,
+        limit=request.limit,
+        sort=request.sort,
+        lat=request.lat,
+        lon=request.lon,
+        radius_m=request.radius_m,
+        open_at=request.open_at,
+        max_busyness=request.max_busyness,
+        attributes=request.attributes,
+        city=request.city
+    )
+    return replace(tool.query(), facets=True, cursor=request.cursor)
+
+def _search_response_body(businesses: bytes, result: Optional["SearchResult"], **extra: Any) -> bytes:
+    """
+    A BusinessSearchResponse-shaped JSON body around pre-rendered business
+    objects, written directly instead of through the response model
+    """
+    members = {
+        "total_found": result.total if result else 0,
+        "next_cursor": result.next_cursor if result else None,
+        "facets": (result.facets or {}) if result else {},
+        **extra
+    }
+    tail = json.dumps(members, ensure_ascii=False, allow_nan=False, separators=(",", ":"))[1:]
+    return b'{"businesses":' + businesses + b"," + tail.encode("utf-8")
+
 @app.post("/api/businesses/search", response_model=BusinessSearchResponse)
-async def search_businesses(request: BusinessSearchRequest):
+def search_businesses(request: BusinessSearchRequest):
     """Search for Black-owned businesses by category"""
     try:
-        # Import the tool directly
-        from city_explorer.tools.BuyBlackDirectorySearch import BuyBlackDirectorySearch
+        from city_explorer.tools.BuyBlackDirectorySearch import search_directory_json
         
-        tool = BuyBlackDirectorySearch(
-            category=request.category,
-            keyword=request.keyword,
-            limit=request.limit
-        )
+        # Inconsistent location/sort/time arguments, unknown cities or
+        # attributes and stale cursors are client errors
+        try:
+            businesses, result = search_directory_json(_search_query(request))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        results = tool.run()
+        return Response(content=_search_response_body(businesses, result), media_type="application/json")
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching businesses: {str(e)}")
+
+@app.post("/api/businesses/search/batch", response_model=BusinessBatchSearchResponse)
+def search_businesses_batch(request: BusinessBatchSearchRequest):
+    """Run several business searches in one call; categories shared between them are matched once"""
+    if not 0 < len(request.queries) <= MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {MAX_BATCH_QUERIES} queries")
+    try:
+        from city_explorer.tools.BuyBlackDirectorySearch import search_directory_batch
         
-        if isinstance(results, list):
-            return BusinessSearchResponse(
-                businesses=results,
-                total_found=len(results)
-            )
-        else:
-            return BusinessSearchResponse(
-                businesses=[],
-                total_found=0
-            )
+        started = time.perf_counter()
+        # Invalid queries get an error entry instead of failing the batch.
+        queries, errors = [], {}
+        for position, query in enumerate(request.queries):
+            try:
+                queries.append(_search_query(query))
+            except ValueError as e:
+                errors[position] = str(e)
+        entries, shared_ms = search_directory_batch(queries)
+        
+        results = []
+        answered = iter(entries)
+        for position in range(len(request.queries)):
+            if position in errors:
+                results.append(_search_response_body(b"[]", None, error=errors[position], elapsed_ms=0.0))
+                continue
+            entry = next(answered)
+            results.append(_search_response_body(
+                entry['businesses'], entry['result'], error=entry['error'], elapsed_ms=entry['elapsed_ms']
+            ))
+        timing = json.dumps({"shared_ms": shared_ms, "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)})
+        body = b'{"results":[' + b",".join(results) + b"]," + timing[1:].encode("utf-8")
+        return Response(content=body, media_type="application/json")
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error searching businesses: {str(e)}")
@@ -158,27 +263,151 @@ async def create_itinerary(request: ItineraryRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating itinerary: {str(e)}")
 
+def _city_engine(city: str) -> "DirectoryEngine":
+    """Directory engine for a city, or 404 for cities without a directory"""
+    from city_explorer.directory import get_engine
+    
+    try:
+        return get_engine(city)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 @app.get("/api/businesses/categories")
-async def get_business_categories():
-    """Get available business categories"""
+def get_business_categories(city: str = "Oakland"):
+    """Get business categories, subtypes and boroughs present in the directory, with counts"""
+    facets = _city_engine(city).facets.counts()
     return {
-        "categories": [
-            "restaurant", "bakery", "coffee", "barber", "beauty", "retail",
-            "fitness", "art", "entertainment", "professional", "automotive",
-            "health", "education", "technology", "real estate"
-        ]
+        "categories": [facet["value"] for facet in facets["category"]],
+        "facets": facets
     }
 
+@app.get("/api/businesses/autocomplete")
+def autocomplete_businesses(q: str, limit: int = 8, city: str = "Oakland"):
+    """Typeahead suggestions (business names, categories, subtypes, boroughs) for a prefix"""
+    return {"query": q, "suggestions": _city_engine(city).autocomplete.suggest(q, min(max(limit, 0), 25))}
+
+@app.get("/api/businesses/attributes")
+def get_business_attributes(city: str = "Oakland"):
+    """Get filterable business attributes with how many businesses have each"""
+    return {"attributes": _city_engine(city).attributes.counts()}
+
+@app.get("/api/metrics/search-cache")
+def get_search_cache_metrics(city: str = "Oakland"):
+    """Hit/miss/eviction counters and size of the directory search result cache"""
+    return _city_engine(city).cache.stats()
+
+@app.get("/api/metrics/tool-tokens")
+async def get_tool_token_metrics():
+    """Tokens sent to the model per agent tool call, compact against uncompacted output"""
+    from city_explorer.directory.tool_output import token_meter
+    
+    return token_meter.stats()
+
+@app.get("/api/metrics/places")
+def get_places_metrics():
+    """Google Places requests, enrichment latency-budget overruns and circuit breaker state"""
+    from city_explorer.places import get_enricher
+    
+    return get_enricher().stats()
+
+@app.get("/api/metrics/coalescing")
+async def get_coalescing_metrics():
+    """Upstream calls asked for, made and saved by coalescing identical concurrent calls, per upstream"""
+    from city_explorer.places import flight_meter
+    
+    return flight_meter.stats()
+
+@app.get("/api/metrics/memory")
+def get_memory_metrics():
+    """This worker's resident memory and each loaded city's heap, mapped and disk-only bytes"""
+    from city_explorer.directory import get_registry
+    
+    return get_registry().memory_report()
+
+@app.get("/api/businesses/{business_id}")
+def get_business(business_id: int, city: str = "Oakland", details: bool = False):
+    """
+    Get one business by its stable id (the 'id' of search results). With
+    details=true the photos, links and other detail-view fields are included.
+    """
+    engine = _city_engine(city)
+    row = engine.store.row_of(business_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"No business with id {business_id}")
+    extras = [("details", engine.store.details(row))] if details else ()
+    return Response(content=engine.records.fragment(row, extras=extras), media_type="application/json")
+
+@app.get("/api/links/{ref}")
+def expand_business_link(ref: str, city: str = "Oakland"):
+    """Redirect a short link ref from the agent's compact results to the business's website or map"""
+    from city_explorer.directory.tool_output import expand_link
+    
+    url = expand_link(_city_engine(city), ref)
+    if not url:
+        raise HTTPException(status_code=404, detail=f"No link for ref '{ref}'")
+    return RedirectResponse(url, status_code=307)
+
 @app.get("/api/cities")
-async def get_supported_cities():
-    """Get supported cities"""
+def get_supported_cities():
+    """Get cities with a business directory, and which are loaded in this worker"""
+    from city_explorer.directory import get_registry
+    
+    cities = get_registry().stats()
     return {
-        "cities": [
-            "Oakland", "San Francisco", "Berkeley", "Richmond", "Fremont"
-        ],
-        "note": "Currently focused on Oakland with plans to expand to other Bay Area cities"
+        "cities": [city["city"] for city in cities],
+        "loaded": [city["city"] for city in cities if city["loaded"]]
     }
 
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Directory edits need the X-Admin-Token header to match DIRECTORY_ADMIN_TOKEN; unset disables them"""
+    expected = os.getenv("DIRECTORY_ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Directory editing is disabled on this server")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def _city_dataset(city: str) -> "Dataset":
+    """Registry dataset for a city, or 404 for cities without a directory"""
+    from city_explorer.directory import get_registry
+    
+    try:
+        return get_registry().dataset(city)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.put("/api/admin/businesses", dependencies=[Depends(require_admin)])
+def upsert_business(request: BusinessUpsertRequest):
+    """Change fields of a business, or add a new one by place_id, without re-indexing the directory"""
+    dataset = _city_dataset(request.city)
+    try:
+        business_id = dataset.upsert(request.fields, business_id=request.id, place_id=request.place_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if business_id is None:
+        raise HTTPException(status_code=404, detail=f"No business with id {request.id}")
+    engine = dataset.engine
+    row = engine.store.row_of(business_id)
+    if row is None:
+        # Deleted again by a concurrent edit
+        raise HTTPException(status_code=404, detail=f"No business with id {business_id}")
+    return Response(content=engine.records.fragment(row), media_type="application/json")
+
+@app.delete("/api/admin/businesses/{business_id}", dependencies=[Depends(require_admin)])
+def delete_business(business_id: int, city: str = "Oakland"):
+    """Remove a business from the directory"""
+    if not _city_dataset(city).delete(business_id):
+        raise HTTPException(status_code=404, detail=f"No business with id {business_id}")
+    return {"deleted": business_id}
+
+@app.post("/api/admin/directory/compact", dependencies=[Depends(require_admin)])
+def compact_directory(city: str = "Oakland"):
+    """Fold logged edits into a fresh snapshot now instead of waiting for the watcher"""
+    dataset = _city_dataset(city)
+    pending = dataset.pending_changes()
+    seq = dataset.compact()
+    return {"compacted": seq is not None, "changes": pending if seq is not None else 0,
+            "pending": dataset.pending_changes()}
+
 if __name__ == "__main__":
     uvicorn.run(
         "api_server:app",
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Compare loading the business directory from the raw CSV against the compiled
+memory-mapped snapshot.
+
+Each variant runs in a fresh subprocess so cold-start time and peak RSS are
+measured the way a new worker would see them.
+
+Usage:
+    python benchmarks/bench_directory_store.py [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CSV_LOAD = """
+import pandas as pd
+from city_explorer.directory import DEFAULT_CSV
+df = pd.read_csv(DEFAULT_CSV, low_memory=False)
+mask = df['category'].str.contains('bakery', case=False, na=False)
+df[mask].sort_values(by='rating', ascending=False).head(5)
+"""
+
+SNAPSHOT_LOAD = """
+from city_explorer.directory import load_store
+df = load_store().frame()
+mask = df['category'].str.contains('bakery', case=False, na=False)
+df[mask].sort_values(by='rating', ascending=False).head(5)
+"""
+
+# Wraps each variant: time only the load + first query, report peak RSS in KB.
+HARNESS = """
+import json, resource, time
+import pandas, numpy
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"seconds": elapsed, "max_rss_kb": max_rss_kb}}))
+"""
+
+
+def _run_variant(body: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", HARNESS.format(body=body)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # Make sure the snapshot exists so we time loading, not compiling.
+    _run_variant("from city_explorer.directory import load_store; load_store()")
+
+    for label, body in (("csv", CSV_LOAD), ("snapshot", SNAPSHOT_LOAD)):
+        samples = [_run_variant(body) for _ in range(args.runs)]
+        seconds = [s["seconds"] for s in samples]
+        rss = [s["max_rss_kb"] for s in samples]
+        print(
+            f"{label:>9}: cold load+query median "
+            f"{statistics.median(seconds) * 1000:7.1f} ms, "
+            f"peak RSS median {statistics.median(rss) / 1024:6.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
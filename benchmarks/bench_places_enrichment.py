@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Compare serial Google Places enrichment against the concurrent pipeline.
+
+Every variant runs against a local stub Places server with a fixed response
+latency (``tests/places_stub.py``, also behind the tests' ``places_server``
+fixture), so no API key or network access is needed:
+
+- serial text search, one blocking request at a time (the old approach)
+- pooled text search, for businesses without a place_id
+- pooled Place Details by place_id, with a cold and then a warm cache
+
+The stub misses the first text-search query of some businesses so the
+fallback queries are exercised, and can stall one business to show the
+request's latency budget at work.
+
+Usage:
+    python benchmarks/bench_places_enrichment.py [--rows 10] [--latency-ms 150]
+        [--stall]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from city_explorer.directory import SearchQuery, get_engine  # noqa: E402
+from city_explorer.places import (
+    PlacesEnricher,
+    place_fields,
+    search_queries,
+)  # noqa: E402
+from city_explorer.places.enrichment import ENRICHMENT_FLAG  # noqa: E402
+from tests.places_stub import STALL_NAME_PREFIX, stub_server  # noqa: E402
+
+
+def enrich_serially(base_url: str, businesses: list, city: str) -> list:
+    """The previous approach: one blocking request at a time, a new connection each"""
+    results = []
+    for business in businesses:
+        enhanced = {}
+        for query in search_queries(business["name"], business.get("address"), city):
+            response = httpx.get(
+                f"{base_url}/textsearch/json",
+                params={"query": query, "key": "stub"},
+                timeout=10,
+            )
+            data = response.json()
+            if data.get("status") == "OK" and data.get("results"):
+                enhanced = place_fields(data["results"][0])
+                break
+        results.append(enhanced)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument(
+        "--stall", action="store_true", help="make one business's lookups very slow"
+    )
+    args = parser.parse_args()
+
+    server = stub_server(args.latency_ms / 1000)
+    base_url = server.base_url
+    engine = get_engine()
+    result = engine.search(SearchQuery(category="restaurant", limit=args.rows))
+    businesses = engine.records.businesses(result)
+    place_ids = [engine.store.value(row, "place_id") for row in result.rows]
+    if args.stall and businesses:
+        businesses[0]["name"] = place_ids[0] = STALL_NAME_PREFIX + businesses[0]["name"]
+
+    def report(label: str, started: float, enriched: list, requests: int) -> None:
+        done = sum(bool(e) and ENRICHMENT_FLAG not in e for e in enriched)
+        print(
+            f"{label:>22}: {(time.perf_counter() - started) * 1000:7.1f} ms, "
+            f"{done}/{len(businesses)} enriched, {requests} requests"
+        )
+
+    if not args.stall:
+        started = time.perf_counter()
+        report(
+            "serial text search",
+            started,
+            enrich_serially(base_url, businesses, "Oakland"),
+            -1,
+        )
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        enricher = PlacesEnricher(
+            base_url=base_url, cache_path=os.path.join(cache_dir, "places.sqlite")
+        )
+        variants = [
+            ("pooled text search", None),
+            ("details, cold cache", place_ids),
+            ("details, warm cache", place_ids),
+        ]
+        for label, ids in variants:
+            before = enricher.requests
+            started = time.perf_counter()
+            enriched = enricher.enrich(
+                businesses, city="Oakland", api_key="stub", place_ids=ids
+            )
+            report(label, started, enriched, enricher.requests - before)
+        enricher.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
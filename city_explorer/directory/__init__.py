@@ -0,0 +1,66 @@
+from .snapshot import build_snapshot, DEFAULT_CSV, DEFAULT_SNAPSHOT_DIR
+from .ingest import canonicalize, business_id
+from .store import BusinessStore, load_store
+from .text_index import TextIndex
+from .ranking import Ranker, SORT_OPTIONS
+from .geo import GeoIndex, haversine_m
+from .hours import HoursIndex, parse_open_at
+from .crowds import CrowdIndex
+from .attributes import AttributeIndex
+from .facets import FacetIndex
+from .autocomplete import Autocomplete
+from .cache import ResultCache
+from .records import BusinessRecords
+from .fuzzy import FuzzyIndex
+from .query import SearchQuery, SearchResult
+from .engine import DirectoryEngine
+from .updates import ChangeLog, compact_changes
+from .memory import memory_report
+from .registry import (
+    DEFAULT_CITY,
+    DatasetRegistry,
+    city_name,
+    city_slug,
+    discover_cities,
+    get_engine,
+    get_registry,
+    get_store,
+)
+
+__all__ = [
+    "build_snapshot",
+    "DEFAULT_CSV",
+    "DEFAULT_SNAPSHOT_DIR",
+    "canonicalize",
+    "business_id",
+    "BusinessStore",
+    "load_store",
+    "TextIndex",
+    "Ranker",
+    "SORT_OPTIONS",
+    "GeoIndex",
+    "haversine_m",
+    "HoursIndex",
+    "parse_open_at",
+    "CrowdIndex",
+    "AttributeIndex",
+    "FacetIndex",
+    "Autocomplete",
+    "ResultCache",
+    "BusinessRecords",
+    "FuzzyIndex",
+    "SearchQuery",
+    "SearchResult",
+    "DirectoryEngine",
+    "ChangeLog",
+    "compact_changes",
+    "memory_report",
+    "DEFAULT_CITY",
+    "DatasetRegistry",
+    "city_name",
+    "city_slug",
+    "discover_cities",
+    "get_engine",
+    "get_registry",
+    "get_store",
+]
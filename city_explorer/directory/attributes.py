@@ -0,0 +1,175 @@
+"""
+Bitset index over the boolean flags in the ``about`` JSON column.
+
+``about`` nests flags such as ``{"Accessibility": {"Wheelchair accessible
+entrance": true}, "Service options": {"Takeout": true}}``. At snapshot build
+time every true flag becomes one packed bitset over all businesses (one bit
+per row), so structured filters are a handful of byte-wise ORs and ANDs over
+``rows / 8`` bytes each, evaluated before any text matching. Live edits set
+and clear single bits in an in-memory copy that grows a byte at a time.
+"""
+
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Outscraper repeats some flags under "Other"; prefer the specific group.
+_FALLBACK_GROUP = "Other"
+
+
+def parse_about(raw: Optional[str]) -> List[Tuple[str, str]]:
+    """(group, attribute) pairs for every flag set to true in an ``about`` value"""
+    if not raw:
+        return []
+    try:
+        groups = json.loads(raw)
+    except (TypeError, ValueError):
+        return []
+    if not isinstance(groups, dict):
+        return []
+    flags = []
+    for group, values in groups.items():
+        if isinstance(values, dict):
+            flags.extend(
+                (group, name) for name, value in values.items() if value is True
+            )
+    return flags
+
+
+def build_attribute_bitsets(
+    values: Sequence[Optional[str]],
+) -> Tuple[List[str], List[str], np.ndarray]:
+    """Attribute names, their groups and a packed (attributes, ceil(rows / 8)) bitset"""
+    groups: Dict[str, str] = {}
+    members: Dict[str, List[int]] = {}
+    for row, raw in enumerate(values):
+        for group, name in parse_about(raw):
+            if name not in groups or groups[name] == _FALLBACK_GROUP:
+                groups[name] = group
+            rows = members.setdefault(name, [])
+            if not rows or rows[-1] != row:
+                rows.append(row)
+
+    names = sorted(members)
+    bits = np.zeros((len(names), len(values)), dtype=bool)
+    for i, name in enumerate(names):
+        bits[i, members[name]] = True
+    return names, [groups[n] for n in names], np.packbits(bits, axis=1)
+
+
+class AttributeIndex:
+    """Structured attribute filters over packed per-attribute bitsets"""
+
+    def __init__(
+        self, bitsets: np.ndarray, names: List[str], groups: List[str], size: int
+    ):
+        self.bitsets = bitsets
+        self.names = list(names)
+        self.groups = list(groups)
+        self.size = size
+        self._lower = [n.lower() for n in names]
+        self._counts = (
+            np.unpackbits(np.asarray(bitsets), axis=1, count=size).sum(axis=1)
+            if len(names)
+            else np.zeros(0, dtype=np.int64)
+        )
+        # Writable copy with spare capacity, made on the first live edit
+        self._buffer: Optional[np.ndarray] = None
+
+    def _writable(self, attributes: int, nbytes: int) -> np.ndarray:
+        buffer = self._buffer
+        if buffer is None or buffer.shape[0] < attributes or buffer.shape[1] < nbytes:
+            shape = (
+                max(attributes, 2 * (buffer.shape[0] if buffer is not None else 0)),
+                max(
+                    nbytes,
+                    2
+                    * (
+                        buffer.shape[1] if buffer is not None else self.bitsets.shape[1]
+                    ),
+                ),
+            )
+            grown = np.zeros(shape, dtype=np.uint8)
+            grown[: self.bitsets.shape[0], : self.bitsets.shape[1]] = self.bitsets
+            buffer = self._buffer = grown
+        self.bitsets = buffer[:attributes, :nbytes]
+        return buffer
+
+    def add_row(self, row: int, flags: Sequence[Tuple[str, str]]) -> None:
+        """Set the flags of one appended row (``row`` must be the next row id)"""
+        new: Dict[str, Tuple[str, str]] = {}
+        for group, name in flags:
+            if name.lower() not in self._lower:
+                new.setdefault(name.lower(), (group, name))
+        # Grow the bitsets before a new name can be resolved to a bitset row.
+        self.size = row + 1
+        buffer = self._writable(len(self.names) + len(new), (self.size + 7) // 8)
+        self._counts = np.append(
+            self._counts, np.zeros(len(new), dtype=self._counts.dtype)
+        )
+        for lower, (group, name) in new.items():
+            self.names.append(name)
+            self.groups.append(group)
+            self._lower.append(lower)
+        ids = [self._lower.index(name.lower()) for _, name in flags]
+        for i in set(ids):
+            buffer[i, row >> 3] |= 0x80 >> (row & 7)
+            self._counts[i] += 1
+
+    def clear_row(self, row: int) -> None:
+        """Unset every flag of ``row``, e.g. once it was replaced or deleted"""
+        byte, bit = row >> 3, np.uint8(0x80 >> (row & 7))
+        ids = np.flatnonzero(self.bitsets[:, byte] & bit)
+        if not len(ids):
+            return
+        buffer = self._writable(len(self.names), self.bitsets.shape[1])
+        buffer[ids, byte] &= ~bit
+        self._counts[ids] -= 1
+
+    def resolve(self, term: str) -> List[int]:
+        """
+        Attribute ids for a requested term: an exact (case-insensitive) name,
+        otherwise every attribute whose name contains it ("wheelchair").
+        """
+        needle = term.strip().lower()
+        if needle in self._lower:
+            return [self._lower.index(needle)]
+        return [i for i, name in enumerate(self._lower) if needle and needle in name]
+
+    def packed_mask(self, terms: Sequence[str]) -> np.ndarray:
+        """Packed bitset of rows having every term (any attribute matching it)"""
+        resolved = []
+        for term in terms:
+            ids = self.resolve(term)
+            if not ids:
+                raise ValueError(
+                    f"Unknown attribute '{term}'. "
+                    "See /api/businesses/attributes for available attributes."
+                )
+            resolved.append(ids)
+        # Read once, after resolving: ``add_row`` grows the bitsets before adding names.
+        bitsets = self.bitsets
+        combined = np.full(bitsets.shape[1], 0xFF, dtype=np.uint8)
+        for ids in resolved:
+            combined &= np.bitwise_or.reduce(bitsets[ids], axis=0)
+        return combined
+
+    def rows(self, terms: Sequence[str]) -> np.ndarray:
+        """Sorted row ids having every requested attribute"""
+        mask = np.unpackbits(self.packed_mask(terms), count=self.size).astype(bool)
+        return np.flatnonzero(mask).astype(np.int32)
+
+    def counts(self, rows: Optional[np.ndarray] = None) -> List[Dict[str, object]]:
+        """Every attribute with its business count (optionally among ``rows``)"""
+        if rows is None:
+            counts = self._counts
+        else:
+            bits = np.unpackbits(np.asarray(self.bitsets), axis=1, count=self.size)
+            counts = bits[:, rows].sum(axis=1)
+        listing = [
+            {"name": name, "group": group, "count": int(count)}
+            for name, group, count in zip(self.names, self.groups, counts)
+            if count
+        ]
+        return sorted(listing, key=lambda a: (-a["count"], a["name"]))
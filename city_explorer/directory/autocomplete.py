@@ -0,0 +1,166 @@
+"""
+Typeahead suggestions over business names, categories, subtypes and boroughs.
+
+Every suggestion is normalized once at load time and each of its word-start
+suffixes ("jollof kitchen", "kitchen") becomes a key in one sorted array, so
+a keystroke is two binary searches for the prefix range plus a partial sort
+of that range by popularity (review count). Nothing here touches pandas.
+
+Live edits never copy the load-time array. New labels' suffixes go into a
+small sorted delta searched alongside it, so an edit costs time in the size
+of that delta. Compaction builds a fresh engine, and with it one merged
+array. Each label counts the businesses carrying it and is hidden once
+none do.
+"""
+
+import re
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .facets import facet_values
+
+_SEPARATOR_RE = re.compile(r"[\W_]+")
+
+# Suggestion kind -> facet whose values it is drawn from
+FACET_KINDS = {"category": "category", "subtype": "subtypes", "borough": "borough"}
+
+DEFAULT_SUGGESTIONS = 8
+
+
+def normalize(text: str) -> str:
+    """Lowercase words separated by single spaces"""
+    return _SEPARATOR_RE.sub(" ", text.lower()).strip()
+
+
+class Autocomplete:
+    """Sorted word-start suffix array over suggestion labels"""
+
+    def __init__(self, entries: Sequence[Tuple[str, str, float]]):
+        # Merge repeated (kind, label) pairs, keeping the higher popularity.
+        merged: Dict[Tuple[str, str], float] = {}
+        # How many entries (businesses) carry each label; a label is hidden at zero.
+        self._refs: Dict[Tuple[str, str], int] = {}
+        for text, kind, popularity in entries:
+            if text and normalize(text):
+                key = (kind, text)
+                merged[key] = max(merged.get(key, 0.0), popularity)
+                self._refs[key] = self._refs.get(key, 0) + 1
+        self.kinds = [kind for kind, _ in merged]
+        self.labels = [text for _, text in merged]
+        self.popularity = np.array(list(merged.values()), dtype=np.float64)
+        self._owner_of = {key: owner for owner, key in enumerate(merged)}
+
+        suffixes: List[Tuple[str, int]] = []
+        for owner, label in enumerate(self.labels):
+            suffixes.extend(_suffixes(label, owner))
+        suffixes.sort()
+        # Sorted suffixes and the label each belongs to, from load time
+        self.suffixes = (
+            [key for key, _ in suffixes],
+            np.array([owner for _, owner in suffixes], dtype=np.int32),
+        )
+        # The same for labels added by live edits, replaced as a whole
+        self.delta: Tuple[Tuple[str, ...], Tuple[int, ...]] = ((), ())
+
+    def add(self, text: Optional[str], kind: str, popularity: float) -> None:
+        """Add one label occurrence, e.g. the name of a newly added business"""
+        if not text or not normalize(text):
+            return
+        key = (kind, text)
+        self._refs[key] = self._refs.get(key, 0) + 1
+        owner = self._owner_of.get(key)
+        if owner is not None:
+            self.popularity[owner] = max(self.popularity[owner], popularity)
+            return
+        owner = self._owner_of[key] = len(self.labels)
+        self.kinds.append(kind)
+        self.labels.append(text)
+        self.popularity = np.append(self.popularity, popularity)
+        merged_delta = sorted(list(zip(*self.delta)) + _suffixes(text, owner))
+        self.delta = (
+            tuple(k for k, _ in merged_delta),
+            tuple(o for _, o in merged_delta),
+        )
+
+    def discard(self, text: Optional[str], kind: str) -> None:
+        """Drop one occurrence of a label, hiding it once none are left"""
+        key = (kind, text or "")
+        if self._refs.get(key, 0) <= 0:
+            return
+        self._refs[key] -= 1
+        if not self._refs[key]:
+            self.popularity[self._owner_of[key]] = -1.0
+
+    def suggest(
+        self,
+        prefix: str,
+        limit: int = DEFAULT_SUGGESTIONS,
+        kinds: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, object]]:
+        """Most popular labels with a word starting with ``prefix``"""
+        needle = normalize(prefix)
+        if not needle or limit <= 0:
+            return []
+        found = []
+        for keys, labels in (self.suffixes, self.delta):
+            lo = bisect_left(keys, needle)
+            hi = bisect_left(keys, needle + "\uffff", lo)
+            found.append(np.asarray(labels[lo:hi], dtype=np.int32))
+        owners = np.unique(np.concatenate(found))
+        owners = owners[self.popularity[owners] >= 0]
+        if kinds is not None:
+            owners = (
+                owners[[self.kinds[i] in kinds for i in owners.tolist()]]
+                if len(owners)
+                else owners
+            )
+        if len(owners) > limit:
+            owners = owners[
+                np.argpartition(-self.popularity[owners], limit - 1)[:limit]
+            ]
+        ranked = sorted(
+            owners.tolist(), key=lambda i: (-self.popularity[i], self.labels[i])
+        )
+        return [
+            {
+                "text": self.labels[i],
+                "kind": self.kinds[i],
+                "popularity": int(self.popularity[i]),
+            }
+            for i in ranked
+        ]
+
+
+def _suffixes(label: str, owner: int) -> List[Tuple[str, int]]:
+    """Every word-start suffix of ``label``'s normalized form"""
+    norm = normalize(label)
+    starts = [0] + [m.end() for m in re.finditer(" ", norm)]
+    return [(norm[start:], owner) for start in starts]
+
+
+def suggestion_entries(
+    columns: Dict[str, Sequence[Optional[str]]], reviews: np.ndarray
+) -> List[Tuple[str, str, float]]:
+    """
+    (label, kind, popularity) for every business name and every business's
+    facet values; a facet value is as popular as the reviews of all
+    businesses carrying it.
+    """
+    reviews = np.nan_to_num(np.asarray(reviews, dtype=np.float64))
+    entries = [
+        (name, "business", float(reviews[row]))
+        for row, name in enumerate(columns.get("name") or [])
+        if name
+    ]
+    for kind, facet in FACET_KINDS.items():
+        totals: Dict[str, float] = {}
+        carried = []
+        for row, raw in enumerate(columns.get(facet) or []):
+            for value in facet_values(facet, raw):
+                totals[value] = totals.get(value, 0.0) + float(reviews[row])
+                carried.append(value)
+        # One entry per business carrying the value: retiring one keeps it suggested
+        entries.extend((value, kind, totals[value]) for value in carried)
+    return entries
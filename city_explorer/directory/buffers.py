@@ -0,0 +1,42 @@
+"""
+Growable row-aligned arrays for indexes that accept live edits.
+"""
+
+from typing import Any
+
+import numpy as np
+
+
+class RowBuffer:
+    """
+    Appendable copy of a row-aligned array. The buffer doubles when full, so
+    appends are amortized O(1); ``view`` is the filled part. A read-only
+    (memory-mapped) array is only copied on the first append.
+    """
+
+    def __init__(self, initial: np.ndarray):
+        self._buffer = initial
+        self.size = len(initial)
+
+    @property
+    def view(self) -> np.ndarray:
+        return self._buffer[: self.size]
+
+    def extend(self, values: Any) -> np.ndarray:
+        """Append ``values`` (a sequence of rows) and return the new view"""
+        values = np.asarray(values, dtype=self._buffer.dtype)
+        end = self.size + len(values)
+        if end > len(self._buffer) or not self._buffer.flags.writeable:
+            capacity = max(end, 2 * len(self._buffer), 16)
+            buffer = np.empty(
+                (capacity,) + self._buffer.shape[1:], dtype=self._buffer.dtype
+            )
+            buffer[: self.size] = self._buffer[: self.size]
+            self._buffer = buffer
+        self._buffer[self.size : end] = values
+        self.size = end
+        return self.view
+
+    def append(self, value: Any) -> np.ndarray:
+        """Append one row and return the new view"""
+        return self.extend(np.asarray(value, dtype=self._buffer.dtype)[np.newaxis])
@@ -0,0 +1,115 @@
+"""
+Bounded LRU cache for ranked search results.
+
+Entries are compact row-id (and distance) arrays keyed by a normalized
+``SearchQuery``, so differently spelled but equivalent queries and different
+page sizes share one entry. The cache is bounded by entry count and by the
+bytes held in its arrays, counts hits, misses and evictions for scraping,
+and is cleared wholesale when the underlying dataset changes. Each clear
+starts a new generation, and a value computed during an older generation is
+served to its caller but never stored, so a search that raced an edit
+cannot leave a stale ranking behind.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+import numpy as np
+
+CACHE_MAX_ENTRIES = int(os.getenv("DIRECTORY_CACHE_MAX_ENTRIES", "1024"))
+CACHE_MAX_BYTES = int(os.getenv("DIRECTORY_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+V = TypeVar("V")
+
+
+def _nbytes(value: Any) -> int:
+    """Array payload size of a cached value (arrays, tuples of arrays, None)"""
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, tuple):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+class ResultCache(Generic[V]):
+    """Thread-safe LRU cache bounded by entries and array bytes"""
+
+    def __init__(
+        self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[V, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Bumped by every ``invalidate``
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: V, generation: Optional[int] = None) -> None:
+        """Store ``value``, unless its ``generation`` has since been invalidated"""
+        size = _nbytes(value)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if size > self.max_bytes:
+                # Larger than the whole budget: serve it once, never keep it.
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], V]) -> V:
+        """Cached value for ``key``, computing and storing it on a miss"""
+        generation = self.generation
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value, generation)
+        return value
+
+    def invalidate(self) -> None:
+        """Drop every entry, e.g. after the dataset changed"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.invalidations += 1
+            self.generation += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Counters and current size, for metrics scraping"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
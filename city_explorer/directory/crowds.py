@@ -0,0 +1,92 @@
+"""
+Typical busyness per business, weekday and hour.
+
+Outscraper's ``popular_times`` column is a JSON list of per-day histograms.
+At snapshot build time it is decoded into a dense ``(businesses, 7, 24)``
+uint8 array of percentages (Monday first) that workers memory-map and share,
+so a crowd lookup is one array index per candidate instead of a JSON parse.
+Live edits copy the matrix into memory once and append to it.
+"""
+
+import json
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .hours import MINUTES_PER_DAY, WEEKDAYS, local_minutes, minute_of_week
+from .buffers import RowBuffer
+
+# Stored where Google has no histogram for that business/hour
+UNKNOWN = 255
+
+
+def parse_popular_times(raw: Optional[str]) -> Optional[np.ndarray]:
+    """Decode one ``popular_times`` value into a (7, 24) array, or None"""
+    if not raw:
+        return None
+    try:
+        days = json.loads(raw)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(days, list):
+        return None
+
+    grid = np.full((7, 24), UNKNOWN, dtype=np.uint8)
+    for day in days:
+        if not isinstance(day, dict) or day.get("day_text") not in WEEKDAYS:
+            continue
+        weekday = WEEKDAYS.index(day["day_text"])
+        for slot in day.get("popular_times") or []:
+            hour = slot.get("hour")
+            percentage = slot.get("percentage")
+            if (
+                isinstance(hour, int)
+                and 0 <= hour < 24
+                and isinstance(percentage, (int, float))
+            ):
+                grid[weekday, hour] = min(max(int(percentage), 0), 100)
+    return grid
+
+
+def build_crowd_matrix(values: Sequence[Optional[str]]) -> np.ndarray:
+    """Stack every row's histogram; rows without data stay UNKNOWN"""
+    matrix = np.full((len(values), 7, 24), UNKNOWN, dtype=np.uint8)
+    for row, raw in enumerate(values):
+        grid = parse_popular_times(raw)
+        if grid is not None:
+            matrix[row] = grid
+    return matrix
+
+
+class CrowdIndex:
+    """Busyness lookups over the memory-mapped popular-times matrix"""
+
+    def __init__(self, matrix: np.ndarray, zone_codes: np.ndarray, zones: List[str]):
+        self.matrix = matrix
+        self.zones = zones
+        codes = np.asarray(zone_codes)
+        # Unknown zones use the trailing slot (the moment's own clock).
+        self._zone_slot = np.where(codes < 0, len(zones), codes)
+        self._matrix_buffer = RowBuffer(self.matrix)
+        self._slot_buffer = RowBuffer(self._zone_slot)
+
+    def add_row(
+        self, row: int, grid: Optional[np.ndarray], zone: Optional[str]
+    ) -> None:
+        """Add one appended row's (7, 24) histogram, or None when unknown"""
+        if grid is None:
+            grid = np.full((7, 24), UNKNOWN, dtype=np.uint8)
+        self.matrix = self._matrix_buffer.append(grid)
+        slot = self.zones.index(zone) if zone in self.zones else len(self.zones)
+        self._zone_slot = self._slot_buffer.append(slot)
+
+    def busyness(self, moment: datetime, rows: np.ndarray) -> np.ndarray:
+        """Typical busyness (0-100, or UNKNOWN) of ``rows`` at ``moment``"""
+        rows = np.asarray(rows, dtype=np.intp)
+        if not len(rows):
+            return np.empty(0, dtype=np.uint8)
+        per_zone = np.append(local_minutes(moment, self.zones), minute_of_week(moment))
+        minutes = per_zone[self._zone_slot[rows]]
+        day, hour = minutes // MINUTES_PER_DAY, (minutes % MINUTES_PER_DAY) // 60
+        return self.matrix[rows, day, hour]
@@ -0,0 +1,450 @@
+"""
+Query engine over the business store.
+
+``DirectoryEngine`` owns the indexes built from a ``BusinessStore`` at load
+time and answers the category/keyword filters used by the directory search
+tools with arrays of row ids instead of DataFrame masks, ranked by ``Ranker``
+and optionally restricted to a radius through ``GeoIndex`` or to businesses
+open at a given time through ``HoursIndex``, with crowd levels from
+``CrowdIndex``. Keywords that match nothing fall back to ``FuzzyIndex``
+trigram similarity over names and subtypes. Structured ``about`` flags are
+filtered through ``AttributeIndex`` bitsets, and ``FacetIndex`` counts
+category, subtype and borough labels for the whole directory or any
+filtered match set. ``Autocomplete`` serves typeahead suggestions over the
+same labels. ``BusinessRecords`` holds every business's pre-rendered result
+JSON.
+
+One engine exists per loaded city; see ``registry``.
+
+Live edits (``upsert`` and ``delete``, driven by the change log in
+``updates``) append the business's new version as a row to every index and
+retire its old row, so a change costs time proportional to the rows it
+touches rather than a rebuild. Retired and permanently closed rows are
+dropped from every candidate set through ``BusinessStore.alive``.
+
+Searches take no lock while an edit is applied. The new row is added to
+every index while it is still hidden, and only ``BusinessStore.publish``
+makes it reachable (alive, and the row of its business id), so a search
+never follows a row into an index that has not grown yet. Indexes whose
+state spans several arrays replace them in one assignment.
+
+Each normalized query's matches and their sort keys are kept in a bounded
+``ResultCache``, so the match count is free. A page (``SearchQuery.cursor``)
+orders only the best ``offset + limit`` matches (``ranking.top_k``);
+nearest-first pages without a radius walk the ``GeoIndex`` grid outwards.
+"""
+
+import threading
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .attributes import AttributeIndex, parse_about
+from .autocomplete import FACET_KINDS, Autocomplete, suggestion_entries
+from .buffers import RowBuffer
+from .cache import ResultCache
+from .crowds import UNKNOWN, CrowdIndex, parse_popular_times
+from .facets import FACET_COLUMNS, FacetIndex, facet_values
+from .fuzzy import FUZZY_FIELDS, FuzzyIndex
+from .geo import GeoIndex
+from .hours import HoursIndex, format_minute, parse_working_hours
+from .query import SearchQuery, SearchResult, decode_cursor, encode_cursor
+from .ranking import Ranker, top_k
+from .records import BusinessRecords
+from .store import BusinessStore, CategoricalColumn, IntervalColumn
+from .text_index import EMPTY, TextIndex
+
+# Fields searched by the free-text keyword filter
+KEYWORD_FIELDS = ["name", "subtypes", "full_address", "description", "about"]
+
+# Fields matched by the category filter
+CATEGORY_FIELDS = ["category", "type"]
+
+# ``business_status`` values that keep a business out of search results
+CLOSED_STATUSES = {"CLOSED_PERMANENTLY"}
+
+
+def _suggestions(record: Mapping[str, Any]) -> List[Tuple[Optional[str], str]]:
+    """(label, kind) of each suggestion a business adds: its name and facets"""
+    labels: List[Tuple[Optional[str], str]] = [(record.get("name"), "business")]
+    for kind, facet in FACET_KINDS.items():
+        labels.extend(
+            (value, kind)
+            for value in facet_values(facet, record.get(FACET_COLUMNS[facet]))
+        )
+    return labels
+
+
+class Ranking(NamedTuple):
+    """Every match of a query by row id, with what orders them"""
+
+    rows: np.ndarray
+    # Sort keys, higher first; None when nearest-first pages come from the grid walk
+    scores: Optional[np.ndarray]
+    # Distances of rows, when a radius filter computed them
+    distance: Optional[np.ndarray]
+    # True when nothing contained the keyword and rows are fuzzy name matches
+    fuzzy: bool = False
+
+
+class DirectoryEngine:
+    """Indexes and filters for one loaded business store"""
+
+    def __init__(self, store: BusinessStore):
+        self.store = store
+        # Snapshot build this engine (and its cache and cursors) belongs to
+        self.version = store.version
+        fields = {
+            name: store.column(name).to_list()
+            for name in KEYWORD_FIELDS
+            if name in store
+        }
+        self.text_index = TextIndex(fields, len(store))
+        self.fuzzy = FuzzyIndex(
+            {name: fields[name] for name in FUZZY_FIELDS if name in fields}, len(store)
+        )
+        self.ranker = Ranker(store, self.text_index)
+        self.geo = GeoIndex(
+            np.asarray(store.column("latitude")), np.asarray(store.column("longitude"))
+        )
+        intervals = store.column("open_hours")
+        zones = store.column("time_zone")
+        assert isinstance(intervals, IntervalColumn) and isinstance(
+            zones, CategoricalColumn
+        )
+        self.hours = HoursIndex(
+            intervals.rows,
+            intervals.starts,
+            intervals.ends,
+            zones.codes,
+            zones.labels,
+            len(store),
+        )
+        crowds = store.column("crowds")
+        assert isinstance(crowds, np.ndarray)
+        self.crowds = CrowdIndex(crowds, zones.codes, zones.labels)
+        bitsets = store.column("attributes")
+        spec = store.meta["columns"]["attributes"]
+        assert isinstance(bitsets, np.ndarray)
+        self.attributes = AttributeIndex(
+            bitsets, spec["labels"], spec["groups"], len(store)
+        )
+        sources = {
+            source: store.column(source).to_list()
+            for source in FACET_COLUMNS.values()
+            if source in store
+        }
+        self.facets = FacetIndex(sources, len(store))
+        self.autocomplete = Autocomplete(
+            suggestion_entries(
+                {"name": fields.get("name") or [], **sources},
+                np.asarray(store.column("reviews")),
+            )
+        )
+        self.records = BusinessRecords(store)
+        self.cache: ResultCache[Ranking] = ResultCache()
+
+        # Category codes and labels, extended by live edits
+        self._category_labels: Dict[str, List[str]] = {}
+        self._category_codes: Dict[str, RowBuffer] = {}
+        for name in CATEGORY_FIELDS:
+            col = store.column(name)
+            assert isinstance(col, CategoricalColumn)
+            self._category_labels[name] = list(col.labels)
+            self._category_codes[name] = RowBuffer(col.codes)
+        self._write_lock = threading.Lock()
+        if "business_status" in store:
+            statuses = store.column("business_status")
+            assert isinstance(statuses, CategoricalColumn)
+            closed = [
+                code
+                for code, label in enumerate(statuses.labels)
+                if label in CLOSED_STATUSES
+            ]
+            for row in np.flatnonzero(np.isin(statuses.codes, closed)).tolist():
+                self._retire(row)
+
+    def category_masks(self, categories: Sequence[str]) -> Dict[str, np.ndarray]:
+        """
+        Rows matching each of ``categories``, keyed by the stripped lowercase
+        category. Every category is matched against the distinct labels, then
+        all of them are expanded over the row codes in one pass.
+        """
+        needles = list(
+            dict.fromkeys(category.strip().lower() for category in categories)
+        )
+        # A live edit may be half way through appending its row's codes. Its
+        # labels are added first, so a copy taken after the codes covers them.
+        codes = {name: self._category_codes[name].view for name in CATEGORY_FIELDS}
+        size = min(len(view) for view in codes.values())
+        masks = np.zeros((len(needles), size), dtype=bool)
+        for name in CATEGORY_FIELDS:
+            labels = list(self._category_labels[name])
+            # (categories, labels + 1); the trailing False column is code -1 (missing).
+            hits = np.zeros((len(needles), len(labels) + 1), dtype=bool)
+            for i, needle in enumerate(needles):
+                hits[i, : len(labels)] = [needle in label.lower() for label in labels]
+            masks |= hits[:, codes[name][:size]]
+        return {
+            needle: np.flatnonzero(mask).astype(np.int32)
+            for needle, mask in zip(needles, masks)
+        }
+
+    def category_rows(self, category: str) -> np.ndarray:
+        """Rows whose category or type contains ``category`` (case-insensitive)"""
+        return self.category_masks([category])[category.strip().lower()]
+
+    def keyword_rows(self, keyword: str) -> np.ndarray:
+        """Rows where any keyword field contains ``keyword`` (case-insensitive)"""
+        return self.text_index.search(keyword, self.store.value)
+
+    def candidate_rows(
+        self,
+        category: str,
+        attributes: Sequence[str] = (),
+        category_rows: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Sorted row ids of live businesses matching the category and every
+        attribute; ``category_rows`` is the category's precomputed match.
+        """
+        rows = self.category_rows(category) if category_rows is None else category_rows
+        rows = rows[self.store.alive[rows]]
+        if attributes and len(rows):
+            # Cheap bitset AND first, so text matching sees fewer candidates.
+            rows = np.intersect1d(
+                rows, self.attributes.rows(attributes), assume_unique=True
+            )
+        return rows
+
+    def _with_keyword(self, rows: np.ndarray, keyword: str) -> np.ndarray:
+        if keyword and keyword.strip() and len(rows):
+            keyword_rows = self.keyword_rows(keyword)
+            rows = (
+                np.intersect1d(rows, keyword_rows, assume_unique=True)
+                if len(keyword_rows)
+                else EMPTY
+            )
+        return rows
+
+    def ranked(
+        self, query: SearchQuery, category_rows: Optional[np.ndarray] = None
+    ) -> Ranking:
+        """Every match of ``query`` with its sort keys, cached per normalized query"""
+        key = query.normalized()
+        return self.cache.get_or_compute(key, lambda: self._rank(key, category_rows))
+
+    def _rank(
+        self, query: SearchQuery, category_rows: Optional[np.ndarray] = None
+    ) -> Ranking:
+        candidates = self.candidate_rows(
+            query.category, query.attributes, category_rows
+        )
+        rows = self._with_keyword(candidates, query.keyword)
+        similarity = None
+        if not len(rows) and query.keyword and len(candidates):
+            # Nothing contains the keyword as typed: fall back to names and
+            # subtypes that are spelt similarly.
+            rows, scores = self.fuzzy.search(query.keyword, self._mask(candidates))
+            similarity = np.zeros(len(self.store))
+            similarity[rows] = scores
+        if query.open_at is not None:
+            rows = rows[self.hours.open_mask(query.open_at)[rows]]
+        busyness = None
+        if query.uses_crowds:
+            assert query.open_at is not None
+            busyness = self.crowds.busyness(query.open_at, rows)
+            if query.max_busyness is not None:
+                # No data is not evidence of a crowd, so unknowns stay in.
+                keep = (busyness <= query.max_busyness) | (busyness == UNKNOWN)
+                rows, busyness = rows[keep], busyness[keep]
+
+        distance = None
+        if query.has_location:
+            assert query.lat is not None and query.lon is not None
+            if query.radius_m is not None:
+                located, distance = self.geo.within(
+                    query.lat, query.lon, query.radius_m, self._mask(rows)
+                )
+                if busyness is not None:
+                    busyness = busyness[np.searchsorted(rows, located)]
+                rows = located
+            elif query.sort == "distance":
+                # Plain "nearest first": each page walks the grid, see ``_page``.
+                return Ranking(rows, None, None, similarity is not None)
+
+        text = similarity[rows] if similarity is not None else None
+        scores = self.ranker.scores(
+            rows, query.keyword, query.sort, distance, busyness, text
+        )
+        return Ranking(rows, scores, distance, similarity is not None)
+
+    def _page(
+        self, query: SearchQuery, ranking: Ranking, start: int, end: int
+    ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Matches ``start:end`` in rank order, with distances if located"""
+        if ranking.scores is None:
+            assert query.lat is not None and query.lon is not None
+            rows, distance = self.geo.nearest(
+                query.lat, query.lon, end, self._mask(ranking.rows)
+            )
+            if len(rows) < end:
+                # Businesses without coordinates come last, in row order.
+                lats, lons = self.geo.lats[ranking.rows], self.geo.lons[ranking.rows]
+                unlocated = ranking.rows[np.isnan(lats) | np.isnan(lons)][
+                    : end - len(rows)
+                ]
+                rows = np.concatenate([rows, unlocated])
+                distance = np.concatenate([distance, np.full(len(unlocated), np.nan)])
+            return rows[start:end], distance[start:end]
+        rows = ranking.rows[top_k(ranking.scores, end)[start:]]
+        if ranking.distance is not None:
+            distance = ranking.distance[np.searchsorted(ranking.rows, rows)]
+        elif query.has_location:
+            assert query.lat is not None and query.lon is not None
+            distance = self.geo.distances(query.lat, query.lon, rows)
+        else:
+            distance = None
+        return rows, distance
+
+    def search(
+        self, query: SearchQuery, category_rows: Optional[np.ndarray] = None
+    ) -> SearchResult:
+        """
+        One page of ``query.limit`` matches, best first, starting at
+        ``query.cursor``. Batches pass ``category_rows`` from
+        ``category_masks`` so a category shared by several queries is matched once.
+        """
+        # Later pages of an open_at="now" query are ranked at the first page's moment.
+        query, start = decode_cursor(query, self.version)
+        ranking = self.ranked(query, category_rows)
+        end = start + query.limit
+        rows, distance = self._page(query, ranking, start, end)
+        result = self._result(
+            query,
+            rows.tolist(),
+            distance.tolist() if distance is not None else None,
+            matched=ranking.rows,
+        )
+        result.total = len(ranking.rows)
+        result.fuzzy = ranking.fuzzy
+        if end < len(ranking.rows) and query.limit:
+            result.next_cursor = encode_cursor(query, end, self.version)
+        return result
+
+    def upsert(self, business_id: int, fields: Mapping[str, Any]) -> int:
+        """
+        Add a business or change some of its fields; returns its new row.
+        Unchanged fields (detail fields included), and a popular-times
+        histogram not given in ``fields``, carry over from the current row.
+        """
+        with self._write_lock:
+            old = self.store.row_of(business_id)
+            record = (
+                {**self.store.details(old), **self.store.record(old)}
+                if old is not None
+                else {}
+            )
+            record.update(fields)
+            record["id"] = business_id
+            grid = None
+            if "popular_times" in fields:
+                grid = parse_popular_times(fields["popular_times"])
+            elif old is not None:
+                grid = self.crowds.matrix[old]
+            row = self._append(record, grid)
+            closed = record.get("business_status") in CLOSED_STATUSES
+            if closed:
+                self._retire(row)
+            self.store.publish(row, business_id, alive=not closed)
+            if old is not None and self.store.alive[old]:
+                self._retire(old)
+            self.cache.invalidate()
+            return row
+
+    def delete(self, business_id: int) -> bool:
+        """Remove a business from searches and lookups; False if it does not exist"""
+        with self._write_lock:
+            row = self.store.row_of(business_id)
+            if row is None:
+                return False
+            if self.store.alive[row]:
+                self._retire(row)
+            self.store.forget(business_id)
+            self.cache.invalidate()
+            return True
+
+    def _append(self, record: Dict[str, Any], grid: Optional[np.ndarray]) -> int:
+        """Add ``record`` as the next row of the store and indexes, unpublished"""
+        row = self.store.append(record)
+        fields = {name: record.get(name) for name in KEYWORD_FIELDS}
+        self.text_index.add_row(row, fields)
+        self.fuzzy.add_row(row, {name: fields.get(name) for name in FUZZY_FIELDS})
+        self.ranker.add_row(row, record)
+        self.geo.add_row(row, record.get("latitude"), record.get("longitude"))
+        for name in CATEGORY_FIELDS:
+            labels = self._category_labels[name]
+            label = record.get(name)
+            if label is not None and label not in labels:
+                labels.append(label)
+            self._category_codes[name].append(
+                labels.index(label) if label is not None else -1
+            )
+        zone = record.get("time_zone")
+        self.hours.add_row(row, parse_working_hours(record.get("working_hours")), zone)
+        self.crowds.add_row(row, grid, zone)
+        self.attributes.add_row(row, parse_about(record.get("about")))
+        self.facets.set_row(
+            row, {source: record.get(source) for source in FACET_COLUMNS.values()}
+        )
+        self.records.add_row(row, record)
+        popularity = float(record.get("reviews") or 0.0)
+        for text, kind in _suggestions(record):
+            self.autocomplete.add(text, kind, popularity)
+        return row
+
+    def _retire(self, row: int) -> None:
+        """Take ``row`` out of searches, facet counts and suggestions"""
+        self.store.retire(row)
+        self.facets.set_row(row, {})
+        self.attributes.clear_row(row)
+        record = {
+            name: self.store.value(row, name)
+            for name in ["name", *FACET_COLUMNS.values()]
+            if name in self.store
+        }
+        for text, kind in _suggestions(record):
+            self.autocomplete.discard(text, kind)
+
+    def _mask(self, rows: np.ndarray) -> np.ndarray:
+        mask = np.zeros(len(self.store), dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def _result(
+        self,
+        query: SearchQuery,
+        rows: List[int],
+        distance_m: Optional[List[float]] = None,
+        matched: Optional[np.ndarray] = None,
+    ) -> SearchResult:
+        """
+        Attach per-row extras the query asked for.
+
+        ``matched`` is every row that passed the filters.
+        """
+        result = SearchResult(rows=rows, distance_m=distance_m)
+        if query.facets and matched is not None:
+            result.facets = self.facets.counts(matched)
+        if query.open_at is not None:
+            closing = self.hours.closing_minutes(query.open_at, rows)
+            result.open_until = [
+                format_minute(closing[r]) if r in closing else None for r in rows
+            ]
+        if query.uses_crowds:
+            assert query.open_at is not None
+            result.busyness = [
+                None if b == UNKNOWN else int(b)
+                for b in self.crowds.busyness(query.open_at, np.array(rows))
+            ]
+        return result
@@ -0,0 +1,138 @@
+"""
+Facet counts (category, subtypes, borough) for the directory.
+
+Counts over the whole dataset are computed once when the engine loads and
+kept in memory; counts for a filtered query are a single ``bincount`` over
+the matched rows. Each facet stores flat (row, label) pairs so multi-valued
+columns such as ``subtypes`` are handled the same way as single-valued
+ones, and a changed row only adjusts the counts of the labels it gained or
+lost.
+"""
+
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+# Facet name -> source column; multi-valued sources are split on ", "
+FACET_COLUMNS = {"category": "category", "subtypes": "subtypes", "borough": "borough"}
+MULTI_VALUED = {"subtypes"}
+
+
+def facet_values(facet: str, raw: Optional[str]) -> List[str]:
+    """Distinct labels one source value contributes to ``facet``"""
+    if not raw:
+        return []
+    if facet in MULTI_VALUED:
+        values = [part.strip() for part in raw.split(",")]
+        return list(dict.fromkeys(v for v in values if v))
+    return [raw.strip()] if raw.strip() else []
+
+
+class Pairs(NamedTuple):
+    """One entry per (row, label) pair"""
+
+    rows: np.ndarray
+    codes: np.ndarray
+
+
+class Facet:
+    """Label counts for one facet column"""
+
+    def __init__(self, name: str, values: Sequence[Optional[str]]):
+        self.name = name
+        self.labels: List[str] = []
+        self._codes: Dict[str, int] = {}
+        pair_rows: List[int] = []
+        pair_codes: List[int] = []
+        for row, raw in enumerate(values):
+            for label in facet_values(name, raw):
+                pair_rows.append(row)
+                pair_codes.append(self._code(label))
+        # Replaced as a whole, so a concurrent ``counts`` sees matching arrays
+        self.pairs = Pairs(
+            np.array(pair_rows, dtype=np.int32), np.array(pair_codes, dtype=np.int32)
+        )
+        self.totals = np.bincount(self.pairs.codes, minlength=len(self.labels)).astype(
+            np.int64
+        )
+
+    def _code(self, label: str) -> int:
+        code = self._codes.get(label)
+        if code is None:
+            code = self._codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def counts(self, rows: Optional[np.ndarray] = None, size: int = 0) -> np.ndarray:
+        """Per-label counts over every row, or only over ``rows``"""
+        if rows is None:
+            return self.totals
+        pairs = self.pairs
+        mask = np.zeros(max(size, int(pairs.rows.max(initial=-1)) + 1), dtype=bool)
+        mask[rows] = True
+        selected = pairs.codes[mask[pairs.rows]]
+        return np.bincount(selected, minlength=len(self.labels))
+
+    def set_row(self, row: int, raw: Optional[str]) -> None:
+        """Replace one row's labels, adjusting the totals by the difference"""
+        pairs = self.pairs
+        at = pairs.rows == row
+        old = set(pairs.codes[at].tolist())
+        new = {self._code(label) for label in facet_values(self.name, raw)}
+        if old == new:
+            return
+        if len(self.totals) < len(self.labels):
+            self.totals = np.append(
+                self.totals,
+                np.zeros(len(self.labels) - len(self.totals), dtype=np.int64),
+            )
+        for code in old - new:
+            self.totals[code] -= 1
+        for code in new - old:
+            self.totals[code] += 1
+        keep = ~at
+        added = sorted(new)
+        self.pairs = Pairs(
+            np.concatenate(
+                [pairs.rows[keep], np.full(len(added), row, dtype=np.int32)]
+            ),
+            np.concatenate([pairs.codes[keep], np.array(added, dtype=np.int32)]),
+        )
+
+
+class FacetIndex:
+    """Every facet of the directory, counted once and updated row by row"""
+
+    def __init__(self, columns: Mapping[str, Sequence[Optional[str]]], size: int):
+        self.size = size
+        self.facets = {
+            facet: Facet(facet, columns.get(source) or [None] * size)
+            for facet, source in FACET_COLUMNS.items()
+        }
+
+    def counts(
+        self, rows: Optional[np.ndarray] = None, top: Optional[int] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        ``{facet: [{"value", "count"}, ...]}``, most common first, over every
+        row or only over ``rows``; labels with no matches are left out.
+        """
+        listing = {}
+        for name, facet in self.facets.items():
+            counts = facet.counts(rows, self.size)
+            order = sorted(
+                np.flatnonzero(counts).tolist(),
+                key=lambda i: (-counts[i], facet.labels[i]),
+            )
+            if top is not None:
+                order = order[:top]
+            listing[name] = [
+                {"value": facet.labels[i], "count": int(counts[i])} for i in order
+            ]
+        return listing
+
+    def set_row(self, row: int, record: Mapping[str, Optional[str]]) -> None:
+        """Apply one added or changed business to the counts"""
+        self.size = max(self.size, row + 1)
+        for name, facet in self.facets.items():
+            facet.set_row(row, record.get(FACET_COLUMNS[name]))
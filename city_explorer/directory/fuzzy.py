@@ -0,0 +1,157 @@
+"""
+Typo-tolerant matching of business names and subtypes.
+
+Every distinct word of the fuzzy fields is split into padded character
+trigrams (``"  b", " br", "bro", "row", "own", "wn "``) as PostgreSQL's
+pg_trgm does, and a trigram index over that vocabulary finds the words a
+misspelt query word shares most trigrams with. Only those words' posting
+lists are touched, so candidate generation stays proportional to the
+vocabulary hits rather than the number of businesses. A row scores the
+average, over query words, of its best matching word's similarity.
+Appended rows (live edits) extend the postings and vocabulary in place.
+"""
+
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .buffers import RowBuffer
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+# Field -> weight; a subtype hit counts a little less than a name hit.
+FUZZY_FIELDS = {"name": 1.0, "subtypes": 0.8}
+
+# Minimum row similarity for a fuzzy match (pg_trgm's default threshold)
+FUZZY_THRESHOLD = 0.3
+
+# Query words only pair with vocabulary words at least this similar.
+WORD_THRESHOLD = 0.25
+
+EMPTY_ROWS = np.empty(0, dtype=np.int32)
+EMPTY_SCORES = np.empty(0, dtype=np.float64)
+
+
+def words(text: str) -> List[str]:
+    """Lowercase alphanumeric words of ``text``"""
+    return _WORD_RE.findall(text.lower())
+
+
+def trigrams(word: str) -> Set[str]:
+    """Padded character trigrams of one word"""
+    padded = f"  {word} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyIndex:
+    """Vocabulary trigram index with word -> row postings per fuzzy field"""
+
+    def __init__(self, fields: Dict[str, Sequence[Optional[str]]], rows: int):
+        self.rows = rows
+        word_rows: Dict[str, Dict[str, Set[int]]] = {
+            field: defaultdict(set) for field in FUZZY_FIELDS
+        }
+        for field in FUZZY_FIELDS:
+            for row, text in enumerate(fields.get(field) or []):
+                for word in words(text or ""):
+                    word_rows[field][word].add(row)
+
+        self.vocabulary = sorted(set().union(*(set(w) for w in word_rows.values())))
+        self._word_ids = {word: i for i, word in enumerate(self.vocabulary)}
+        self._word_sizes = np.array(
+            [len(trigrams(w)) for w in self.vocabulary], dtype=np.int32
+        )
+        grams: Dict[str, List[int]] = defaultdict(list)
+        for i, word in enumerate(self.vocabulary):
+            for gram in trigrams(word):
+                grams[gram].append(i)
+        self._grams = {
+            gram: np.array(ids, dtype=np.int32) for gram, ids in grams.items()
+        }
+        # field -> word id -> sorted rows containing it
+        self.postings: Dict[str, Dict[int, np.ndarray]] = {
+            field: {
+                self._word_ids[w]: np.array(sorted(r), dtype=np.int32)
+                for w, r in entries.items()
+            }
+            for field, entries in word_rows.items()
+        }
+        self._posting_buffers: Dict[Tuple[str, int], RowBuffer] = {}
+
+    def add_row(self, row: int, fields: Dict[str, Optional[str]]) -> None:
+        """Index one appended row (``row`` must be the next row id)"""
+        self.rows = row + 1
+        for field in FUZZY_FIELDS:
+            for word in dict.fromkeys(words(fields.get(field) or "")):
+                word_id = self._word_ids.get(word)
+                if word_id is None:
+                    word_id = self._word_ids[word] = len(self.vocabulary)
+                    self.vocabulary.append(word)
+                    self._word_sizes = np.append(
+                        self._word_sizes, np.int32(len(trigrams(word)))
+                    )
+                    for gram in trigrams(word):
+                        self._grams[gram] = np.append(
+                            self._grams.get(gram, EMPTY_ROWS), np.int32(word_id)
+                        )
+                key = (field, word_id)
+                buffer = self._posting_buffers.get(key)
+                if buffer is None:
+                    buffer = self._posting_buffers[key] = RowBuffer(
+                        self.postings[field].get(word_id, EMPTY_ROWS)
+                    )
+                self.postings[field][word_id] = buffer.append(row)
+
+    def similar_words(self, word: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Vocabulary ids of words like ``word``, with their trigram similarity"""
+        query = trigrams(word)
+        hits = [self._grams[gram] for gram in query if gram in self._grams]
+        if not hits:
+            return EMPTY_ROWS, EMPTY_SCORES
+        ids, shared = np.unique(np.concatenate(hits), return_counts=True)
+        similarity = shared / (len(query) + self._word_sizes[ids] - shared)
+        keep = similarity >= WORD_THRESHOLD
+        return ids[keep], similarity[keep]
+
+    def search(
+        self,
+        text: str,
+        allowed: Optional[np.ndarray] = None,
+        threshold: float = FUZZY_THRESHOLD,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sorted rows similar to ``text`` (optionally only those set in the
+        boolean mask ``allowed``) and their similarity in [0, 1].
+        """
+        query_words = list(dict.fromkeys(words(text)))
+        if not query_words:
+            return EMPTY_ROWS, EMPTY_SCORES
+
+        totals: Dict[int, float] = defaultdict(float)
+        for word in query_words:
+            ids, similarity = self.similar_words(word)
+            # Best match of this query word in each row, over fields
+            best: Dict[int, float] = {}
+            for field, weight in FUZZY_FIELDS.items():
+                postings = self.postings[field]
+                for word_id, score in zip(ids.tolist(), (weight * similarity).tolist()):
+                    for row in postings.get(word_id, EMPTY_ROWS).tolist():
+                        if score > best.get(row, 0.0):
+                            best[row] = score
+            for row, score in best.items():
+                totals[row] += score
+
+        matched = sorted(
+            row
+            for row, total in totals.items()
+            if total / len(query_words) >= threshold
+            and (allowed is None or (row < len(allowed) and allowed[row]))
+        )
+        return (
+            np.array(matched, dtype=np.int32),
+            np.array(
+                [totals[row] / len(query_words) for row in matched], dtype=np.float64
+            ),
+        )
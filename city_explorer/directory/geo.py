@@ -0,0 +1,195 @@
+"""
+Spatial index over business coordinates.
+
+Points are projected onto a local equirectangular plane (metres, centred on
+the dataset) and bucketed into a square grid. Radius and k-nearest queries
+only visit the cells that can contain an answer, then refine the candidates
+with a vectorized haversine distance. Rows appended by live edits join their
+cell's bucket; the projection keeps its load-time origin.
+"""
+
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .buffers import RowBuffer
+
+EARTH_RADIUS_M = 6371008.8
+METRES_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180.0
+
+# Grid cell edge; roughly a ten-minute walk
+CELL_SIZE_M = 500.0
+
+EMPTY_ROWS = np.empty(0, dtype=np.int32)
+EMPTY_DISTANCES = np.empty(0, dtype=np.float64)
+
+
+def haversine_m(
+    lat: float, lon: float, lats: np.ndarray, lons: np.ndarray
+) -> np.ndarray:
+    """Great-circle distance in metres from one point to many"""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lons) - math.radians(lon)
+    a = (
+        np.sin(dphi / 2.0) ** 2
+        + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2.0) ** 2
+    )
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GeoIndex:
+    """Grid bucket index supporting radius and k-nearest lookups"""
+
+    def __init__(
+        self, lats: np.ndarray, lons: np.ndarray, cell_size_m: float = CELL_SIZE_M
+    ):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.cell_size_m = cell_size_m
+
+        located = np.flatnonzero(~(np.isnan(self.lats) | np.isnan(self.lons)))
+        self.origin_lat = float(self.lats[located].mean()) if len(located) else 0.0
+        self._lon_scale = METRES_PER_DEGREE * math.cos(math.radians(self.origin_lat))
+
+        buckets: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for row in located.tolist():
+            buckets[self._cell(self.lats[row], self.lons[row])].append(row)
+        self.cells = {
+            cell: np.array(rows, dtype=np.int32) for cell, rows in buckets.items()
+        }
+
+        if self.cells:
+            xs = [cx for cx, _ in self.cells]
+            ys = [cy for _, cy in self.cells]
+            self._bounds = (min(xs), max(xs), min(ys), max(ys))
+        else:
+            self._bounds = (0, 0, 0, 0)
+        self._lat_buffer = RowBuffer(self.lats)
+        self._lon_buffer = RowBuffer(self.lons)
+
+    def add_row(self, row: int, lat: Optional[float], lon: Optional[float]) -> None:
+        """Index one appended row (``row`` must be the next row id)"""
+        lat = np.nan if lat is None else float(lat)
+        lon = np.nan if lon is None else float(lon)
+        self.lats = self._lat_buffer.append(lat)
+        self.lons = self._lon_buffer.append(lon)
+        if math.isnan(lat) or math.isnan(lon):
+            return
+        cell = self._cell(lat, lon)
+        self.cells[cell] = np.append(self.cells.get(cell, EMPTY_ROWS), np.int32(row))
+        cx, cy = cell
+        if len(self.cells) == 1:
+            self._bounds = (cx, cx, cy, cy)
+        else:
+            min_x, max_x, min_y, max_y = self._bounds
+            self._bounds = (
+                min(min_x, cx),
+                max(max_x, cx),
+                min(min_y, cy),
+                max(max_y, cy),
+            )
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        x = lon * self._lon_scale
+        y = lat * METRES_PER_DEGREE
+        return int(math.floor(x / self.cell_size_m)), int(
+            math.floor(y / self.cell_size_m)
+        )
+
+    def _rows_in(
+        self, cells: List[Tuple[int, int]], allowed: Optional[np.ndarray]
+    ) -> np.ndarray:
+        found = [self.cells[c] for c in cells if c in self.cells]
+        if not found:
+            return EMPTY_ROWS
+        rows = np.concatenate(found)
+        if allowed is None:
+            return rows
+        # Rows appended by a live edit after ``allowed`` was built are not in it.
+        rows = rows[rows < len(allowed)]
+        return rows[allowed[rows]]
+
+    def distances(self, lat: float, lon: float, rows: np.ndarray) -> np.ndarray:
+        """Distance in metres from (lat, lon) to each row; NaN when unlocated"""
+        return haversine_m(lat, lon, self.lats[rows], self.lons[rows])
+
+    def within(
+        self,
+        lat: float,
+        lon: float,
+        radius_m: float,
+        allowed: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows within ``radius_m`` of (lat, lon), sorted by row id, with distances"""
+        cx, cy = self._cell(lat, lon)
+        # One spare cell of slack absorbs the projection error at city scale.
+        reach = int(math.ceil(radius_m / self.cell_size_m)) + 1
+        if (2 * reach + 1) ** 2 > len(self.cells):
+            # Radius spans more cells than are occupied: check those directly.
+            cells = [
+                c for c in self.cells if max(abs(c[0] - cx), abs(c[1] - cy)) <= reach
+            ]
+        else:
+            cells = [
+                (x, y)
+                for x in range(cx - reach, cx + reach + 1)
+                for y in range(cy - reach, cy + reach + 1)
+            ]
+        rows = np.sort(self._rows_in(cells, allowed))
+        if not len(rows):
+            return EMPTY_ROWS, EMPTY_DISTANCES
+        dist = self.distances(lat, lon, rows)
+        keep = dist <= radius_m
+        return rows[keep], dist[keep]
+
+    def nearest(
+        self, lat: float, lon: float, k: int, allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """The ``k`` rows closest to (lat, lon), nearest first, with distances"""
+        if k <= 0 or not self.cells:
+            return EMPTY_ROWS, EMPTY_DISTANCES
+        cx, cy = self._cell(lat, lon)
+        min_x, max_x, min_y, max_y = self._bounds
+        max_ring = max(
+            abs(cx - min_x), abs(cx - max_x), abs(cy - min_y), abs(cy - max_y)
+        )
+
+        rows = EMPTY_ROWS
+        dist = EMPTY_DISTANCES
+        for ring in range(max_ring + 1):
+            if (2 * ring + 1) ** 2 > len(self.cells):
+                # The rings now cover more cells than are occupied (sparse
+                # outliers far away): visit every remaining bucket at once.
+                rest = [
+                    c for c in self.cells if max(abs(c[0] - cx), abs(c[1] - cy)) >= ring
+                ]
+                found = self._rows_in(rest, allowed)
+                rows = np.concatenate([rows, found])
+                dist = np.concatenate([dist, self.distances(lat, lon, found)])
+                break
+            if ring == 0:
+                ring_cells = [(cx, cy)]
+            else:
+                ring_cells = [
+                    (x, y)
+                    for x in range(cx - ring, cx + ring + 1)
+                    for y in range(cy - ring, cy + ring + 1)
+                    if max(abs(x - cx), abs(y - cy)) == ring
+                ]
+            found = self._rows_in(ring_cells, allowed)
+            if len(found):
+                rows = np.concatenate([rows, found])
+                dist = np.concatenate([dist, self.distances(lat, lon, found)])
+            # Anything in an unvisited ring is at least ``ring`` cells away.
+            if (
+                len(rows) >= k
+                and np.partition(dist, k - 1)[k - 1] <= ring * self.cell_size_m * 0.99
+            ):
+                break
+
+        order = np.argsort(dist, kind="stable")[:k]
+        return rows[order], dist[order]
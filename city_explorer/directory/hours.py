@@ -0,0 +1,269 @@
+"""
+Opening hours as weekly minute intervals.
+
+Outscraper stores ``working_hours`` as JSON such as
+``{"Monday": "10AM-6:30PM", "Friday": "5PM-2AM", "Sunday": "Closed"}``. At
+snapshot build time every business is flattened into half-open
+``[start, end)`` intervals measured in minutes from Monday 00:00 local time,
+so "is it open at T?" becomes one vectorized comparison over all intervals.
+Live edits append a row's intervals to the end of the flat arrays.
+"""
+
+import json
+import re
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .buffers import RowBuffer
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+WEEKDAYS = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+
+_TIME_RE = re.compile(r"^\s*(\d{1,2})(?::(\d{2}))?\s*([AP]M)?\s*$", re.IGNORECASE)
+
+Interval = Tuple[int, int]
+
+
+def _clock_minutes(hour: int, minute: int, meridiem: str) -> int:
+    hour = hour % 12
+    if meridiem.upper() == "PM":
+        hour += 12
+    return hour * 60 + minute
+
+
+def parse_range(text: str) -> List[Interval]:
+    """
+    Parse one day's hours into minute-of-day intervals; the end may exceed
+    1440 when the business closes after midnight.
+    """
+    text = text.strip()
+    if not text or text.lower() == "closed":
+        return []
+    if text.lower().startswith("open 24"):
+        return [(0, MINUTES_PER_DAY)]
+
+    intervals = []
+    for part in text.split(","):
+        if "-" not in part:
+            continue
+        start_text, end_text = part.split("-", 1)
+        start_match = _TIME_RE.match(start_text)
+        end_match = _TIME_RE.match(end_text)
+        if not start_match or not end_match or not end_match.group(3):
+            continue
+
+        end_meridiem = end_match.group(3)
+        end = _clock_minutes(
+            int(end_match.group(1)), int(end_match.group(2) or 0), end_meridiem
+        )
+        if start_match.group(3):
+            start = _clock_minutes(
+                int(start_match.group(1)),
+                int(start_match.group(2) or 0),
+                start_match.group(3),
+            )
+        else:
+            # "5-9PM" borrows the end's AM/PM; "11-2PM" cannot, so it flips.
+            start = _clock_minutes(
+                int(start_match.group(1)), int(start_match.group(2) or 0), end_meridiem
+            )
+            if start > end:
+                flipped = "AM" if end_meridiem.upper() == "PM" else "PM"
+                start = _clock_minutes(
+                    int(start_match.group(1)), int(start_match.group(2) or 0), flipped
+                )
+
+        if end <= start:
+            # Closes after midnight (or "12AM" meaning end of day).
+            end += MINUTES_PER_DAY
+        intervals.append((start, end))
+    return intervals
+
+
+def parse_working_hours(raw: Optional[str]) -> List[Interval]:
+    """Weekly ``[start, end)`` minute intervals for a ``working_hours`` JSON value"""
+    if not raw:
+        return []
+    try:
+        days = json.loads(raw)
+    except (TypeError, ValueError):
+        return []
+    if not isinstance(days, dict):
+        return []
+
+    weekly: List[Interval] = []
+    for day_index, day in enumerate(WEEKDAYS):
+        value = days.get(day)
+        if not isinstance(value, str):
+            continue
+        offset = day_index * MINUTES_PER_DAY
+        for start, end in parse_range(value):
+            start, end = start + offset, end + offset
+            if end > MINUTES_PER_WEEK:
+                # Sunday night into Monday morning wraps to the week start.
+                weekly.append((start, MINUTES_PER_WEEK))
+                weekly.append((0, end - MINUTES_PER_WEEK))
+            else:
+                weekly.append((start, end))
+    return weekly
+
+
+def minute_of_week(moment: datetime) -> int:
+    """Minutes since Monday 00:00 for a local (naive or aware) datetime"""
+    return moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+
+def local_minutes(moment: datetime, zones: Sequence[str]) -> np.ndarray:
+    """
+    ``moment`` as minute-of-week in each of ``zones``. Naive datetimes are
+    taken as already local everywhere.
+    """
+    if moment.tzinfo is None:
+        return np.full(len(zones), minute_of_week(moment), dtype=np.int32)
+    try:
+        from zoneinfo import ZoneInfo
+    except ImportError:  # Python < 3.9
+        ZoneInfo = None  # type: ignore[assignment,misc]
+
+    minutes = []
+    for zone in zones:
+        try:
+            local = moment.astimezone(ZoneInfo(zone)) if ZoneInfo and zone else moment
+        except Exception:
+            local = moment
+        minutes.append(minute_of_week(local))
+    return np.array(minutes, dtype=np.int32)
+
+
+def parse_open_at(value: str) -> datetime:
+    """
+    Parse an ``open_at`` argument: ``"now"`` or an ISO-8601 datetime. Naive
+    times are read as each business's local time. Truncated to the minute so
+    equivalent queries share cache entries.
+    """
+    text = value.strip()
+    if text.lower() == "now":
+        moment = datetime.now(timezone.utc)
+    else:
+        try:
+            moment = datetime.fromisoformat(text)
+        except ValueError:
+            raise ValueError(
+                "open_at must be 'now' or an ISO datetime like 2025-06-14T18:30, "
+                f"got '{value}'"
+            )
+    return moment.replace(second=0, microsecond=0)
+
+
+def format_minute(minute: int) -> str:
+    """Render a minute-of-day as e.g. '6:30 PM'"""
+    minute %= MINUTES_PER_DAY
+    hour, mins = divmod(minute, 60)
+    meridiem = "AM" if hour < 12 else "PM"
+    return f"{hour % 12 or 12}:{mins:02d} {meridiem}"
+
+
+class Intervals(NamedTuple):
+    """One entry per interval: row, start/end minute-of-week, time-zone slot"""
+
+    rows: np.ndarray
+    starts: np.ndarray
+    ends: np.ndarray
+    zones: np.ndarray
+
+
+class HoursIndex:
+    """
+    Flattened opening intervals of every business. The interval arrays are
+    replaced together in one assignment, so a search running during a live
+    edit always sees arrays of the same length.
+    """
+
+    def __init__(
+        self,
+        rows: np.ndarray,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        zone_codes: np.ndarray,
+        zones: List[str],
+        size: int,
+    ):
+        rows = np.asarray(rows)
+        self.zones = zones
+        self.size = size
+        # Time-zone slot of each interval; unknown zones use the trailing slot.
+        codes = np.asarray(zone_codes)
+        slots = np.where(codes < 0, len(zones), codes)[rows]
+        self.intervals = Intervals(rows, np.asarray(starts), np.asarray(ends), slots)
+        self._buffers = Intervals(*(RowBuffer(a) for a in self.intervals))
+
+    def zone_slot(self, zone: Optional[str]) -> int:
+        """Time-zone slot for a zone name; unknown zones use the trailing slot"""
+        return self.zones.index(zone) if zone in self.zones else len(self.zones)
+
+    def add_row(
+        self, row: int, intervals: Sequence[Interval], zone: Optional[str]
+    ) -> None:
+        """Add one appended row's weekly intervals (``row`` must be the next row id)"""
+        self.size = row + 1
+        if intervals:
+            buffers = self._buffers
+            self.intervals = Intervals(
+                buffers.rows.extend([row] * len(intervals)),
+                buffers.starts.extend([start for start, _ in intervals]),
+                buffers.ends.extend([end for _, end in intervals]),
+                buffers.zones.extend([self.zone_slot(zone)] * len(intervals)),
+            )
+
+    def _open(self, moment: datetime) -> Tuple[Intervals, np.ndarray]:
+        """The current intervals and which of them are open at ``moment``"""
+        intervals = self.intervals
+        per_zone = np.append(local_minutes(moment, self.zones), minute_of_week(moment))
+        t = per_zone[intervals.zones]
+        return intervals, (intervals.starts <= t) & (t < intervals.ends)
+
+    def open_mask(self, moment: datetime) -> np.ndarray:
+        """Boolean mask over all rows: open at ``moment``"""
+        intervals, hit = self._open(moment)
+        mask = np.zeros(self.size, dtype=bool)
+        mask[intervals.rows[hit]] = True
+        return mask
+
+    def closing_minutes(self, moment: datetime, rows: Sequence[int]) -> Dict[int, int]:
+        """For rows open at ``moment``, the minute-of-week their interval ends"""
+        intervals, hit = self._open(moment)
+        hit &= np.isin(intervals.rows, rows)
+        return {
+            int(r): int(e) for r, e in zip(intervals.rows[hit], intervals.ends[hit])
+        }
+
+
+def flatten_hours(
+    values: Sequence[Optional[str]],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(rows, starts, ends) interval arrays for a column of ``working_hours`` values"""
+    rows: List[int] = []
+    starts: List[int] = []
+    ends: List[int] = []
+    for row, raw in enumerate(values):
+        for start, end in parse_working_hours(raw):
+            rows.append(row)
+            starts.append(start)
+            ends.append(end)
+    return (
+        np.array(rows, dtype=np.int32),
+        np.array(starts, dtype=np.int16),
+        np.array(ends, dtype=np.int16),
+    )
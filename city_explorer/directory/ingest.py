@@ -0,0 +1,135 @@
+"""
+Ingest-time canonicalization of the Outscraper export.
+
+The nominee CSV is the union of many Outscraper ``query`` runs, so one
+business can appear several times. ``canonicalize`` merges rows that share a
+``place_id`` or a ``google_id`` into one (transitively, so a row carrying
+only one of them still joins its business), keeps every source query as a
+tag and assigns each business a stable integer id derived from its key, so
+ids survive re-scrapes and re-ordering of the CSV. Rows with neither id are
+keyed by their name and address.
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Identity columns, most specific first
+KEY_COLUMNS = ["place_id", "google_id"]
+
+# What identifies a row that has no identity column
+CONTENT_COLUMNS = ["name", "full_address"]
+
+# Prefer the freshest duplicate (more reviews) when values differ.
+FRESHNESS_COLUMN = "reviews"
+
+
+def business_id(key: str) -> int:
+    """
+    Stable 53-bit id for a business key, so it stays exact in JSON numbers
+    and JavaScript clients.
+    """
+    digest = hashlib.sha1(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") >> 11
+
+
+def _cells(df: pd.DataFrame, column: str) -> List[Optional[str]]:
+    """A column's values, None where missing (or absent)"""
+    if column not in df:
+        return [None] * len(df)
+    return [None if pd.isna(value) else value for value in df[column].tolist()]
+
+
+def _content_key(name: Optional[str], address: Optional[str]) -> str:
+    text = "\n".join(
+        " ".join(str(value or "").lower().split()) for value in (name, address)
+    )
+    return "content:" + hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def business_keys(df: pd.DataFrame) -> pd.Series:
+    """
+    Identity key of every row. Rows sharing a place_id or a google_id belong
+    to one business, keyed by its smallest place_id, else its smallest
+    google_id. Rows with neither are keyed by a hash of name and address.
+    """
+    parent = list(range(len(df)))
+
+    def root(row: int) -> int:
+        while parent[row] != row:
+            parent[row] = parent[parent[row]]
+            row = parent[row]
+        return row
+
+    columns = {column: _cells(df, column) for column in KEY_COLUMNS}
+    for values in columns.values():
+        first: Dict[str, int] = {}
+        for row, value in enumerate(values):
+            if value is not None:
+                parent[root(row)] = root(first.setdefault(value, row))
+
+    # Root row -> (column rank, value) of the business's preferred key
+    best: Dict[int, Tuple[int, str]] = {}
+    for rank, values in enumerate(columns.values()):
+        for row, value in enumerate(values):
+            if value is not None:
+                group = root(row)
+                best[group] = min(best.get(group, (rank, value)), (rank, value))
+    names, addresses = (_cells(df, column) for column in CONTENT_COLUMNS)
+    keys = [
+        (
+            best[root(row)][1]
+            if root(row) in best
+            else _content_key(names[row], addresses[row])
+        )
+        for row in range(len(df))
+    ]
+    return pd.Series(keys, index=df.index, dtype=object)
+
+
+def _tags(queries: pd.Series) -> str:
+    return json.dumps(
+        list(dict.fromkeys(q for q in queries if isinstance(q, str) and q))
+    )
+
+
+def canonicalize(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per business in first-appearance order, with ``id`` and ``tags``
+    (JSON list of source queries) columns added. Duplicates are merged field
+    by field, taking the first non-missing value from the freshest row.
+    """
+    df = df.reset_index(drop=True)
+    keys = business_keys(df)
+    df = df.assign(_key=keys.to_numpy(), _order=np.arange(len(df)))
+
+    freshness = (
+        pd.to_numeric(df[FRESHNESS_COLUMN], errors="coerce").fillna(-1)
+        if FRESHNESS_COLUMN in df
+        else pd.Series(0, index=df.index)
+    )
+    by_freshness = df.assign(_fresh=freshness).sort_values(
+        "_fresh", ascending=False, kind="stable"
+    )
+    grouped = by_freshness.groupby("_key", sort=False)
+
+    merged = grouped.first()
+    merged["_order"] = grouped["_order"].min()
+    # Tags keep the CSV's query order.
+    tags = (
+        df.groupby("_key", sort=False)["query"].agg(_tags)
+        if "query" in df
+        else pd.Series("[]", index=merged.index)
+    )
+    merged = merged.assign(tags=tags).sort_values("_order")
+
+    ids: List[int] = [business_id(key) for key in merged.index]
+    if len(set(ids)) != len(ids):
+        raise ValueError("Business id collision; widen business_id()")
+    merged.insert(0, "id", np.array(ids, dtype=np.int64))
+    return merged.drop(columns=["_order", "_fresh"], errors="ignore").reset_index(
+        drop=True
+    )
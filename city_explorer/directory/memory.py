@@ -0,0 +1,180 @@
+"""
+Per-worker memory report, for sizing containers.
+
+A loaded city costs a worker three kinds of memory:
+
+- ``mapped``: snapshot files opened with ``mmap``. The pages live in the OS
+  page cache, are shared by every worker on the host and only become
+  resident once touched.
+- ``heap``: indexes, pre-rendered records, caches and live edits built from
+  the snapshot, private to each worker.
+- ``disk``: cold files read a row at a time (the ``details`` and ``google``
+  records), which cost nothing until a row is asked for.
+
+``memory_report`` (and ``DatasetRegistry.memory_report``) breaks every
+loaded city down that way, engine index by index, next to the process's
+resident set size.
+
+Usage:
+    python -m city_explorer.directory.memory [city ...]  # print the report
+"""
+
+import json
+import mmap
+import os
+import sys
+import types
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from .snapshot import DETAILS_COLUMN, ENRICHMENT_COLUMN
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+# Files read on demand rather than mapped
+DISK_ONLY_FILES = {f"{DETAILS_COLUMN}.bin", f"{ENRICHMENT_COLUMN}.bin"}
+
+# Objects that are not data owned by an index
+_OPAQUE = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+)
+
+
+def process_memory() -> Dict[str, Optional[int]]:
+    """This process's current and peak resident set size in bytes, or None"""
+    rss = None
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes.
+        peak = peak if sys.platform == "darwin" else peak * 1024
+    return {"rss_bytes": rss, "peak_rss_bytes": peak}
+
+
+def snapshot_bytes(snapshot_dir: str) -> Dict[str, int]:
+    """A snapshot's file sizes split into mapped and disk-only bytes"""
+    sizes = {"mapped_bytes": 0, "disk_bytes": 0}
+    if not os.path.isdir(snapshot_dir):
+        return sizes
+    for entry in os.listdir(snapshot_dir):
+        kind = "disk_bytes" if entry in DISK_ONLY_FILES else "mapped_bytes"
+        sizes[kind] += os.path.getsize(os.path.join(snapshot_dir, entry))
+    return sizes
+
+
+def _array_bytes(array: np.ndarray, seen: Set[int]) -> int:
+    """Heap bytes of an array's buffer, once per owner; mapped arrays cost none"""
+    owner: Any = array
+    while True:
+        if isinstance(owner, (np.memmap, mmap.mmap)):
+            return 0
+        if not isinstance(owner, np.ndarray) or owner.base is None:
+            break
+        owner = owner.base
+    if id(owner) in seen:
+        return 0
+    seen.add(id(owner))
+    return owner.nbytes if isinstance(owner, np.ndarray) else sys.getsizeof(owner)
+
+
+def deep_size(obj: Any, seen: Optional[Set[int]] = None) -> int:
+    """
+    Approximate heap bytes reachable from ``obj``: containers, instance
+    attributes and array buffers, each counted once across calls sharing
+    ``seen``. Memory-mapped arrays and open files are not counted.
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, _OPAQUE):
+            continue
+        if isinstance(item, np.ndarray):
+            total += sys.getsizeof(item) - (item.nbytes if item.base is None else 0)
+            total += _array_bytes(item, seen)
+            seen.add(id(item))
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif isinstance(item, (str, bytes, int, float, bool, type(None))):
+            continue
+        else:
+            if hasattr(item, "__dict__"):
+                stack.append(vars(item))
+            for name in getattr(type(item), "__slots__", ()):
+                if hasattr(item, name):
+                    stack.append(getattr(item, name))
+    return total
+
+
+def city_report(dataset: Any) -> Dict[str, Any]:
+    """
+    Mapped, heap and disk-only bytes of one registry ``Dataset``, with its
+    heap broken down per engine index
+    """
+    report: Dict[str, Any] = {"slug": dataset.source.slug, "loaded": dataset.loaded}
+    if not dataset.loaded:
+        return report
+    engine = dataset.engine
+    seen: Set[int] = set()
+    # The store first, so indexes are not charged for the rows they share with it.
+    components = {"store": deep_size(engine.store, seen)}
+    for name, value in vars(engine).items():
+        if name != "store":
+            key = name.lstrip("_")
+            components[key] = components.get(key, 0) + deep_size(value, seen)
+    report.update(snapshot_bytes(dataset.source.snapshot_dir))
+    report.update(
+        version=dataset.version,
+        rows=len(engine.store),
+        heap_bytes=sum(components.values()),
+        components=dict(sorted(components.items(), key=lambda item: -item[1])),
+    )
+    return report
+
+
+def memory_report(datasets: Iterable[Any]) -> Dict[str, Any]:
+    """This worker's resident size and the footprint of each registry ``Dataset``"""
+    cities: List[Dict[str, Any]] = [city_report(dataset) for dataset in datasets]
+    loaded = [city for city in cities if city["loaded"]]
+    return {
+        "pid": os.getpid(),
+        **process_memory(),
+        "totals": {
+            kind: sum(city[kind] for city in loaded)
+            for kind in ("heap_bytes", "mapped_bytes", "disk_bytes")
+        },
+        "cities": cities,
+    }
+
+
+def main(argv: List[str]) -> None:
+    from .registry import DatasetRegistry
+
+    registry = DatasetRegistry(memory_budget=sys.maxsize)
+    for city in argv[1:] or registry.cities():
+        registry.engine(city)
+    print(json.dumps(registry.memory_report(), indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,164 @@
+"""
+Query and result types passed between the search tools and the engine.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .ranking import SORT_OPTIONS
+from .snapshot import DEFAULT_CITY
+
+
+@dataclass(frozen=True)
+class SearchQuery:
+    """One directory search. Frozen so it can key caches."""
+
+    category: str
+    keyword: str = ""
+    limit: int = 5
+    sort: str = "relevance"
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    radius_m: Optional[float] = None
+    open_at: Optional[datetime] = None
+    # The ``open_at`` argument as given ("now" or an ISO datetime), when ``open_at`` was
+    # parsed from it
+    open_at_input: Optional[str] = None
+    max_busyness: Optional[int] = None
+    attributes: Tuple[str, ...] = ()
+    facets: bool = False
+    cursor: Optional[str] = None
+    city: str = DEFAULT_CITY
+
+    def __post_init__(self) -> None:
+        if self.sort not in SORT_OPTIONS:
+            raise ValueError(
+                f"Unknown sort '{self.sort}'. "
+                f"Expected one of: {', '.join(SORT_OPTIONS)}"
+            )
+        if (self.lat is None) != (self.lon is None):
+            raise ValueError("lat and lon must be given together")
+        if self.radius_m is not None and not self.has_location:
+            raise ValueError("radius_m requires lat and lon")
+        if self.radius_m is not None and self.radius_m <= 0:
+            raise ValueError("radius_m must be positive")
+        if self.sort == "distance" and not self.has_location:
+            raise ValueError("sort='distance' requires lat and lon")
+        if self.uses_crowds and self.open_at is None:
+            raise ValueError("sort='least_busy' and max_busyness require open_at")
+        if self.limit < 0:
+            raise ValueError("limit must not be negative")
+
+    @property
+    def uses_crowds(self) -> bool:
+        return self.sort == "least_busy" or self.max_busyness is not None
+
+    @property
+    def has_location(self) -> bool:
+        return self.lat is not None and self.lon is not None
+
+    def normalized(self) -> "SearchQuery":
+        """
+        The query reduced to what determines the ranked match list: case and
+        surrounding whitespace folded, attributes unordered, and paging and
+        response options (limit, cursor, facets) dropped.
+        """
+        return replace(
+            self,
+            city=self.city.strip().lower(),
+            category=self.category.strip().lower(),
+            keyword=self.keyword.strip().lower(),
+            limit=0,
+            open_at_input=None,
+            attributes=tuple(sorted({a.strip().lower() for a in self.attributes})),
+            facets=False,
+            cursor=None,
+        )
+
+    def fingerprint(self) -> str:
+        """
+        Short stable digest of the normalized query, used to bind cursors to
+        it. An ``open_at`` given as input counts as that input, not the moment
+        it resolved to, so a "now" query's cursors outlive the minute.
+        """
+        key = dict(vars(self.normalized()))
+        if self.open_at_input is not None:
+            key.update(open_at=None, open_at_input=self.open_at_input.strip().lower())
+        return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(query: SearchQuery, offset: int, version: str = "") -> str:
+    """
+    Opaque cursor resuming ``query``'s ranked results at ``offset`` of
+    dataset ``version``, at the same ``open_at`` moment
+    """
+    state: Dict[str, Any] = {"q": query.fingerprint(), "o": offset, "v": version}
+    if query.open_at is not None:
+        state["t"] = query.open_at.isoformat()
+    payload = json.dumps(state, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(query: SearchQuery, version: str = "") -> Tuple[SearchQuery, int]:
+    """
+    ``query`` at the ``open_at`` moment its first page was ranked for, and
+    the offset stored in ``query.cursor`` (0 without one); rejects cursors
+    from other queries or from an older version of the dataset
+    """
+    if not query.cursor:
+        return query, 0
+    try:
+        padded = query.cursor + "=" * (-len(query.cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        fingerprint, offset, cursor_version = (
+            payload["q"],
+            int(payload["o"]),
+            payload.get("v", ""),
+        )
+        moment = datetime.fromisoformat(payload["t"]) if "t" in payload else None
+    except (
+        binascii.Error,
+        ValueError,
+        TypeError,
+        KeyError,
+        UnicodeError,
+        AttributeError,
+    ):
+        raise ValueError("Invalid cursor")
+    if (
+        fingerprint != query.fingerprint()
+        or offset < 0
+        or (moment is None) != (query.open_at is None)
+    ):
+        raise ValueError("Cursor does not belong to this query")
+    if cursor_version != version:
+        raise ValueError(
+            "The directory was updated since this cursor was issued; repeat the search"
+        )
+    return (query if moment is None else replace(query, open_at=moment)), offset
+
+
+@dataclass
+class SearchResult:
+    """
+    Ranked row ids, best first, with per-row distances for located queries,
+    closing times for ``open_at`` queries and typical busyness (percent, None
+    when unknown) for crowd-aware queries. ``facets`` counts every match, not
+    just the returned rows, when the query asks for it. ``total`` is the
+    number of matches and ``next_cursor`` resumes after the returned page.
+    ``fuzzy`` marks approximate name matches for a keyword nothing contained.
+    """
+
+    rows: List[int]
+    distance_m: Optional[List[float]] = None
+    open_until: Optional[List[Optional[str]]] = None
+    busyness: Optional[List[Optional[int]]] = None
+    facets: Optional[Dict[str, List[Dict[str, Any]]]] = None
+    total: int = 0
+    next_cursor: Optional[str] = None
+    fuzzy: bool = False
@@ -0,0 +1,210 @@
+"""
+Relevance ranking for directory search results.
+
+Two signals are precomputed per business when the engine loads:
+
+* BM25F statistics: the text index keeps per-field term frequencies and
+  field lengths; here they become per-document length-normalization factors
+  so a query only has to look up postings and do a few vector operations.
+* A Bayesian-smoothed rating: the mean of the review histogram
+  (``reviews_per_score_1..5``) shrunk towards the dataset-wide mean by
+  ``BAYES_CONFIDENCE`` pseudo-reviews. A 5.0 with one review no longer beats
+  a 4.8 with nine hundred.
+
+``top_k`` orders only the best ``k`` matches (a page and the pages before
+it) after partitioning the scores, rather than sorting every match.
+"""
+
+import math
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+from .buffers import RowBuffer
+from .crowds import UNKNOWN
+from .snapshot import REVIEW_HISTOGRAM_COLUMNS
+from .store import BusinessStore
+from .text_index import TextIndex, tokenize
+
+# How much a keyword hit in each field counts towards relevance
+FIELD_WEIGHTS: Dict[str, float] = {
+    "name": 3.0,
+    "subtypes": 2.0,
+    "description": 1.0,
+    "about": 0.5,
+    "full_address": 0.5,
+}
+
+# Standard BM25 saturation and length-normalization parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Pseudo-reviews at the dataset mean added to every business
+BAYES_CONFIDENCE = 10.0
+
+# Share of the relevance score given to text match vs. smoothed rating
+TEXT_WEIGHT = 0.7
+
+SORT_OPTIONS = ("relevance", "rating", "distance", "least_busy")
+
+
+def _as_counts(store: BusinessStore, name: str) -> np.ndarray:
+    values = np.asarray(store.column(name), dtype=np.float64)
+    return np.nan_to_num(values, nan=0.0)
+
+
+def review_totals(
+    histogram: np.ndarray, reviews: np.ndarray, rating: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Review count and sum of scores per row from (rows, 5) score histograms"""
+    counts = histogram.sum(axis=1)
+    totals = histogram @ np.arange(1, 6, dtype=np.float64)
+    # Rows without a histogram fall back to rating x review count.
+    no_histogram = counts == 0
+    counts[no_histogram] = reviews[no_histogram]
+    totals[no_histogram] = (rating * reviews)[no_histogram]
+    return counts, totals
+
+
+def _store_review_totals(store: BusinessStore) -> Tuple[np.ndarray, np.ndarray]:
+    histogram = np.stack(
+        [_as_counts(store, name) for name in REVIEW_HISTOGRAM_COLUMNS], axis=1
+    )
+    return review_totals(
+        histogram, _as_counts(store, "reviews"), _as_counts(store, "rating")
+    )
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the ``k`` highest ``scores``, best first; ties keep
+    position order. Equal to the first ``k`` of a stable descending sort,
+    so consecutive pages never repeat or skip a tied row.
+    """
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    kth = np.partition(-scores, k - 1)[k - 1]
+    better = np.flatnonzero(-scores < kth)
+    tied = np.flatnonzero(-scores == kth)[: k - len(better)]
+    chosen = np.sort(np.concatenate([better, tied]))
+    return chosen[np.argsort(-scores[chosen], kind="stable")]
+
+
+class Ranker:
+    """Per-row ranking signals and the sort keys of a query's matches"""
+
+    def __init__(self, store: BusinessStore, text_index: TextIndex):
+        self.text_index = text_index
+        self.rows = len(store)
+
+        lengths = text_index.field_lengths.astype(np.float32)
+        average = (
+            lengths.mean(axis=0) if len(lengths) else np.ones(len(text_index.fields))
+        )
+        average[average == 0] = 1.0
+        # (1 - b + b * len / avglen) for every row and field
+        self.length_norm = (1.0 - BM25_B) + BM25_B * lengths / average
+        self.field_weights = np.array(
+            [FIELD_WEIGHTS.get(field, 1.0) for field in text_index.fields],
+            dtype=np.float32,
+        )
+        counts, totals = _store_review_totals(store)
+        self.rating_prior = totals.sum() / counts.sum() if counts.sum() else 0.0
+        self.smoothed_rating = (BAYES_CONFIDENCE * self.rating_prior + totals) / (
+            BAYES_CONFIDENCE + counts
+        )
+        self._average_length = average
+        self._norms: Optional[RowBuffer] = None
+        self._ratings: Optional[RowBuffer] = None
+
+    def add_row(self, row: int, record: Mapping[str, Any]) -> None:
+        """
+        Score one appended row, after the text index has indexed it. Length
+        averages and the rating prior keep their load-time values until the
+        next snapshot.
+        """
+        if self._norms is None or self._ratings is None:
+            self._norms = RowBuffer(self.length_norm)
+            self._ratings = RowBuffer(self.smoothed_rating)
+
+        def number(name: str) -> float:
+            value = record.get(name)
+            return 0.0 if value is None or value != value else float(value)
+
+        lengths = self.text_index.field_lengths[row].astype(np.float32)
+        self.length_norm = self._norms.append(
+            (1.0 - BM25_B) + BM25_B * lengths / self._average_length
+        )
+        histogram = np.array([[number(name) for name in REVIEW_HISTOGRAM_COLUMNS]])
+        counts, totals = review_totals(
+            histogram, np.array([number("reviews")]), np.array([number("rating")])
+        )
+        rating = (BAYES_CONFIDENCE * self.rating_prior + totals[0]) / (
+            BAYES_CONFIDENCE + counts[0]
+        )
+        self.smoothed_rating = self._ratings.append(rating)
+        self.rows = row + 1
+
+    def bm25(self, keyword: str, rows: np.ndarray) -> np.ndarray:
+        """BM25F score of each of ``rows`` (sorted) for ``keyword``"""
+        scores = np.zeros(len(rows), dtype=np.float64)
+        if not len(rows):
+            return scores
+        for fragment in set(tokenize(keyword)):
+            hit_rows, freqs = self.text_index.fragment_postings(fragment)
+            if not len(hit_rows):
+                continue
+            doc_freq = len(hit_rows)
+            idf = math.log(1.0 + (self.rows - doc_freq + 0.5) / (doc_freq + 0.5))
+
+            # Keep only postings that are in the candidate set.
+            positions = np.searchsorted(rows, hit_rows)
+            positions[positions == len(rows)] = 0
+            present = rows[positions] == hit_rows
+            if not present.any():
+                continue
+            weighted = (
+                freqs[present] / self.length_norm[hit_rows[present]]
+            ) @ self.field_weights
+            scores[positions[present]] += idf * weighted / (BM25_K1 + weighted)
+        return scores
+
+    def scores(
+        self,
+        rows: np.ndarray,
+        keyword: str = "",
+        sort: str = "relevance",
+        distance_m: Optional[np.ndarray] = None,
+        busyness: Optional[np.ndarray] = None,
+        text: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Sort keys for ``rows``; higher ranks first. ``text`` replaces the
+        BM25F keyword relevance, e.g. with fuzzy-match similarity.
+        """
+        if sort not in SORT_OPTIONS:
+            raise ValueError(
+                f"Unknown sort '{sort}'. Expected one of: {', '.join(SORT_OPTIONS)}"
+            )
+        if sort == "distance":
+            if distance_m is None:
+                raise ValueError("sort='distance' requires a location")
+            # Closest first; rows without coordinates go last.
+            return np.nan_to_num(-distance_m, nan=-np.inf)
+        rating = self.smoothed_rating[rows] / 5.0
+        if sort == "least_busy":
+            if busyness is None:
+                raise ValueError("sort='least_busy' requires a time")
+            # Quietest first; no data ranks after the busiest. Rating breaks ties.
+            crowd = np.where(busyness == UNKNOWN, 101, busyness).astype(np.float64)
+            return -crowd + 0.01 * rating
+        if sort == "rating" or not (keyword and keyword.strip()):
+            return rating
+        if text is None:
+            text = self.bm25(keyword, rows)
+        top = text.max() if len(text) else 0.0
+        if top > 0:
+            text = text / top
+        return TEXT_WEIGHT * text + (1.0 - TEXT_WEIGHT) * rating
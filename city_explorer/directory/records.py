@@ -0,0 +1,132 @@
+"""
+Pre-rendered business records for search responses.
+
+Every business's result object is serialized to JSON once when the engine
+loads, and again only when a live edit replaces its row. A response is then
+the selected rows' fragments joined together, with the few per-query extras
+(distance, closing time, busyness) spliced in: no DataFrame, per-row dicts or
+response models in between. The ``hours`` member has a fragment of its own
+so ``open_at`` queries, which report ``open_until`` instead, can leave it out.
+"""
+
+import json
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+from .query import SearchResult
+from .store import BusinessStore
+
+# (result key, store column), in response order around the hours member
+HEAD_FIELDS = [
+    ("id", "id"),
+    ("name", "name"),
+    ("type", "category"),
+    ("address", "full_address"),
+    ("phone", "phone"),
+    ("website", "site"),
+]
+HOURS_FIELD = ("hours", "working_hours")
+TAIL_FIELDS = [
+    ("rating", "rating"),
+    ("reviews", "reviews"),
+    ("description", "description"),
+    ("google_maps", "location_link"),
+]
+
+# Statuses that need no mention in a result
+DEFAULT_STATUS = "OPERATIONAL"
+
+
+def _dumps(value: Any) -> str:
+    # Same encoding as FastAPI's JSONResponse
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+
+def _members(pairs: Sequence[Tuple[str, Any]]) -> str:
+    return ",".join(f"{_dumps(key)}:{_dumps(value)}" for key, value in pairs)
+
+
+class BusinessRecords:
+    """JSON fragments of every row's result object"""
+
+    def __init__(self, store: BusinessStore):
+        names = [column for _, column in HEAD_FIELDS + [HOURS_FIELD] + TAIL_FIELDS] + [
+            "business_status"
+        ]
+        columns = {name: self._column(store, name) for name in names if name in store}
+        self._head: List[bytes] = []
+        self._hours: List[bytes] = []
+        self._tail: List[bytes] = []
+        for row in range(len(store)):
+            self._render({name: values[row] for name, values in columns.items()})
+
+    @staticmethod
+    def _column(store: BusinessStore, name: str) -> List[Any]:
+        col = store.column(name)
+        if hasattr(col, "to_list"):
+            return col.to_list()
+        # Numeric columns: NaN is rendered as null
+        return [store.value(row, name) for row in range(len(col))]
+
+    def _render(self, record: Mapping[str, Any]) -> None:
+        head = _members([(key, record.get(column)) for key, column in HEAD_FIELDS])
+        tail_pairs = [(key, record.get(column)) for key, column in TAIL_FIELDS]
+        status = record.get("business_status")
+        if status and status != DEFAULT_STATUS:
+            # e.g. CLOSED_TEMPORARILY; searches never return permanently closed places.
+            tail_pairs.append(("business_status", status))
+        self._head.append(("{" + head).encode("utf-8"))
+        self._hours.append(
+            ("," + _members([(HOURS_FIELD[0], record.get(HOURS_FIELD[1]))])).encode(
+                "utf-8"
+            )
+        )
+        self._tail.append(("," + _members(tail_pairs)).encode("utf-8"))
+
+    def add_row(self, row: int, record: Mapping[str, Any]) -> None:
+        """Render one appended row (``row`` must be the next row id)"""
+        assert row == len(self._head)
+        self._render(record)
+
+    def fragment(
+        self, row: int, hours: bool = True, extras: Sequence[Tuple[str, Any]] = ()
+    ) -> bytes:
+        """One row's result object, optionally without hours and with extra members"""
+        parts = [self._head[row]]
+        if hours:
+            parts.append(self._hours[row])
+        parts.append(self._tail[row])
+        if extras:
+            parts.append(("," + _members(extras)).encode("utf-8"))
+        parts.append(b"}")
+        return b"".join(parts)
+
+    def render(self, result: SearchResult) -> bytes:
+        """JSON array of a search page's result objects, with per-query extras"""
+        fragments = []
+        for i, row in enumerate(result.rows):
+            extras: List[Tuple[str, Any]] = []
+            if result.distance_m is not None:
+                distance = result.distance_m[i]
+                extras.append(
+                    ("distance_m", None if distance != distance else round(distance))
+                )
+            if result.open_until is not None:
+                # Already evaluated; no need to send the raw hours JSON.
+                extras.append(("open_until", result.open_until[i]))
+            if result.busyness is not None:
+                extras.append(("busyness_pct", result.busyness[i]))
+            if result.fuzzy:
+                # Nothing contained the keyword; these are similarly spelt names.
+                extras.append(("approximate_match", True))
+            fragments.append(
+                self.fragment(row, hours=result.open_until is None, extras=extras)
+            )
+        return b"[" + b",".join(fragments) + b"]"
+
+    def businesses(self, result: SearchResult) -> List[Dict[str, Any]]:
+        """The result objects of a search page as dicts, e.g. for agent tools"""
+        return json.loads(self.render(result))
+
+    def business(self, row: int) -> Dict[str, Any]:
+        """One row's result object as a dict"""
+        return json.loads(self.fragment(row))
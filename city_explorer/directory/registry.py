@@ -0,0 +1,470 @@
+"""
+Registry of per-city business datasets.
+
+Each city is one CSV (``<City>_Identifies_as_Black_Owned_nominees.csv``)
+and/or one compiled snapshot directory under ``data/snapshots/<city>``. The
+registry discovers them without opening any, loads a city's store and
+indexes on first use, and evicts the least recently used cities once the
+loaded ones exceed a memory budget, so a worker serving Oakland traffic
+never holds Houston. A background watcher rebuilds stale snapshots and
+swaps newer ones in without blocking requests.
+
+Live edits go through ``Dataset.upsert`` and ``Dataset.delete``: each is
+written to the city's change log (``data/wal/<city>.jsonl``) and then
+applied to the loaded engine. The watcher replays entries written by other
+workers and compacts the log into a new snapshot once it grows long.
+"""
+
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .engine import DirectoryEngine
+from .ingest import business_id as key_to_id
+from .memory import deep_size, memory_report, snapshot_bytes
+from .snapshot import (
+    DATA_DIR,
+    DEFAULT_CITY,
+    META_FILE,
+    build_snapshot,
+    is_fresh,
+    snapshot_version,
+)
+from .store import BusinessStore, load_store
+from .updates import (
+    COMPACT_AFTER,
+    ChangeLog,
+    apply_entry,
+    clean_fields,
+    compact_changes,
+)
+
+logger = logging.getLogger(__name__)
+
+CSV_SUFFIX = "_Identifies_as_Black_Owned_nominees.csv"
+
+# Loaded cities beyond this many snapshot bytes are evicted, coldest first.
+MEMORY_BUDGET_BYTES = int(os.getenv("DIRECTORY_MEMORY_BUDGET_MB", "512")) * 1024 * 1024
+
+# How often the watcher looks for new snapshots or changed CSVs; 0 disables it.
+RELOAD_INTERVAL_S = float(os.getenv("DIRECTORY_RELOAD_INTERVAL_S", "30"))
+
+
+def city_slug(city: str) -> str:
+    """Registry key for a city name: "San Francisco" -> "san_francisco" """
+    return re.sub(r"[^a-z0-9]+", "_", city.strip().lower()).strip("_")
+
+
+def city_name(slug: str) -> str:
+    """Display name for a registry key: "san_francisco" -> "San Francisco" """
+    return " ".join(part.capitalize() for part in slug.split("_"))
+
+
+@dataclass(frozen=True)
+class CitySource:
+    """Where one city's data lives; the CSV may be absent in deployments"""
+
+    slug: str
+    csv_path: str
+    snapshot_dir: str
+    wal_path: str
+
+
+def discover_cities(data_dir: str = DATA_DIR) -> Dict[str, CitySource]:
+    """Every city with a source CSV or a compiled snapshot, without loading any"""
+    snapshots = os.path.join(data_dir, "snapshots")
+    slugs = {}
+    if os.path.isdir(data_dir):
+        for entry in os.listdir(data_dir):
+            if entry.endswith(CSV_SUFFIX):
+                slugs[city_slug(entry[: -len(CSV_SUFFIX)])] = os.path.join(
+                    data_dir, entry
+                )
+    if os.path.isdir(snapshots):
+        for entry in os.listdir(snapshots):
+            if os.path.exists(os.path.join(snapshots, entry, META_FILE)):
+                slugs.setdefault(
+                    entry,
+                    os.path.join(
+                        data_dir, f"{city_name(entry).replace(' ', '_')}{CSV_SUFFIX}"
+                    ),
+                )
+    return {
+        slug: CitySource(
+            slug,
+            csv_path,
+            os.path.join(snapshots, slug),
+            os.path.join(data_dir, "wal", f"{slug}.jsonl"),
+        )
+        for slug, csv_path in sorted(slugs.items())
+    }
+
+
+class DatasetVersion:
+    """
+    One generation of a city's data: a snapshot's store, the engine over it
+    and the live edits applied since
+    """
+
+    def __init__(self, store: BusinessStore):
+        self.store = store
+        self.version = store.version
+        # Last change-log entry reflected in this generation
+        self.applied_seq = int(store.meta.get("wal_seq", 0))
+        self._engine: Optional[DirectoryEngine] = None
+        self._lock = threading.Lock()
+        # Heap bytes of the engine as built, and of the rows live edits appended since
+        self._built_bytes = 0
+        self._live_bytes = 0
+        self._measured_rows = 0
+
+    @property
+    def engine(self) -> DirectoryEngine:
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    engine = DirectoryEngine(self.store)
+                    self._built_bytes = deep_size(engine)
+                    self._measured_rows = len(self.store)
+                    self._engine = engine
+        return self._engine
+
+    def heap_bytes(self) -> int:
+        """
+        Approximate heap bytes of the engine, 0 until it is built: measured
+        once after the build, plus each row appended since, measured once
+        """
+        if self._engine is None:
+            return 0
+        with self._lock:
+            store = self.store
+            while self._measured_rows < len(store):
+                self._live_bytes += deep_size(store.record(self._measured_rows))
+                self._measured_rows += 1
+            return self._built_bytes + self._live_bytes
+
+    def catch_up(self, log: ChangeLog) -> int:
+        """Apply the log entries this generation has not seen yet; returns how many"""
+        entries = log.entries(after=self.applied_seq)
+        if not entries:
+            return 0
+        engine = self.engine
+        for entry in entries:
+            apply_entry(engine, entry)
+            self.applied_seq = entry["seq"]
+        # Rankings changed: cursors issued before the edits must not resume.
+        self.version = engine.version = f"{self.store.version}+{self.applied_seq}"
+        return len(entries)
+
+
+class Dataset:
+    """
+    One city's current data generation, loaded on first access and replaced
+    wholesale by ``reload`` when a newer snapshot appears
+    """
+
+    def __init__(self, source: CitySource):
+        self.source = source
+        self.log = ChangeLog(source.wal_path)
+        self._current: Optional[DatasetVersion] = None
+        # Reentrant: edits and compaction load and reload under it.
+        self._lock = threading.RLock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._current is not None
+
+    def current(self) -> DatasetVersion:
+        current = self._current
+        if current is None:
+            with self._lock:
+                if self._current is None:
+                    # A stale snapshot is rebuilt once, under the log's lock.
+                    with self.log.locked():
+                        store = load_store(
+                            self.source.csv_path, self.source.snapshot_dir
+                        )
+                    loaded = DatasetVersion(store)
+                    loaded.catch_up(self.log)
+                    self._current = loaded
+                current = self._current
+        return current
+
+    @property
+    def store(self) -> BusinessStore:
+        return self.current().store
+
+    @property
+    def engine(self) -> DirectoryEngine:
+        return self.current().engine
+
+    @property
+    def version(self) -> Optional[str]:
+        current = self._current
+        return current.version if current is not None else None
+
+    def reload(self) -> bool:
+        """
+        Rebuild a stale snapshot and swap in any newer build, then apply log
+        entries written by other workers. The new store is fully mapped and
+        its engine built and caught up with the log before the swap, which is
+        a single reference assignment: requests already holding the old
+        engine finish on it, later ones get the new one. Returns True when
+        the data changed.
+        """
+        current = self._current
+        if current is None:
+            return False
+        with self._lock:
+            with self.log.locked():
+                # Checked under the lock: another worker may have just rebuilt it.
+                if os.path.exists(self.source.csv_path) and not is_fresh(
+                    self.source.snapshot_dir, self.source.csv_path
+                ):
+                    build_snapshot(self.source.csv_path, self.source.snapshot_dir)
+            if snapshot_version(self.source.snapshot_dir) in (
+                None,
+                current.store.version,
+            ):
+                return current.catch_up(self.log) > 0
+            fresh = DatasetVersion(BusinessStore(self.source.snapshot_dir).map_all())
+            # Build the indexes here rather than on the first request after the swap.
+            fresh.engine
+            fresh.catch_up(self.log)
+            self._current = fresh
+        logger.info(
+            "Reloaded %s directory: version %s -> %s",
+            self.source.slug,
+            current.version,
+            fresh.version,
+        )
+        return True
+
+    def upsert(
+        self,
+        fields: Dict[str, Any],
+        business_id: Optional[int] = None,
+        place_id: Optional[str] = None,
+    ) -> Optional[int]:
+        """
+        Log and apply a change to one business: ``business_id`` edits an
+        existing one, ``place_id`` edits or adds the business with that Google
+        place. Returns the business id, or None when ``business_id`` is unknown.
+        """
+        cleaned = clean_fields(fields)
+        with self._lock:
+            current = self.current()
+            if business_id is None:
+                if not place_id:
+                    raise ValueError(
+                        "Give the id of an existing business "
+                        "or the place_id of a new one"
+                    )
+                business_id = key_to_id(place_id)
+                if current.store.row_of(business_id) is None:
+                    if not cleaned.get("name"):
+                        raise ValueError("A new business needs a name")
+                    cleaned["place_id"] = place_id
+            elif current.store.row_of(business_id) is None:
+                return None
+            self.log.append("upsert", business_id, cleaned)
+            current.catch_up(self.log)
+        return business_id
+
+    def delete(self, business_id: int) -> bool:
+        """Log and apply the removal of one business; False if it does not exist"""
+        with self._lock:
+            current = self.current()
+            if current.store.row_of(business_id) is None:
+                return False
+            self.log.append("delete", business_id)
+            current.catch_up(self.log)
+        return True
+
+    def pending_changes(self) -> int:
+        """Logged edits not yet folded into a snapshot"""
+        return len(self.log.entries())
+
+    def compact(self) -> Optional[int]:
+        """Fold the change log into the CSV and a new snapshot, and swap it in"""
+        with self._lock:
+            seq = compact_changes(
+                self.log, self.source.csv_path, self.source.snapshot_dir
+            )
+            if seq is not None:
+                self.reload()
+        return seq
+
+    def footprint(self) -> int:
+        """
+        Approximate resident size: the snapshot's mapped bytes, which bound the
+        mapped pages, plus the heap of the engine built over them, live-edited
+        rows included. Cold detail records are read from disk and do not count.
+        """
+        current = self._current
+        if current is None:
+            return 0
+        return (
+            snapshot_bytes(self.source.snapshot_dir)["mapped_bytes"]
+            + current.heap_bytes()
+        )
+
+    def unload(self) -> None:
+        """Drop the store and indexes; in-flight users keep their references"""
+        with self._lock:
+            self._current = None
+
+
+class DatasetRegistry:
+    """Discovered cities with lazy loading and LRU eviction under a memory budget"""
+
+    def __init__(
+        self, data_dir: str = DATA_DIR, memory_budget: int = MEMORY_BUDGET_BYTES
+    ):
+        self.data_dir = data_dir
+        self.memory_budget = memory_budget
+        self._lock = threading.Lock()
+        self._datasets: Dict[str, Dataset] = {}
+        # Loaded city slugs, least recently used first
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Pick up cities added to the data directory since the last scan"""
+        sources = discover_cities(self.data_dir)
+        with self._lock:
+            for slug, source in sources.items():
+                if slug not in self._datasets:
+                    self._datasets[slug] = Dataset(source)
+
+    def cities(self) -> List[str]:
+        return sorted(self._datasets)
+
+    def dataset(self, city: str = DEFAULT_CITY) -> Dataset:
+        """The dataset for ``city``, marked as most recently used"""
+        slug = city_slug(city)
+        dataset = self._datasets.get(slug)
+        if dataset is None:
+            self.refresh()
+            dataset = self._datasets.get(slug)
+        if dataset is None:
+            available = ", ".join(city_name(s) for s in self.cities()) or "none"
+            raise ValueError(f"Unknown city '{city}'. Available cities: {available}")
+        with self._lock:
+            self._recent[slug] = None
+            self._recent.move_to_end(slug)
+        return dataset
+
+    def engine(self, city: str = DEFAULT_CITY) -> DirectoryEngine:
+        engine = self.dataset(city).engine
+        self._evict(keep=city_slug(city))
+        return engine
+
+    def store(self, city: str = DEFAULT_CITY) -> BusinessStore:
+        store = self.dataset(city).store
+        self._evict(keep=city_slug(city))
+        return store
+
+    def _evict(self, keep: str) -> None:
+        with self._lock:
+            loaded = [slug for slug in self._recent if self._datasets[slug].loaded]
+            total = sum(self._datasets[slug].footprint() for slug in loaded)
+            for slug in loaded:
+                if total <= self.memory_budget:
+                    break
+                if slug == keep:
+                    continue
+                total -= self._datasets[slug].footprint()
+                self._datasets[slug].unload()
+                del self._recent[slug]
+
+    def reload(self) -> List[str]:
+        """Swap in newer data for every loaded city; returns the cities that changed"""
+        self.refresh()
+        changed = []
+        for slug, dataset in list(self._datasets.items()):
+            try:
+                if dataset.reload():
+                    changed.append(slug)
+                if dataset.loaded and dataset.pending_changes() >= COMPACT_AFTER:
+                    dataset.compact()
+            except Exception:
+                # Keep serving the current generation; retry on the next pass.
+                logger.exception("Reloading the %s directory failed", slug)
+        return changed
+
+    def start_watcher(self, interval: float = RELOAD_INTERVAL_S) -> None:
+        """Reload in a background thread every ``interval`` seconds"""
+        if interval <= 0 or self._watcher is not None:
+            return
+        self._stop.clear()
+
+        def watch() -> None:
+            while not self._stop.wait(interval):
+                self.reload()
+
+        self._watcher = threading.Thread(
+            target=watch, name="directory-reload", daemon=True
+        )
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Every city: whether it is loaded, data version and approximate footprint"""
+        return [
+            {
+                "city": city_name(slug),
+                "slug": slug,
+                "loaded": d.loaded,
+                "version": d.version,
+                "bytes": d.footprint(),
+            }
+            for slug, d in sorted(self._datasets.items())
+        ]
+
+    def memory_report(self) -> Dict[str, Any]:
+        """
+        This worker's resident size and each city's heap, mapped and disk-only
+        bytes (see ``memory``)
+        """
+        return memory_report(dataset for _, dataset in sorted(self._datasets.items()))
+
+
+# Process-wide registry shared by every tool instance
+_registry: Optional[DatasetRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> DatasetRegistry:
+    """
+    Return the shared dataset registry; the first call scans the data
+    directory and starts the watcher
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = DatasetRegistry()
+                _registry.start_watcher()
+    return _registry
+
+
+def get_store(city: str = DEFAULT_CITY) -> BusinessStore:
+    """Return the shared business store for ``city``, loading it on first use"""
+    return get_registry().store(city)
+
+
+def get_engine(city: str = DEFAULT_CITY) -> DirectoryEngine:
+    """Return the shared engine for ``city``, building its indexes on first use"""
+    return get_registry().engine(city)
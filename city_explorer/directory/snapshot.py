@@ -0,0 +1,484 @@
+"""
+Compile the Outscraper nominee CSV into a compact, memory-mappable snapshot.
+
+Rows are first merged into one per business by ``ingest.canonicalize``. A
+snapshot is a directory holding one file per column plus a ``meta.json``
+manifest. Numeric columns are stored as ``.npy`` arrays, text columns as a
+UTF-8 blob with an int64 offsets array, and low-cardinality text columns as
+integer codes with a label table. Opening hours are parsed once here into
+flat weekly minute intervals, popular times into a dense weekday/hour
+busyness array and the ``about`` flags into per-attribute bitsets.
+Everything is opened with ``mmap`` so workers share the pages through the
+OS cache instead of each parsing the CSV.
+
+Only the columns searches read are kept in those layouts. Heavy fields that
+only a detail view shows (photos, links, posts, the raw popular times) are
+packed per row into one ``details`` record column that is never mapped:
+``BusinessStore.details`` reads a single row from disk when asked. The other
+Outscraper columns are dropped at ingest.
+
+Each build is its own directory under ``<snapshot_dir>.versions`` and
+``snapshot_dir`` is a symlink to the current one, replaced in a single
+rename: readers always find a complete snapshot there, and stores opened
+from an older build keep reading it.
+
+The ``google`` record column holds each business's Google Places enrichment
+as exported by the pre-warm job (``city_explorer.places.prewarm`` through
+``attach_enrichment``); rebuilds carry it over by ``place_id``.
+
+Usage:
+    python -m city_explorer.directory.snapshot                  # every city CSV
+    python -m city_explorer.directory.snapshot csv_path [snapshot_dir]
+"""
+
+import json
+import os
+import shutil
+import sys
+import time
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from .attributes import build_attribute_bitsets
+from .crowds import build_crowd_matrix
+from .hours import flatten_hours
+from .ingest import KEY_COLUMNS, canonicalize
+
+SNAPSHOT_VERSION = 11
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+DEFAULT_CSV = os.path.join(DATA_DIR, "Oakland_Identifies_as_Black_Owned_nominees.csv")
+DEFAULT_CITY = "oakland"
+DEFAULT_SNAPSHOT_DIR = os.path.join(DATA_DIR, "snapshots", DEFAULT_CITY)
+
+# Columns the search tools actually read, and how each one is stored.
+TEXT_COLUMNS = [
+    "name",
+    "subtypes",
+    "full_address",
+    "phone",
+    "site",
+    "working_hours",
+    "description",
+    "about",
+    "location_link",
+    "place_id",
+    "google_id",
+    "tags",
+]
+CATEGORICAL_COLUMNS = ["category", "type", "time_zone", "borough", "business_status"]
+REVIEW_HISTOGRAM_COLUMNS = [f"reviews_per_score_{score}" for score in range(1, 6)]
+FLOAT_COLUMNS = [
+    "rating",
+    "reviews",
+    "latitude",
+    "longitude",
+] + REVIEW_HISTOGRAM_COLUMNS
+
+# Stable integer business id assigned by ``canonicalize``
+ID_COLUMN = "id"
+
+# Derived per-row interval lists: name -> source text column
+INTERVAL_COLUMNS = {"open_hours": "working_hours"}
+
+# Derived (rows, 7, 24) weekday/hour arrays: name -> source JSON column
+HOURLY_COLUMNS = {"crowds": "popular_times"}
+
+# Derived per-attribute packed bitsets: name -> source JSON column
+BITSET_COLUMNS = {"attributes": "about"}
+
+# Cold columns only shown in detail views, stored per row as one JSON object
+DETAILS_COLUMN = "details"
+DETAIL_COLUMNS = [
+    "photo",
+    "photos_count",
+    "logo",
+    "street_view",
+    "reviews_link",
+    "location_reviews_link",
+    "reviews_tags",
+    "posts",
+    "popular_times",
+    "other_hours",
+    "typical_time_spent",
+    "range",
+    "prices",
+    "located_in",
+    "menu_link",
+    "order_links",
+    "reservation_links",
+    "booking_appointment_link",
+    "owner_title",
+    "owner_link",
+    "verified",
+]
+
+# Google Places enrichment per row: {field group: [fields, fetched_at]}
+ENRICHMENT_COLUMN = "google"
+
+META_FILE = "meta.json"
+
+# Builds live in this sibling of the snapshot path, which links to one of them.
+VERSIONS_SUFFIX = ".versions"
+# Builds kept on disk: the current one and the one workers may still be reloading from.
+KEEP_VERSIONS = 2
+
+
+def _source_fingerprint(csv_path: str) -> Dict[str, Any]:
+    """Identify a CSV revision cheaply so stale snapshots can be detected"""
+    stat = os.stat(csv_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _write_text(out_dir: str, name: str, values: List[Optional[str]]) -> Dict[str, Any]:
+    """Write a text column as a UTF-8 blob plus offsets and a missing-value mask"""
+    offsets = np.empty(len(values) + 1, dtype=np.int64)
+    missing = np.zeros(len(values), dtype=bool)
+    chunks = []
+    position = 0
+    for i, value in enumerate(values):
+        offsets[i] = position
+        if value is None:
+            missing[i] = True
+            continue
+        encoded = value.encode("utf-8")
+        chunks.append(encoded)
+        position += len(encoded)
+    offsets[len(values)] = position
+
+    with open(os.path.join(out_dir, f"{name}.bin"), "wb") as f:
+        f.write(b"".join(chunks))
+    np.save(os.path.join(out_dir, f"{name}.offsets.npy"), offsets)
+    np.save(os.path.join(out_dir, f"{name}.missing.npy"), missing)
+    return {"kind": "text"}
+
+
+def _write_categorical(
+    out_dir: str, name: str, values: List[Optional[str]]
+) -> Dict[str, Any]:
+    """Write a low-cardinality column as int16 codes; -1 marks a missing value"""
+    labels = sorted({v for v in values if v is not None})
+    lookup = {label: code for code, label in enumerate(labels)}
+    codes = np.array(
+        [lookup[v] if v is not None else -1 for v in values], dtype=np.int16
+    )
+    np.save(os.path.join(out_dir, f"{name}.codes.npy"), codes)
+    return {"kind": "categorical", "labels": labels}
+
+
+def _write_float(out_dir: str, name: str, values: "pd.Series") -> Dict[str, Any]:
+    """Write a numeric column as float64; NaN marks a missing value"""
+    array = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+    np.save(os.path.join(out_dir, f"{name}.npy"), array)
+    return {"kind": "float"}
+
+
+def _write_ids(out_dir: str, name: str, values: "pd.Series") -> Dict[str, Any]:
+    """Write the business id column as int64"""
+    np.save(os.path.join(out_dir, f"{name}.npy"), values.to_numpy(dtype=np.int64))
+    return {"kind": "id"}
+
+
+def _write_intervals(
+    out_dir: str, name: str, values: List[Optional[str]]
+) -> Dict[str, Any]:
+    """Write parsed opening hours as flat (row, start, end) interval arrays"""
+    rows, starts, ends = flatten_hours(values)
+    np.save(os.path.join(out_dir, f"{name}.rows.npy"), rows)
+    np.save(os.path.join(out_dir, f"{name}.starts.npy"), starts)
+    np.save(os.path.join(out_dir, f"{name}.ends.npy"), ends)
+    return {"kind": "intervals"}
+
+
+def _write_hourly(
+    out_dir: str, name: str, values: List[Optional[str]]
+) -> Dict[str, Any]:
+    """Write decoded popular times as a dense (rows, 7, 24) uint8 array"""
+    np.save(os.path.join(out_dir, f"{name}.npy"), build_crowd_matrix(values))
+    return {"kind": "hourly"}
+
+
+def _write_bitsets(
+    out_dir: str, name: str, values: List[Optional[str]]
+) -> Dict[str, Any]:
+    """Write the true flags of each ``about`` value as per-attribute packed bitsets"""
+    names, groups, bitsets = build_attribute_bitsets(values)
+    np.save(os.path.join(out_dir, f"{name}.npy"), bitsets)
+    return {"kind": "bitsets", "labels": names, "groups": groups}
+
+
+def _write_json_rows(
+    out_dir: str, name: str, values: List[Optional[Mapping[str, Any]]]
+) -> Dict[str, Any]:
+    """Write one JSON object per row (empty or None: missing) as a text column"""
+    encoded = [
+        json.dumps(value, ensure_ascii=False, separators=(",", ":")) if value else None
+        for value in values
+    ]
+    _write_text(out_dir, name, encoded)
+    return {"kind": "records"}
+
+
+def _write_records(
+    out_dir: str, name: str, df: "pd.DataFrame", columns: List[str]
+) -> Dict[str, Any]:
+    """Write each row's non-missing ``columns`` as one JSON object"""
+    cells = {column: df[column].tolist() for column in columns if column in df}
+    records = [
+        {
+            column: _plain(cell[i])
+            for column, cell in cells.items()
+            if not pd.isna(cell[i])
+        }
+        for i in range(len(df))
+    ]
+    return {**_write_json_rows(out_dir, name, records), "fields": columns}
+
+
+def _read_text(snapshot_dir: str, name: str) -> List[Optional[str]]:
+    """Decode a whole text or record column of a written snapshot"""
+    offsets = np.load(os.path.join(snapshot_dir, f"{name}.offsets.npy")).tolist()
+    missing = np.load(os.path.join(snapshot_dir, f"{name}.missing.npy")).tolist()
+    with open(os.path.join(snapshot_dir, f"{name}.bin"), "rb") as f:
+        data = f.read()
+    return [
+        None if missing[i] else data[offsets[i] : offsets[i + 1]].decode("utf-8")
+        for i in range(len(missing))
+    ]
+
+
+def _read_enrichment(snapshot_dir: str) -> Dict[str, Any]:
+    """place_id -> enrichment of the snapshot at ``snapshot_dir``, if it has any"""
+    meta = read_meta(snapshot_dir)
+    if (
+        meta is None
+        or ENRICHMENT_COLUMN not in meta["columns"]
+        or "place_id" not in meta["columns"]
+    ):
+        return {}
+    rows = zip(
+        _read_text(snapshot_dir, "place_id"),
+        _read_text(snapshot_dir, ENRICHMENT_COLUMN),
+    )
+    return {
+        place_id: json.loads(value) for place_id, value in rows if place_id and value
+    }
+
+
+def _plain(value: Any) -> Any:
+    """A CSV cell as a JSON-serializable value"""
+    if isinstance(value, (np.integer, np.floating, np.bool_)):
+        value = value.item()
+    # Counts read as floats when the column has gaps
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _as_optional_str(series: "pd.Series") -> List[Optional[str]]:
+    """Convert a pandas column to a list of str, with None for missing cells"""
+    return [None if pd.isna(v) else str(v) for v in series.tolist()]
+
+
+def build_snapshot(
+    csv_path: str = DEFAULT_CSV, out_dir: str = DEFAULT_SNAPSHOT_DIR, wal_seq: int = 0
+) -> str:
+    """
+    Compile ``csv_path`` into a snapshot directory at ``out_dir``.
+
+    The snapshot is written to a temporary sibling directory and swapped in
+    by ``_replace_dir``, so readers never observe a half-written or missing
+    snapshot. Concurrent builders of one city must hold its change-log
+    lock (``updates.ChangeLog.locked``). ``wal_seq`` is
+    the last change-log entry already folded into the CSV (see ``updates``).
+    """
+    usecols = (
+        TEXT_COLUMNS
+        + CATEGORICAL_COLUMNS
+        + FLOAT_COLUMNS
+        + KEY_COLUMNS
+        + ["query"]
+        + list(INTERVAL_COLUMNS.values())
+        + list(HOURLY_COLUMNS.values())
+        + DETAIL_COLUMNS
+    )
+    raw = pd.read_csv(csv_path, usecols=lambda c: c in usecols, low_memory=False)
+    # One row per business: every index and cache downstream is keyed on it.
+    df = canonicalize(raw)
+    enrichment = _read_enrichment(out_dir)
+
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    columns: Dict[str, Dict[str, Any]] = {
+        ID_COLUMN: _write_ids(tmp_dir, ID_COLUMN, df[ID_COLUMN])
+    }
+    for name in TEXT_COLUMNS:
+        values = _as_optional_str(df[name]) if name in df else [None] * len(df)
+        columns[name] = _write_text(tmp_dir, name, values)
+    for name in CATEGORICAL_COLUMNS:
+        values = _as_optional_str(df[name]) if name in df else [None] * len(df)
+        columns[name] = _write_categorical(tmp_dir, name, values)
+    for name in FLOAT_COLUMNS:
+        series = df[name] if name in df else pd.Series([np.nan] * len(df))
+        columns[name] = _write_float(tmp_dir, name, series)
+    for name, source in INTERVAL_COLUMNS.items():
+        values = _as_optional_str(df[source]) if source in df else [None] * len(df)
+        columns[name] = _write_intervals(tmp_dir, name, values)
+    for name, source in HOURLY_COLUMNS.items():
+        values = _as_optional_str(df[source]) if source in df else [None] * len(df)
+        columns[name] = _write_hourly(tmp_dir, name, values)
+    for name, source in BITSET_COLUMNS.items():
+        values = _as_optional_str(df[source]) if source in df else [None] * len(df)
+        columns[name] = _write_bitsets(tmp_dir, name, values)
+    columns[DETAILS_COLUMN] = _write_records(
+        tmp_dir, DETAILS_COLUMN, df, DETAIL_COLUMNS
+    )
+    place_ids = (
+        _as_optional_str(df["place_id"]) if "place_id" in df else [None] * len(df)
+    )
+    columns[ENRICHMENT_COLUMN] = _write_json_rows(
+        tmp_dir,
+        ENRICHMENT_COLUMN,
+        [enrichment.get(place_id) if place_id else None for place_id in place_ids],
+    )
+
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "rows": int(len(df)),
+        "source_rows": int(len(raw)),
+        # Changes on every build; engines and cursors are tied to it.
+        "build_id": f"{time.time_ns():x}",
+        "source": os.path.basename(csv_path),
+        "source_fingerprint": _source_fingerprint(csv_path),
+        "wal_seq": int(wal_seq),
+        "columns": columns,
+    }
+    with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    _replace_dir(tmp_dir, out_dir, meta["build_id"])
+    return out_dir
+
+
+def attach_enrichment(
+    snapshot_dir: str, enrichment: Mapping[str, Mapping[str, Any]]
+) -> str:
+    """
+    Replace the enrichment column of the snapshot at ``snapshot_dir`` with
+    ``enrichment`` (place_id -> field groups), in place and without the
+    source CSV. The column's files are swapped in atomically and then the
+    manifest, with a new build id so the registry reloads it; stores already
+    open keep reading the files they opened. Returns the new build id.
+    """
+    meta = read_meta(snapshot_dir)
+    if meta is None:
+        raise FileNotFoundError(f"No business snapshot found at {snapshot_dir}")
+    place_ids = _read_text(snapshot_dir, "place_id")
+    tmp_dir = f"{snapshot_dir}.enrich-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    spec = _write_json_rows(
+        tmp_dir,
+        ENRICHMENT_COLUMN,
+        [enrichment.get(place_id) if place_id else None for place_id in place_ids],
+    )
+    for entry in os.listdir(tmp_dir):
+        os.replace(os.path.join(tmp_dir, entry), os.path.join(snapshot_dir, entry))
+    os.rmdir(tmp_dir)
+
+    meta["columns"][ENRICHMENT_COLUMN] = spec
+    meta["build_id"] = f"{time.time_ns():x}"
+    meta_tmp = os.path.join(snapshot_dir, f"{META_FILE}.tmp-{os.getpid()}")
+    with open(meta_tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_tmp, os.path.join(snapshot_dir, META_FILE))
+    return meta["build_id"]
+
+
+def _replace_dir(src: str, dst: str, version: str) -> None:
+    """
+    Make the build at ``src`` the snapshot at ``dst``: it moves to
+    ``<dst>.versions/<version>`` and ``dst`` becomes a symlink to it, swapped
+    with ``os.replace`` so ``dst`` never goes missing. A plain directory left
+    at ``dst`` by the earlier layout is moved aside first, once.
+    """
+    versions = f"{dst}{VERSIONS_SUFFIX}"
+    os.makedirs(versions, exist_ok=True)
+    if os.path.isdir(dst) and not os.path.islink(dst):
+        os.rename(dst, os.path.join(versions, f"legacy-{os.getpid()}"))
+    os.rename(src, os.path.join(versions, version))
+    link = f"{dst}.link-{os.getpid()}"
+    # Relative, so the data directory can be moved or mounted elsewhere
+    os.symlink(os.path.join(os.path.basename(versions), version), link)
+    os.replace(link, dst)
+    _prune_versions(versions, keep=version)
+
+
+def _prune_versions(versions: str, keep: str) -> None:
+    """Delete all but the newest ``KEEP_VERSIONS`` builds, never ``keep``"""
+    builds = sorted(
+        (entry for entry in os.listdir(versions) if entry != keep),
+        key=lambda entry: os.stat(os.path.join(versions, entry)).st_mtime_ns,
+        reverse=True,
+    )
+    for entry in builds[KEEP_VERSIONS - 1 :]:
+        # Stores still open on a deleted build keep their mapped and open files.
+        shutil.rmtree(os.path.join(versions, entry), ignore_errors=True)
+
+
+def read_meta(snapshot_dir: str) -> Optional[Dict[str, Any]]:
+    """Return a snapshot's manifest, or None if it does not exist"""
+    path = os.path.join(snapshot_dir, META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def snapshot_version(snapshot_dir: str) -> Optional[str]:
+    """Identifier of the snapshot build currently at ``snapshot_dir``, or None"""
+    meta = read_meta(snapshot_dir)
+    if meta is None:
+        return None
+    return meta.get("build_id") or str(
+        os.stat(os.path.join(snapshot_dir, META_FILE)).st_mtime_ns
+    )
+
+
+def is_fresh(snapshot_dir: str, csv_path: str) -> bool:
+    """True when the snapshot exists, has the current layout and matches the CSV"""
+    meta = read_meta(snapshot_dir)
+    if meta is None or meta.get("version") != SNAPSHOT_VERSION:
+        return False
+    if not os.path.exists(csv_path):
+        # Deployed without the source CSV: trust the shipped snapshot.
+        return True
+    return meta.get("source_fingerprint") == _source_fingerprint(csv_path)
+
+
+def main(argv: List[str]) -> None:
+    if len(argv) > 1:
+        out_dir = argv[2] if len(argv) > 2 else DEFAULT_SNAPSHOT_DIR
+        targets = [(argv[1], out_dir)]
+    else:
+        # Every city CSV in the data directory
+        from .registry import discover_cities
+
+        targets = [
+            (source.csv_path, source.snapshot_dir)
+            for source in discover_cities().values()
+            if os.path.exists(source.csv_path)
+        ]
+    for csv_path, out_dir in targets:
+        build_snapshot(csv_path, out_dir)
+        meta = read_meta(out_dir) or {}
+        print(
+            f"Wrote snapshot with {meta.get('rows', 0)} businesses "
+            f"({meta.get('source_rows', 0)} source rows) to {out_dir}"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv)
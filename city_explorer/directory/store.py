@@ -0,0 +1,342 @@
+"""
+Read-only, memory-mapped view over a compiled business snapshot.
+
+Each city's ``BusinessStore`` is shared by every tool in the process through
+``registry.get_store()``. Rows are canonical businesses; ``id`` is their
+stable identity across snapshots, row numbers are only valid within one.
+Columns are mapped lazily from disk; text values are only decoded for the
+rows that are actually read. The cold ``details`` record column is not
+mapped at all: ``details`` reads one row's bytes from an open file, so those
+pages are only touched by detail views.
+
+Live edits (see ``updates``) never rewrite the mapped files: a changed or
+added business is appended as an in-memory row, the row it replaces is
+marked dead in ``alive``, and ``row_of`` follows the business to its newest
+row until the next snapshot folds the edits in.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .buffers import RowBuffer
+from .snapshot import (
+    DEFAULT_CSV,
+    DEFAULT_SNAPSHOT_DIR,
+    DETAIL_COLUMNS,
+    DETAILS_COLUMN,
+    ENRICHMENT_COLUMN,
+    build_snapshot,
+    is_fresh,
+    read_meta,
+    snapshot_version,
+)
+
+
+class TextColumn:
+    """A UTF-8 text column backed by a memory-mapped blob and offsets array"""
+
+    def __init__(self, directory: str, name: str):
+        self.name = name
+        self.offsets = np.load(
+            os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r"
+        )
+        self.missing = np.load(
+            os.path.join(directory, f"{name}.missing.npy"), mmap_mode="r"
+        )
+        blob_path = os.path.join(directory, f"{name}.bin")
+        # np.memmap refuses zero-length files, e.g. an all-empty column.
+        if os.path.getsize(blob_path):
+            self.blob: Union[np.memmap, bytes] = np.memmap(
+                blob_path, dtype=np.uint8, mode="r"
+            )
+        else:
+            self.blob = b""
+
+    def __len__(self) -> int:
+        return len(self.missing)
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        if self.missing[i]:
+            return None
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return bytes(self.blob[start:end]).decode("utf-8")
+
+    def take(self, ids: Iterable[int]) -> List[Optional[str]]:
+        return [self[int(i)] for i in ids]
+
+    def to_list(self) -> List[Optional[str]]:
+        data = bytes(self.blob)
+        offsets = self.offsets.tolist()
+        missing = self.missing.tolist()
+        return [
+            None if missing[i] else data[offsets[i] : offsets[i + 1]].decode("utf-8")
+            for i in range(len(missing))
+        ]
+
+
+class CategoricalColumn:
+    """A low-cardinality text column stored as integer codes"""
+
+    def __init__(self, directory: str, name: str, labels: List[str]):
+        self.name = name
+        self.codes = np.load(
+            os.path.join(directory, f"{name}.codes.npy"), mmap_mode="r"
+        )
+        self.labels = labels
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        code = int(self.codes[i])
+        return self.labels[code] if code >= 0 else None
+
+    def take(self, ids: Iterable[int]) -> List[Optional[str]]:
+        return [self[int(i)] for i in ids]
+
+    def to_list(self) -> List[Optional[str]]:
+        return self.take(range(len(self)))
+
+
+class IntervalColumn:
+    """Variable-length [start, end) intervals per row, flattened into parallel arrays"""
+
+    def __init__(self, directory: str, name: str):
+        self.name = name
+        self.rows = np.load(os.path.join(directory, f"{name}.rows.npy"), mmap_mode="r")
+        self.starts = np.load(
+            os.path.join(directory, f"{name}.starts.npy"), mmap_mode="r"
+        )
+        self.ends = np.load(os.path.join(directory, f"{name}.ends.npy"), mmap_mode="r")
+
+
+class RecordColumn:
+    """
+    Per-row JSON objects laid out like a text column, read from an open file
+    instead of a mapping. Holding the file keeps this generation readable
+    after a rebuild replaces the snapshot directory.
+    """
+
+    def __init__(self, directory: str, name: str):
+        self.name = name
+        self.offsets = np.load(
+            os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r"
+        )
+        self.missing = np.load(
+            os.path.join(directory, f"{name}.missing.npy"), mmap_mode="r"
+        )
+        self._file = open(os.path.join(directory, f"{name}.bin"), "rb")
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.missing)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        if self.missing[i]:
+            return {}
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        with self._lock:
+            self._file.seek(start)
+            data = self._file.read(end - start)
+        return json.loads(data.decode("utf-8"))
+
+
+Column = Union[TextColumn, CategoricalColumn, IntervalColumn, RecordColumn, np.ndarray]
+
+
+# Column kinds that are not one scalar per row
+DERIVED_KINDS = {"intervals", "hourly", "bitsets", "records"}
+
+
+class BusinessStore:
+    """Columnar, memory-mapped business table loaded from a snapshot directory"""
+
+    def __init__(self, snapshot_dir: str):
+        # Pin the build the snapshot path links to now, so a swap cannot mix two.
+        snapshot_dir = os.path.realpath(snapshot_dir)
+        meta = read_meta(snapshot_dir)
+        if meta is None:
+            raise FileNotFoundError(f"No business snapshot found at {snapshot_dir}")
+        self.snapshot_dir = snapshot_dir
+        self.meta = meta
+        self.version = meta.get("build_id") or snapshot_version(snapshot_dir) or ""
+        self.rows: int = meta["rows"]
+        self._columns: Dict[str, Column] = {}
+        self._frame: Optional[pd.DataFrame] = None
+        self._id_order: Optional[np.ndarray] = None
+        # Rows appended by live edits, as records, after the snapshot's rows
+        self._appended: List[Dict[str, Any]] = []
+        # Business id -> its current row when an edit moved it (None: deleted)
+        self._moved: Dict[int, Optional[int]] = {}
+        self._alive = RowBuffer(np.ones(self.rows, dtype=bool))
+
+    def __len__(self) -> int:
+        return self.rows + len(self._appended)
+
+    @property
+    def alive(self) -> np.ndarray:
+        """Mask over all rows: False where a live edit replaced, deleted or closed it"""
+        return self._alive.view
+
+    @property
+    def columns(self) -> List[str]:
+        """Scalar row-aligned columns, without derived interval, hourly and bitsets"""
+        return [
+            name
+            for name, spec in self.meta["columns"].items()
+            if spec["kind"] not in DERIVED_KINDS
+        ]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.meta["columns"]
+
+    def column(self, name: str) -> Column:
+        """Return a column, mapping it from disk on first access"""
+        col = self._columns.get(name)
+        if col is None:
+            spec = self.meta["columns"][name]
+            kind = spec["kind"]
+            if kind == "text":
+                col = TextColumn(self.snapshot_dir, name)
+            elif kind == "categorical":
+                col = CategoricalColumn(self.snapshot_dir, name, spec["labels"])
+            elif kind == "intervals":
+                col = IntervalColumn(self.snapshot_dir, name)
+            elif kind == "records":
+                col = RecordColumn(self.snapshot_dir, name)
+            else:
+                col = np.load(
+                    os.path.join(self.snapshot_dir, f"{name}.npy"), mmap_mode="r"
+                )
+            self._columns[name] = col
+        return col
+
+    def map_all(self) -> "BusinessStore":
+        """
+        Map every column now. A rebuild replaces the snapshot directory's
+        files; a fully mapped store keeps reading its own generation.
+        """
+        for name in self.meta["columns"]:
+            self.column(name)
+        return self
+
+    def value(self, row: int, name: str) -> Any:
+        """Read a single cell; missing values come back as None"""
+        if row >= self.rows:
+            return self._appended[row - self.rows].get(name)
+        col = self.column(name)
+        if isinstance(col, np.ndarray):
+            v = col[row]
+            if col.dtype.kind in "iu":
+                return int(v)
+            return None if np.isnan(v) else float(v)
+        return col[row]
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Stable business id of every snapshot row (appended rows are not included)"""
+        ids = self.column("id")
+        assert isinstance(ids, np.ndarray)
+        return ids
+
+    def row_of(self, business_id: int) -> Optional[int]:
+        """Current row holding ``business_id``, or None if it is not in this store"""
+        if business_id in self._moved:
+            return self._moved[business_id]
+        if self._id_order is None:
+            self._id_order = np.argsort(self.ids, kind="stable")
+        sorted_ids = self.ids[self._id_order]
+        position = int(np.searchsorted(sorted_ids, business_id))
+        if position < len(sorted_ids) and int(sorted_ids[position]) == business_id:
+            return int(self._id_order[position])
+        return None
+
+    def record(self, row: int, names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Read a row as a dict of the requested columns"""
+        return {name: self.value(row, name) for name in (names or self.columns)}
+
+    def details(self, row: int) -> Dict[str, Any]:
+        """
+        A row's cold detail fields (photos, links, posts...), read from disk;
+        missing ones are left out
+        """
+        if row >= self.rows:
+            record = self._appended[row - self.rows]
+            return {
+                name: record[name]
+                for name in DETAIL_COLUMNS
+                if record.get(name) is not None
+            }
+        if DETAILS_COLUMN not in self:
+            return {}
+        col = self.column(DETAILS_COLUMN)
+        assert isinstance(col, RecordColumn)
+        return col[row]
+
+    def enrichment(self, row: int) -> Dict[str, Any]:
+        """
+        A row's Google Places enrichment as last exported by the pre-warm job,
+        ``{field group: [fields, fetched_at]}``; empty for live-edited rows
+        """
+        if row >= self.rows or ENRICHMENT_COLUMN not in self:
+            return {}
+        col = self.column(ENRICHMENT_COLUMN)
+        assert isinstance(col, RecordColumn)
+        return col[row]
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """
+        Add a live-edited business as a new row. The row stays hidden, and
+        ``row_of`` keeps returning the old one, until ``publish``.
+        """
+        row = len(self)
+        self._alive.append(False)
+        self._appended.append(dict(record))
+        return row
+
+    def publish(self, row: int, business_id: int, alive: bool = True) -> None:
+        """Point ``business_id`` at an appended row, visible to searches if ``alive``"""
+        self._moved[business_id] = row
+        self.alive[row] = alive
+
+    def retire(self, row: int) -> None:
+        """Hide ``row`` from searches; ``row_of`` finds it unless it was deleted"""
+        self.alive[row] = False
+
+    def forget(self, business_id: int) -> None:
+        """Make ``row_of`` stop finding a deleted business"""
+        self._moved[business_id] = None
+
+    def frame(self) -> pd.DataFrame:
+        """
+        Materialize the snapshot's rows as a DataFrame, built once and reused;
+        live edits are not included
+        """
+        if self._frame is None:
+            data: Dict[str, Any] = {}
+            for name in self.columns:
+                col = self.column(name)
+                if isinstance(col, CategoricalColumn):
+                    data[name] = pd.Categorical.from_codes(
+                        np.asarray(col.codes), categories=col.labels
+                    )
+                elif isinstance(col, TextColumn):
+                    data[name] = pd.Series(col.to_list(), dtype=object)
+                else:
+                    data[name] = np.asarray(col)
+            self._frame = pd.DataFrame(data)
+        return self._frame
+
+
+def load_store(
+    csv_path: str = DEFAULT_CSV, snapshot_dir: str = DEFAULT_SNAPSHOT_DIR
+) -> BusinessStore:
+    """Open the snapshot for ``csv_path``, first (re)building it if stale"""
+    if not is_fresh(snapshot_dir, csv_path):
+        build_snapshot(csv_path, snapshot_dir)
+    return BusinessStore(snapshot_dir).map_all()
@@ -0,0 +1,219 @@
+"""
+Inverted token index over the business text fields.
+
+Keyword lookups used to run ``str.contains`` over five columns for every
+query. Here each field is tokenized once at load time into posting lists of
+row ids, and a query is answered by intersecting the postings of its tokens.
+
+The old matching was a case-insensitive substring test ("bak" finds
+"bakery", "akery" finds it too). To keep that, query tokens are resolved
+against the vocabulary rather than looked up verbatim: a character trigram
+index over the vocabulary finds every indexed token that *contains* the query
+token. Multi-word or punctuated keywords are then verified against the
+original text of the (already small) candidate set.
+
+Live edits append rows with ``add_row``. Row ids only grow, so each touched
+posting list stays sorted by appending to it; new tokens are added at the
+end of the vocabulary.
+"""
+
+import re
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .buffers import RowBuffer
+
+TOKEN_RE = re.compile(r"\w+")
+
+EMPTY = np.empty(0, dtype=np.int32)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens of ``text``"""
+    return TOKEN_RE.findall(text.lower())
+
+
+def _trigrams(token: str) -> Set[str]:
+    return {token[i : i + 3] for i in range(len(token) - 2)}
+
+
+class TextIndex:
+    """Token -> row-id posting lists with substring-preserving token expansion"""
+
+    def __init__(self, fields: Dict[str, Sequence[Optional[str]]], rows: int):
+        self.rows = rows
+        self.fields = list(fields)
+
+        # token -> row -> per-field occurrence counts
+        counts: Dict[str, Dict[int, List[int]]] = defaultdict(dict)
+        # Token count of every (row, field), used for BM25 length normalization
+        self.field_lengths = np.zeros((rows, len(self.fields)), dtype=np.int32)
+        for field_id, values in enumerate(fields.values()):
+            for row, text in enumerate(values):
+                if not text:
+                    continue
+                tokens = tokenize(text)
+                self.field_lengths[row, field_id] = len(tokens)
+                for token in tokens:
+                    per_field = counts[token].setdefault(row, [0] * len(self.fields))
+                    per_field[field_id] += 1
+
+        # Sorted vocabulary: position in this list is the token id.
+        self.vocabulary: List[str] = sorted(counts)
+        self.postings: List[np.ndarray] = []
+        # Parallel to postings: (len(posting), len(fields)) term frequencies
+        self.term_freqs: List[np.ndarray] = []
+        for token in self.vocabulary:
+            by_row = counts[token]
+            ordered = sorted(by_row)
+            self.postings.append(np.array(ordered, dtype=np.int32))
+            self.term_freqs.append(
+                np.array([by_row[r] for r in ordered], dtype=np.uint16)
+            )
+
+        trigram_tokens: Dict[str, Set[int]] = defaultdict(set)
+        for token_id, token in enumerate(self.vocabulary):
+            for gram in _trigrams(token):
+                trigram_tokens[gram].add(token_id)
+        self._trigram_tokens = {
+            gram: np.fromiter(sorted(ids), dtype=np.int32)
+            for gram, ids in trigram_tokens.items()
+        }
+        # Built on the first live edit: token -> id, and growable copies of
+        # the per-row and per-token arrays it appends to
+        self._token_ids: Optional[Dict[str, int]] = None
+        self._lengths: Optional[RowBuffer] = None
+        self._posting_buffers: Dict[int, Tuple[RowBuffer, RowBuffer]] = {}
+
+    def add_row(self, row: int, fields: Dict[str, Optional[str]]) -> None:
+        """Index one appended row (``row`` must be the next row id)"""
+        if self._token_ids is None:
+            self._token_ids = {token: i for i, token in enumerate(self.vocabulary)}
+            self._lengths = RowBuffer(self.field_lengths)
+        assert self._lengths is not None
+        lengths = np.zeros(len(self.fields), dtype=np.int32)
+        counts: Dict[str, List[int]] = {}
+        for field_id, field in enumerate(self.fields):
+            tokens = tokenize(fields.get(field) or "")
+            lengths[field_id] = len(tokens)
+            for token in tokens:
+                counts.setdefault(token, [0] * len(self.fields))[field_id] += 1
+        self.field_lengths = self._lengths.append(lengths)
+        self.rows = row + 1
+
+        for token, per_field in counts.items():
+            token_id = self._token_ids.get(token)
+            if token_id is None:
+                # Postings first: a concurrent search may expand to the token
+                # as soon as it is in the vocabulary.
+                token_id = len(self.vocabulary)
+                self.postings.append(EMPTY)
+                self.term_freqs.append(np.zeros((0, len(self.fields)), dtype=np.uint16))
+                self.vocabulary.append(token)
+                self._token_ids[token] = token_id
+                for gram in _trigrams(token):
+                    self._trigram_tokens[gram] = np.append(
+                        self._trigram_tokens.get(gram, EMPTY), np.int32(token_id)
+                    )
+            buffers = self._posting_buffers.get(token_id)
+            if buffers is None:
+                buffers = self._posting_buffers[token_id] = (
+                    RowBuffer(self.postings[token_id]),
+                    RowBuffer(self.term_freqs[token_id]),
+                )
+            # Frequencies first, so they always cover the posting list read with them.
+            self.term_freqs[token_id] = buffers[1].append(per_field)
+            self.postings[token_id] = buffers[0].append(row)
+
+    def expand(self, fragment: str) -> List[int]:
+        """Ids of every vocabulary token containing ``fragment``"""
+        if len(fragment) < 3:
+            # Too short for trigrams. The vocabulary grows with the language,
+            # not with the number of rows, so a scan stays cheap.
+            return [i for i, token in enumerate(self.vocabulary) if fragment in token]
+
+        candidates: Optional[np.ndarray] = None
+        for gram in _trigrams(fragment):
+            ids = self._trigram_tokens.get(gram)
+            if ids is None:
+                return []
+            candidates = (
+                ids
+                if candidates is None
+                else np.intersect1d(candidates, ids, assume_unique=True)
+            )
+            if not len(candidates):
+                return []
+        assert candidates is not None
+        return [int(i) for i in candidates if fragment in self.vocabulary[i]]
+
+    def fragment_rows(self, fragment: str) -> np.ndarray:
+        """Rows with any token containing ``fragment``"""
+        token_ids = self.expand(fragment)
+        if not token_ids:
+            return EMPTY
+        if len(token_ids) == 1:
+            return self.postings[token_ids[0]]
+        return np.unique(np.concatenate([self.postings[i] for i in token_ids]))
+
+    def fragment_postings(self, fragment: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rows with any token containing ``fragment``, plus their per-field term
+        frequencies summed over every expanded token.
+        """
+        token_ids = self.expand(fragment)
+        if not token_ids:
+            return EMPTY, np.zeros((0, len(self.fields)), dtype=np.float32)
+        postings = [self.postings[i] for i in token_ids]
+        term_freqs = [
+            self.term_freqs[i][: len(rows)] for i, rows in zip(token_ids, postings)
+        ]
+        if len(token_ids) == 1:
+            return postings[0], term_freqs[0].astype(np.float32)
+        rows, inverse = np.unique(np.concatenate(postings), return_inverse=True)
+        freqs = np.zeros((len(rows), len(self.fields)), dtype=np.float32)
+        np.add.at(freqs, inverse, np.concatenate(term_freqs))
+        return rows, freqs
+
+    def search(
+        self, keyword: str, text_of: Callable[[int, str], Optional[str]]
+    ) -> np.ndarray:
+        """
+        Sorted row ids whose fields contain ``keyword`` (case-insensitive).
+
+        ``text_of(row, field)`` reads original text and is only called for the
+        candidate rows of keywords that need phrase verification.
+        """
+        needle = keyword.lower()
+        fragments = tokenize(needle)
+
+        # Pure punctuation has nothing to look up; every row is a candidate.
+        rows: Optional[np.ndarray] = (
+            None if fragments else np.arange(self.rows, dtype=np.int32)
+        )
+        # Longer fragments are usually more selective; start with them.
+        for fragment in sorted(fragments, key=len, reverse=True):
+            fragment_rows = self.fragment_rows(fragment)
+            rows = (
+                fragment_rows
+                if rows is None
+                else np.intersect1d(rows, fragment_rows, assume_unique=True)
+            )
+            if not len(rows):
+                return EMPTY
+        assert rows is not None
+
+        # A single bare token is exact already; anything else (phrases,
+        # punctuation, surrounding spaces) is checked against the source text.
+        if fragments == [needle]:
+            return rows
+        verified = [
+            row
+            for row in rows.tolist()
+            if any(
+                needle in (text_of(row, field) or "").lower() for field in self.fields
+            )
+        ]
+        return np.array(verified, dtype=np.int32)
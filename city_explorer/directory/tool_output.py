@@ -0,0 +1,284 @@
+"""
+Compact, token-budgeted tool output for LLM-facing results.
+
+Everything a tool hands the model is paid for in context tokens on every
+later turn of the conversation. ``compact_businesses`` projects search
+results down to the fields the question needs: name, type, a short address
+and rating always; description, phone, links or hours only when the query
+implies them or the model asks for them. Hours are folded into day ranges,
+URLs become short link refs that ``GET /api/links/{ref}`` expands
+(``expand_link``), and descriptions are cut so the whole output fits
+``TOOL_MAX_TOKENS``. ``compact_landmarks`` applies the same budget to
+landmark results.
+
+``token_meter`` records how many tokens each tool's output took next to
+what the full rendering would have cost, for metrics scraping.
+
+Token counts use ``tiktoken`` when it is installed and a four-characters-
+per-token estimate otherwise.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .engine import DirectoryEngine
+from .query import SearchQuery
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to a character-based estimate
+    tiktoken = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+# Budget for one tool result, in tokens
+TOOL_MAX_TOKENS = int(os.getenv("DIRECTORY_TOOL_MAX_TOKENS", "600"))
+
+# A description is never longer than this, however much budget is left.
+DESCRIPTION_MAX_TOKENS = 60
+# Below this, a description snippet is not worth sending.
+DESCRIPTION_MIN_TOKENS = 8
+
+# Always sent
+BASE_FIELDS = ("id", "name", "type", "address", "rating")
+# Sent when the model asks for them
+OPTIONAL_FIELDS = ("reviews", "phone", "website", "google_maps", "hours", "description")
+# Per-query values, sent whenever the search produced them
+QUERY_FIELDS = ("distance_m", "open_until", "busyness_pct", "approximate_match")
+
+# Link fields replaced by refs: result key -> (ref suffix, store column)
+LINK_FIELDS = {"website": ("w", "site"), "google_maps": ("m", "location_link")}
+
+_STATE_ZIP = re.compile(r",\s*[A-Z]{2}\s+\d{5}(?:-\d{4})?$")
+_REF = re.compile(r"^([0-9a-z]+)\.([a-z])$")
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens ``text`` costs the model (estimated when ``tiktoken`` is missing)"""
+    global _encoding
+    if tiktoken is None:
+        return (len(text) + 3) // 4
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return len(_encoding.encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """``text`` cut at a word boundary to ``max_tokens``, ending in an ellipsis"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    keep = len(words) * max_tokens // max(count_tokens(text), 1)
+    while keep > 0 and count_tokens(" ".join(words[:keep]) + "…") > max_tokens:
+        keep -= 1
+    return " ".join(words[:keep]).rstrip(",.;:") + "…" if keep else ""
+
+
+def dumps(value: Any) -> str:
+    """Compact JSON, as handed to the model"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _base36(n: int) -> str:
+    digits = ""
+    while True:
+        n, digit = divmod(n, 36)
+        digits = _DIGITS[digit] + digits
+        if not n:
+            return digits
+
+
+def link_ref(business_id: int, field: str) -> str:
+    """Short ref for a business's link, e.g. "1uz3k8c0xw.m" for its Maps URL"""
+    return f"{_base36(int(business_id))}.{LINK_FIELDS[field][0]}"
+
+
+def expand_link(engine: DirectoryEngine, ref: str) -> Optional[str]:
+    """The URL a ``link_ref`` stands for, or None if the ref or business is unknown"""
+    match = _REF.match(ref.strip().lower())
+    if match is None:
+        return None
+    columns = {suffix: column for suffix, column in LINK_FIELDS.values()}
+    column = columns.get(match.group(2))
+    row = engine.store.row_of(int(match.group(1), 36))
+    if column is None or row is None:
+        return None
+    return engine.store.value(row, column)
+
+
+def short_address(address: Optional[str]) -> Optional[str]:
+    """
+    Street and city only: "6101 Shattuck Ave., Oakland, CA 94609" ->
+    "6101 Shattuck Ave., Oakland"
+    """
+    return _STATE_ZIP.sub("", address) if address else address
+
+
+def short_hours(hours: Optional[str]) -> Optional[str]:
+    """Weekly hours JSON folded into day ranges: "Mon-Fri 9AM-5PM; Sat-Sun Closed" """
+    if not hours:
+        return None
+    try:
+        days = json.loads(hours)
+    except ValueError:
+        return hours
+    if not isinstance(days, dict) or not days:
+        return hours
+    spans: List[Tuple[str, str, str]] = []
+    for day, value in days.items():
+        value = value if isinstance(value, str) else ",".join(map(str, value))
+        if spans and spans[-1][2] == value:
+            spans[-1] = (spans[-1][0], day[:3], value)
+        else:
+            spans.append((day[:3], day[:3], value))
+    return "; ".join(
+        f"{first}-{last} {value}" if first != last else f"{first} {value}"
+        for first, last, value in spans
+    )
+
+
+def _fit_descriptions(
+    items: List[Dict[str, Any]], descriptions: List[Optional[str]], max_tokens: int
+) -> None:
+    """Give each item the largest equal share of the budget left for its description"""
+    wanted = [i for i, text in enumerate(descriptions) if text]
+    if not wanted:
+        return
+    # Each snippet also brings its key, quotes and separating comma.
+    overhead = count_tokens(',"description":""')
+    spare = max_tokens - count_tokens(dumps(items)) - overhead * len(wanted)
+    share = min(DESCRIPTION_MAX_TOKENS, spare // len(wanted))
+    if share < DESCRIPTION_MIN_TOKENS:
+        return
+    for i in wanted:
+        snippet = truncate_tokens(descriptions[i], share)
+        if snippet:
+            items[i]["description"] = snippet
+
+
+def wanted_fields(query: SearchQuery, fields: Sequence[str] = ()) -> List[str]:
+    """
+    Fields to send for ``query``: the base fields, any ``fields`` asked for,
+    and the description when the query searched text or amenities, since it
+    usually says why a business matched.
+    """
+    unknown = [name for name in fields if name not in OPTIONAL_FIELDS]
+    if unknown:
+        raise ValueError(
+            f"Unknown fields {', '.join(unknown)}. "
+            f"Expected any of: {', '.join(OPTIONAL_FIELDS)}"
+        )
+    wanted = list(BASE_FIELDS) + [name for name in OPTIONAL_FIELDS if name in fields]
+    if (query.keyword or query.attributes) and "description" not in wanted:
+        wanted.append("description")
+    return wanted
+
+
+def compact_businesses(
+    businesses: List[Mapping[str, Any]],
+    query: SearchQuery,
+    fields: Sequence[str] = (),
+    max_tokens: int = TOOL_MAX_TOKENS,
+) -> List[Dict[str, Any]]:
+    """
+    Project full result objects (see ``records``) onto ``wanted_fields``,
+    with short addresses and hours, link refs for URLs and descriptions cut
+    to fit ``max_tokens``. Missing values are left out.
+    """
+    wanted = wanted_fields(query, fields)
+    items: List[Dict[str, Any]] = []
+    descriptions: List[Optional[str]] = []
+    for business in businesses:
+        item: Dict[str, Any] = {}
+        for name in wanted:
+            value = business.get(name)
+            if value is None or name == "description":
+                continue
+            if name == "address":
+                value = short_address(value)
+            elif name == "hours":
+                value = short_hours(value)
+            elif name in LINK_FIELDS:
+                value = link_ref(business["id"], name)
+            item[name] = value
+        for name in QUERY_FIELDS:
+            if business.get(name) is not None:
+                item[name] = business[name]
+        items.append(item)
+        descriptions.append(
+            business.get("description") if "description" in wanted else None
+        )
+    _fit_descriptions(items, descriptions, max_tokens)
+    return items
+
+
+def compact_landmarks(
+    landmarks: List[Mapping[str, Any]], max_tokens: int = TOOL_MAX_TOKENS
+) -> List[Dict[str, Any]]:
+    """
+    Landmarks with short addresses, at most two kinds each and descriptions
+    cut to fit ``max_tokens``
+    """
+    items: List[Dict[str, Any]] = []
+    descriptions: List[Optional[str]] = []
+    for landmark in landmarks:
+        item = {
+            name: value
+            for name, value in landmark.items()
+            if value not in (None, "") and name != "description"
+        }
+        if item.get("address"):
+            item["address"] = short_address(item["address"])
+        if isinstance(item.get("type"), str) and "," in item["type"]:
+            # OpenTripMap kinds: "cultural,museums,interesting_places,..."
+            item["type"] = ",".join(item["type"].split(",")[:2])
+        items.append(item)
+        descriptions.append(landmark.get("description") or None)
+    _fit_descriptions(items, descriptions, max_tokens)
+    return items
+
+
+class TokenMeter:
+    """Per-tool counters of output tokens sent against the full rendering's"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._tools: Dict[str, Dict[str, int]] = {}
+
+    def record(self, tool: str, output: str, full_output: str) -> int:
+        """Count one result; returns its tokens"""
+        tokens, full_tokens = count_tokens(output), count_tokens(full_output)
+        with self._lock:
+            counters = self._tools.setdefault(
+                tool, {"calls": 0, "tokens": 0, "full_tokens": 0}
+            )
+            counters["calls"] += 1
+            counters["tokens"] += tokens
+            counters["full_tokens"] += full_tokens
+        logger.info("%s output: %d tokens (%d uncompacted)", tool, tokens, full_tokens)
+        return tokens
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Calls, tokens and mean tokens per result by tool, for metrics scraping"""
+        with self._lock:
+            return {
+                tool: {
+                    **counters,
+                    "mean_tokens": round(counters["tokens"] / counters["calls"], 1),
+                    "mean_full_tokens": round(
+                        counters["full_tokens"] / counters["calls"], 1
+                    ),
+                }
+                for tool, counters in sorted(self._tools.items())
+            }
+
+
+# Process-wide meter shared by every tool instance
+token_meter = TokenMeter()
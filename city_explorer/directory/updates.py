@@ -0,0 +1,312 @@
+"""
+Write-ahead log of live directory edits and its compaction into snapshots.
+
+Ops fixes (a phone number, a closure, a newly nominated business) are
+appended to a per-city JSON-lines log under ``data/wal`` and fsynced before
+they are applied, so every worker can replay them: on load, each worker
+applies the entries its snapshot does not include yet, and the registry's
+watcher picks up entries written by other workers. Once the log grows past
+``COMPACT_AFTER`` entries it is folded into the source CSV, a fresh snapshot
+is built and the folded entries are dropped.
+
+Each entry is ``{"seq", "op": "upsert" | "delete", "id", "fields", "ts"}``.
+Replaying an entry twice has the same effect as once. Sequence numbers keep
+increasing across compactions: the last one dropped is kept in a ``.seq``
+file next to the log, since snapshots and loaded engines remember it.
+
+Compaction rewrites the source CSV as text: untouched cells are written
+back exactly as they were read, and only edited cells change.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from .ingest import CONTENT_COLUMNS, KEY_COLUMNS, business_id, business_keys
+from .engine import DirectoryEngine
+from .snapshot import (
+    CATEGORICAL_COLUMNS,
+    DETAIL_COLUMNS,
+    FLOAT_COLUMNS,
+    TEXT_COLUMNS,
+    build_snapshot,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers in one process are still serialized
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+# Fold the log into a new snapshot once it holds this many entries.
+COMPACT_AFTER = int(os.getenv("DIRECTORY_COMPACT_AFTER", "500"))
+
+# Identity and ingest-derived columns cannot be edited.
+READ_ONLY_COLUMNS = {"place_id", "google_id", "tags"}
+EDITABLE_COLUMNS = (
+    [name for name in TEXT_COLUMNS if name not in READ_ONLY_COLUMNS]
+    + CATEGORICAL_COLUMNS
+    + FLOAT_COLUMNS
+    + DETAIL_COLUMNS
+)
+
+OPERATIONS = ("upsert", "delete")
+
+
+def clean_fields(fields: Mapping[str, Any]) -> Dict[str, Any]:
+    """Validate edited fields: numbers for numeric columns, else text or null"""
+    cleaned: Dict[str, Any] = {}
+    for name, value in fields.items():
+        if name not in EDITABLE_COLUMNS:
+            raise ValueError(
+                f"Field '{name}' cannot be edited. "
+                f"Editable fields: {', '.join(EDITABLE_COLUMNS)}"
+            )
+        if value is None:
+            cleaned[name] = None
+        elif name in FLOAT_COLUMNS:
+            if isinstance(value, bool):
+                raise ValueError(f"Field '{name}' must be a number")
+            try:
+                cleaned[name] = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Field '{name}' must be a number")
+        elif isinstance(value, (dict, list)):
+            # JSON columns (hours, about, popular times) may be sent structured.
+            cleaned[name] = json.dumps(value)
+        else:
+            cleaned[name] = str(value)
+    return cleaned
+
+
+class ChangeLog:
+    """Append-only JSON-lines change log shared by every worker of one city"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+
+    @contextlib.contextmanager
+    def locked(self) -> Iterator[None]:
+        """
+        Exclusive access across threads and, where ``fcntl`` exists,
+        processes. Reentrant: only the outermost holder takes the file lock.
+        """
+        with self._lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(f"{self.path}.lock", "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._depth = 1
+                try:
+                    yield
+                finally:
+                    self._depth = 0
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @property
+    def seq_path(self) -> str:
+        return f"{self.path}.seq"
+
+    def _truncated_seq(self) -> int:
+        """The last sequence number dropped by ``truncate``, 0 if none was"""
+        try:
+            with open(self.seq_path, encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def last_seq(self) -> int:
+        """The highest sequence number handed out so far"""
+        existing = self.entries()
+        return max(existing[-1]["seq"] if existing else 0, self._truncated_seq())
+
+    def entries(self, after: int = 0) -> List[Dict[str, Any]]:
+        """Entries with a sequence number above ``after``, oldest first"""
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write was never acknowledged.
+                    continue
+                if entry["seq"] > after:
+                    entries.append(entry)
+        return entries
+
+    def append(
+        self, op: str, business_id: int, fields: Optional[Mapping[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Durably record one change and return its entry"""
+        if op not in OPERATIONS:
+            raise ValueError(
+                f"Unknown operation '{op}'. Expected one of: {', '.join(OPERATIONS)}"
+            )
+        with self.locked():
+            # The log is bounded by compaction, so rescanning it for the last
+            # sequence number is cheap and sees other workers' writes.
+            entry = {
+                "seq": self.last_seq() + 1,
+                "op": op,
+                "id": int(business_id),
+                "fields": dict(fields or {}),
+                "ts": time.time(),
+            }
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        return entry
+
+    def truncate(self, upto: int) -> None:
+        """Drop entries up to and including ``upto`` once a snapshot holds them"""
+        with self.locked():
+            rest = self.entries(after=upto)
+            # Record the floor first: numbering must never restart below it.
+            floor = max(upto, self._truncated_seq())
+            seq_tmp = f"{self.seq_path}.tmp-{os.getpid()}"
+            with open(seq_tmp, "w", encoding="utf-8") as f:
+                f.write(f"{floor}\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(seq_tmp, self.seq_path)
+            tmp_path = f"{self.path}.tmp-{os.getpid()}"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for entry in rest:
+                    f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+
+def apply_entry(engine: DirectoryEngine, entry: Mapping[str, Any]) -> None:
+    """Apply one logged change to a loaded engine"""
+    if entry["op"] == "delete":
+        engine.delete(entry["id"])
+    else:
+        engine.upsert(entry["id"], entry["fields"])
+
+
+def _csv_text(value: Any) -> str:
+    """An edited value as CSV text: empty for null, integral numbers without ".0" """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def apply_to_frame(df: pd.DataFrame, entries: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Apply logged changes to the raw CSV rows, read as text (``read_source``).
+    Duplicate rows of one business are all patched or all dropped, matching
+    how ``canonicalize`` merges them.
+    """
+    df = df.reset_index(drop=True)
+    # Empty cells are missing identities, as they are when ingest reads the CSV.
+    keys = df[[column for column in KEY_COLUMNS + CONTENT_COLUMNS if column in df]]
+    ids = np.array(
+        [business_id(key) for key in business_keys(keys.where(keys != "", None))],
+        dtype=np.int64,
+    )
+    added: List[Dict[str, Any]] = []
+    for entry in entries:
+        mask = ids == entry["id"]
+        if entry["op"] == "delete":
+            df, ids = df[~mask].reset_index(drop=True), ids[~mask]
+            added = [
+                row for row in added if business_id(row["place_id"]) != entry["id"]
+            ]
+            continue
+        fields = entry["fields"]
+        if mask.any():
+            for name, value in fields.items():
+                if name not in df:
+                    df[name] = ""
+                df.loc[mask, name] = _csv_text(value)
+            continue
+        for row in added:
+            if business_id(row["place_id"]) == entry["id"]:
+                row.update({name: _csv_text(value) for name, value in fields.items()})
+                break
+        else:
+            added.append({name: _csv_text(value) for name, value in fields.items()})
+    if added:
+        df = pd.concat([df, pd.DataFrame(added, dtype=str)], ignore_index=True).fillna(
+            ""
+        )
+    return df
+
+
+def read_source(csv_path: str) -> pd.DataFrame:
+    """A source CSV as text, every cell exactly as written"""
+    return pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+
+
+def write_source(df: pd.DataFrame, csv_path: str) -> None:
+    """
+    Atomically replace ``csv_path`` with ``df`` (as read by ``read_source``),
+    keeping the file's line endings and whether it ends with a newline, so
+    untouched rows come back byte for byte.
+    """
+    with open(csv_path, "rb") as f:
+        head = f.read(1 << 16)
+        f.seek(0, os.SEEK_END)
+        f.seek(max(f.tell() - 1, 0))
+        ends_with_newline = f.read(1) in (b"\n", b"")
+    newline = "\r\n" if b"\r\n" in head else "\n"
+    text = df.to_csv(index=False, lineterminator=newline)
+    if not ends_with_newline:
+        text = text[: -len(newline)]
+    tmp_path = f"{csv_path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, csv_path)
+
+
+def compact_changes(log: ChangeLog, csv_path: str, snapshot_dir: str) -> Optional[int]:
+    """
+    Fold every logged change into ``csv_path``, rebuild the snapshot and
+    drop the folded entries. Returns the last folded sequence number, or
+    None when there was nothing to do.
+    """
+    with log.locked():
+        entries = log.entries()
+        if not entries:
+            return None
+        if not os.path.exists(csv_path):
+            # Snapshot-only deployment: keep replaying the log on load.
+            logger.warning(
+                "Cannot compact %s: source CSV %s is missing", log.path, csv_path
+            )
+            return None
+        write_source(apply_to_frame(read_source(csv_path), entries), csv_path)
+        seq = entries[-1]["seq"]
+        build_snapshot(csv_path, snapshot_dir, wal_seq=seq)
+        log.truncate(seq)
+    logger.info(
+        "Compacted %d changes (through seq %d) into %s", len(entries), seq, snapshot_dir
+    )
+    return seq
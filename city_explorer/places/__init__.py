@@ -0,0 +1,24 @@
+from .breaker import CircuitBreaker, CircuitOpenError
+from .cache import PlaceCache
+from .enrichment import (
+    FIELD_GROUPS,
+    PlacesEnricher,
+    get_enricher,
+    place_fields,
+    search_queries,
+)
+from .singleflight import AsyncSingleFlight, SingleFlight, flight_meter
+
+__all__ = [
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "PlaceCache",
+    "FIELD_GROUPS",
+    "PlacesEnricher",
+    "get_enricher",
+    "place_fields",
+    "search_queries",
+    "AsyncSingleFlight",
+    "SingleFlight",
+    "flight_meter",
+]
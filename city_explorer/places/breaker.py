@@ -0,0 +1,115 @@
+"""
+Circuit breaker for an upstream API.
+
+When an upstream is down or overloaded, every call to it waits out its
+timeout before failing, and every search keeps paying that wait. A
+``CircuitBreaker`` counts consecutive failures. After ``failure_threshold``
+of them it opens, and calls fail at once with ``CircuitOpenError`` instead
+of reaching the upstream. Once ``reset_timeout_s`` has passed it lets a
+single probe call through (half-open): a success closes it again, a failure
+keeps it open for another ``reset_timeout_s``.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a periodic half-open probe"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout_s: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        # When the current probe went out; one that never reports back is
+        # replaced after reset_timeout_s.
+        self._probe_at: Optional[float] = None
+        self.trips = 0
+        self.rejected = 0
+        self.probes = 0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until the next call may go through"""
+        with self._lock:
+            if self._state == CLOSED:
+                return 0.0
+            since = self._probe_at if self._state == HALF_OPEN else self._opened_at
+            return max(0.0, (since or 0.0) + self.reset_timeout_s - self._clock())
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go to the upstream now; an allowed call must report
+        ``success`` or ``failure``
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            now = self._clock()
+            since = self._probe_at if self._state == HALF_OPEN else self._opened_at
+            if since is not None and now - since >= self.reset_timeout_s:
+                self._state = HALF_OPEN
+                self._probe_at = now
+                self.probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def check(self) -> None:
+        """``allow``, raising ``CircuitOpenError`` when the call may not go through"""
+        if not self.allow():
+            raise CircuitOpenError(
+                f"{self.name} circuit is open; retry in {self.retry_after():.1f}s"
+            )
+
+    def success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_at = None
+
+    def failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or (
+                self._state == CLOSED and self._failures >= self.failure_threshold
+            ):
+                if self._state == CLOSED:
+                    self.trips += 1
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self._probe_at = None
+
+    def stats(self) -> Dict[str, Any]:
+        """State and counters, for metrics scraping"""
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "probes": self.probes,
+            }
@@ -0,0 +1,101 @@
+"""
+Durable Google Places enrichment store keyed by ``place_id``.
+
+One SQLite row per (place, field group) holds the group's enrichment fields
+as JSON and when they were fetched, so each group can expire on its own
+schedule (see ``enrichment.FIELD_GROUPS``). The database uses WAL
+journaling, so every worker on a host can share one file.
+
+A ``PlaceCache`` connection belongs to the thread that opened it; the
+enricher opens it on, and only touches it from, a thread of its own.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+PLACES_CACHE_PATH = os.getenv(
+    "PLACES_CACHE_PATH", os.path.join(DATA_DIR, "places_cache.sqlite")
+)
+
+# Group name -> (its fields, fetched-at timestamp)
+CachedGroups = Dict[str, Tuple[Dict[str, Any], float]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS place_fields (
+    place_id TEXT NOT NULL,
+    field_group TEXT NOT NULL,
+    value TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (place_id, field_group)
+)
+"""
+
+# SQLite's default limit on bound parameters is 999 on older builds.
+_BATCH = 500
+
+
+class PlaceCache:
+    """Enrichment field groups per place, with the time each was fetched"""
+
+    def __init__(self, path: str = PLACES_CACHE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(_SCHEMA)
+        self._db.commit()
+
+    def get_many(self, place_ids: Iterable[str]) -> Dict[str, CachedGroups]:
+        """Cached groups of each of ``place_ids`` that has any"""
+        ids = list(dict.fromkeys(place_ids))
+        found: Dict[str, CachedGroups] = {}
+        for start in range(0, len(ids), _BATCH):
+            batch = ids[start : start + _BATCH]
+            rows = self._db.execute(
+                f"SELECT place_id, field_group, value, fetched_at FROM place_fields "
+                f"WHERE place_id IN ({','.join('?' * len(batch))})",
+                batch,
+            )
+            for place_id, group, value, fetched_at in rows:
+                found.setdefault(place_id, {})[group] = (json.loads(value), fetched_at)
+        return found
+
+    def get(self, place_id: str) -> CachedGroups:
+        return self.get_many([place_id]).get(place_id, {})
+
+    def put(
+        self,
+        place_id: str,
+        groups: Mapping[str, Mapping[str, Any]],
+        fetched_at: Optional[float] = None,
+    ) -> None:
+        """Store freshly fetched groups of one place, replacing older copies"""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO place_fields "
+                "(place_id, field_group, value, fetched_at) VALUES (?, ?, ?, ?)",
+                [
+                    (place_id, group, json.dumps(dict(fields)), fetched_at)
+                    for group, fields in groups.items()
+                ],
+            )
+
+    def delete(self, place_id: str) -> None:
+        with self._db:
+            self._db.execute("DELETE FROM place_fields WHERE place_id = ?", (place_id,))
+
+    def stats(self) -> Dict[str, Any]:
+        """Places and group rows held, for metrics scraping"""
+        places, rows = self._db.execute(
+            "SELECT COUNT(DISTINCT place_id), COUNT(*) FROM place_fields"
+        ).fetchone()
+        return {"path": self.path, "places": places, "rows": rows}
+
+    def close(self) -> None:
+        self._db.close()
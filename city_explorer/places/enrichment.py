@@ -0,0 +1,640 @@
+"""
+Concurrent Google Places enrichment of directory results.
+
+The directory's own data is a scrape; Google Places adds the current
+rating, hours, phone, website and photos. Every directory business carries
+its Google ``place_id``, so it is enriched with one Place Details request
+by id. Only businesses without one fall back to a few text-search queries,
+most specific first, until one finds a place.
+
+Details are kept in a durable ``PlaceCache`` per field group, and each group
+expires on its own TTL (``FIELD_GROUPS``): hours go stale within a day,
+websites and phone numbers last a month. The cache's SQLite reads and writes
+run on a thread of their own, never on the event loop. A business whose
+groups are all cached is answered from the cache at once, even when some are
+past their TTL: those are refreshed in the background for the next request
+(stale-while-revalidate), asking Google for the stale groups' fields only.
+Places Google no longer knows are remembered too, so they are not looked up
+on every search. The offline pre-warm job (``prewarm``) fills the cache for
+a whole city ahead of traffic and exports it into the directory snapshot;
+callers pass those exported groups as ``seeds``, so a worker with an empty
+cache still answers without waiting on Google.
+
+``PlacesEnricher`` runs every business's lookup concurrently on one
+background event loop over a pooled keep-alive ``httpx.AsyncClient``. All
+requests share a global concurrency cap, whichever thread or tool call
+started them, and identical requests in flight at the same time (two
+searches showing the same bakery) are coalesced into one.
+
+Every business also has its own deadline: a lookup still running when it
+passes is cancelled and that business is returned unenriched, so one slow
+row never holds up the whole result.
+
+Each ``enrich`` call also has a latency budget (``REQUEST_BUDGET_S``) for
+the whole enrichment stage. Rows still being looked up when it runs out are
+returned with directory data only and flagged (``ENRICHMENT_FLAG``: "over
+budget"). Their lookups carry on in the background and fill the cache for
+the next search. A ``CircuitBreaker`` stops calling Google after repeated
+failures and lets a probe through periodically. While it is open, rows are
+answered from the cache at once and rows without cached data are flagged
+"circuit open", instead of each search waiting out the timeouts.
+``PlacesEnricher.stats`` reports the breaker and budget counters.
+
+The Places base URL is configurable (``GOOGLE_PLACES_BASE_URL``), and a
+custom ``httpx`` transport can be passed in, so the pipeline runs unchanged
+against a local stub server (see ``benchmarks/bench_places_enrichment.py``).
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+import httpx
+
+from .breaker import CircuitBreaker, CircuitOpenError
+from .cache import PLACES_CACHE_PATH, CachedGroups, PlaceCache
+from .singleflight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PLACES_BASE_URL = os.getenv(
+    "GOOGLE_PLACES_BASE_URL", "https://maps.googleapis.com/maps/api/place"
+)
+
+# Requests in flight across every enrichment in the process
+MAX_CONCURRENCY = int(os.getenv("PLACES_MAX_CONCURRENCY", "8"))
+# Time allowed for all of one business's lookups
+ROW_DEADLINE_S = float(os.getenv("PLACES_ROW_DEADLINE_S", "4"))
+# Time allowed for a single Places request
+REQUEST_TIMEOUT_S = float(os.getenv("PLACES_REQUEST_TIMEOUT_S", "3"))
+# Time one enrich call may spend on all of its rows
+REQUEST_BUDGET_S = float(os.getenv("PLACES_REQUEST_BUDGET_S", "1.5"))
+# Consecutive failures that open the breaker, and how long it stays open before a probe
+BREAKER_FAILURES = int(os.getenv("PLACES_BREAKER_FAILURES", "5"))
+BREAKER_RESET_S = float(os.getenv("PLACES_BREAKER_RESET_S", "30"))
+
+# Set on rows returned without fresh Places data: "over_budget" or "circuit_open"
+ENRICHMENT_FLAG = "google_enrichment"
+OVER_BUDGET = "over_budget"
+CIRCUIT_OPEN = "circuit_open"
+# Response statuses that mean the upstream, not the request, is in trouble
+UPSTREAM_ERROR_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+
+DAY_S = 24 * 60 * 60
+
+
+@dataclass(frozen=True)
+class FieldGroup:
+    """Enrichment fields fetched, cached and expired together"""
+
+    name: str
+    # Place Details fields requested for the group
+    google_fields: Tuple[str, ...]
+    # Enrichment fields it produces (see ``place_fields``)
+    keys: Tuple[str, ...]
+    ttl_s: float
+
+
+def _ttl(group: str, default_days: float) -> float:
+    return float(os.getenv(f"PLACES_TTL_{group.upper()}_S", str(default_days * DAY_S)))
+
+
+FIELD_GROUPS = [
+    FieldGroup("hours", ("opening_hours",), ("current_hours",), _ttl("hours", 1)),
+    FieldGroup(
+        "rating",
+        ("rating", "user_ratings_total"),
+        ("google_rating", "google_review_count"),
+        _ttl("rating", 3),
+    ),
+    FieldGroup(
+        "contact",
+        ("formatted_phone_number", "website"),
+        ("google_phone", "google_website"),
+        _ttl("contact", 30),
+    ),
+    FieldGroup("photos", ("photos",), ("photo_references",), _ttl("photos", 30)),
+]
+
+# Cached in place of the groups when Google does not know a place_id
+NOT_FOUND_GROUP = "not_found"
+NOT_FOUND_TTL_S = _ttl(NOT_FOUND_GROUP, 7)
+NOT_FOUND_STATUSES = {"NOT_FOUND", "INVALID_REQUEST", "ZERO_RESULTS"}
+
+TEXT_SEARCH_FIELDS = "place_id,name,formatted_address," + ",".join(
+    field for group in FIELD_GROUPS for field in group.google_fields
+)
+
+
+def search_queries(name: str, address: Optional[str], city: str) -> List[str]:
+    """Text-search queries for one business, most specific first"""
+    queries = [f"{name} {city}", f"{name} {address}" if address else None, name]
+    lowered = name.lower()
+    for kind in ("bakery", "restaurant"):
+        if kind in lowered:
+            queries.append(f"{name} {kind} {city}")
+    return list(dict.fromkeys(q for q in queries if q))
+
+
+def place_fields(place: Mapping[str, Any]) -> Dict[str, Any]:
+    """The enrichment fields of one Places result"""
+    enhanced: Dict[str, Any] = {}
+    if "rating" in place:
+        enhanced["google_rating"] = place["rating"]
+        enhanced["google_review_count"] = place.get("user_ratings_total", 0)
+    if "opening_hours" in place:
+        enhanced["current_hours"] = place["opening_hours"].get("weekday_text", [])
+    if "formatted_phone_number" in place:
+        enhanced["google_phone"] = place["formatted_phone_number"]
+    if "website" in place:
+        enhanced["google_website"] = place["website"]
+    if "photos" in place:
+        enhanced["photo_references"] = [
+            photo["photo_reference"] for photo in place["photos"][:3]
+        ]
+    return enhanced
+
+
+def due_groups(cached: CachedGroups, now: Optional[float] = None) -> List[FieldGroup]:
+    """
+    Field groups of a place that are missing or past their TTL; none while
+    Google is known not to have it
+    """
+    now = time.time() if now is None else now
+    not_found = cached.get(NOT_FOUND_GROUP)
+    if not_found is not None and now - not_found[1] < NOT_FOUND_TTL_S:
+        return []
+    return [
+        group
+        for group in FIELD_GROUPS
+        if group.name not in cached or now - cached[group.name][1] >= group.ttl_s
+    ]
+
+
+def merge_groups(*sources: Optional[Mapping[str, Sequence[Any]]]) -> CachedGroups:
+    """Combine cached groups of several sources, keeping each one's newest copy"""
+    merged: CachedGroups = {}
+    for source in sources:
+        for name, (fields, fetched_at) in (source or {}).items():
+            if name not in merged or fetched_at > merged[name][1]:
+                merged[name] = (fields, fetched_at)
+    return merged
+
+
+def _split_groups(
+    place: Mapping[str, Any], groups: Sequence[FieldGroup]
+) -> Dict[str, Dict[str, Any]]:
+    """A Places result's enrichment fields by group, empty where Google had none"""
+    fields = place_fields(place)
+    return {
+        group.name: {key: fields[key] for key in group.keys if key in fields}
+        for group in groups
+    }
+
+
+class PlacesEnricher:
+    """
+    Google Places lookups for many businesses at once, on a shared loop,
+    connection pool and cache
+    """
+
+    def __init__(
+        self,
+        base_url: str = PLACES_BASE_URL,
+        max_concurrency: int = MAX_CONCURRENCY,
+        row_deadline_s: float = ROW_DEADLINE_S,
+        request_timeout_s: float = REQUEST_TIMEOUT_S,
+        request_budget_s: Optional[float] = REQUEST_BUDGET_S,
+        cache_path: Optional[str] = PLACES_CACHE_PATH,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.row_deadline_s = row_deadline_s
+        self.request_timeout_s = request_timeout_s
+        # None (or 0) waits for every row up to its own deadline.
+        self.request_budget_s = request_budget_s
+        self.breaker = breaker or CircuitBreaker(
+            "places", BREAKER_FAILURES, BREAKER_RESET_S
+        )
+        # Identical requests in flight at once go out once.
+        self._flights = AsyncSingleFlight("google_places")
+        # None or "" disables the cache.
+        self.cache_path = cache_path
+        self._transport = transport
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._cache: Optional[PlaceCache] = None
+        # The one thread that uses the cache's connection
+        self._cache_thread: Optional[ThreadPoolExecutor] = None
+        # Background refreshes in flight by place_id (strong refs keep the tasks alive)
+        self._refreshing: Dict[str, "asyncio.Task[None]"] = {}
+        # Lookups that outlived their enrich call's budget, still filling the cache
+        self._overrun: Set["asyncio.Task[Dict[str, Any]]"] = set()
+        self.requests = 0
+        self.enrich_calls = 0
+        # Enrich calls that ran out of budget, and rows they returned unenriched
+        self.budget_overruns = 0
+        self.rows_over_budget = 0
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        """The background loop, started with its client and cache on first use"""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="places-enrichment", daemon=True
+                ).start()
+                asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+                self._loop = loop
+            return self._loop
+
+    async def __aenter__(self) -> "PlacesEnricher":
+        """Use the enricher on the caller's own loop, e.g. in a batch job"""
+        await self._open()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self._close()
+
+    async def _open(self) -> None:
+        limits = httpx.Limits(
+            max_connections=self.max_concurrency,
+            max_keepalive_connections=self.max_concurrency,
+        )
+        self._client = httpx.AsyncClient(
+            timeout=self.request_timeout_s,
+            limits=limits,
+            transport=self._transport,
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.cache_path:
+            self._cache_thread = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="places-cache"
+            )
+            self._cache = await self._on_cache_thread(PlaceCache, self.cache_path)
+
+    async def _on_cache_thread(self, fn: Callable[..., T], *args: Any) -> T:
+        """``fn(*args)`` on the cache's thread, so SQLite never blocks the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._cache_thread, fn, *args
+        )
+
+    async def _get(
+        self, endpoint: str, params: Dict[str, str]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        One Places API call, shared with any identical call already in flight;
+        None if it failed or returned an error status. Raises
+        ``CircuitOpenError`` without calling Google while the breaker is open.
+        """
+        return await self._flights.do(
+            (endpoint, tuple(sorted(params.items()))),
+            lambda: self._request(endpoint, params),
+        )
+
+    async def _request(
+        self, endpoint: str, params: Dict[str, str]
+    ) -> Optional[Dict[str, Any]]:
+        """One Places API call under the concurrency cap and circuit breaker"""
+        assert self._client is not None and self._semaphore is not None
+        async with self._semaphore:
+            self.breaker.check()
+            # Every call past the check reports back, or a half-open breaker would wait
+            # on its probe.
+            self.requests += 1
+            try:
+                response = await self._client.get(
+                    f"{self.base_url}/{endpoint}/json", params=params
+                )
+                data = response.json() if response.status_code == 200 else None
+            except (httpx.HTTPError, ValueError) as e:
+                # Connection trouble, or a 200 whose body is not (complete) JSON
+                logger.info("Places %s request failed: %r", endpoint, e)
+                self.breaker.failure()
+                return None
+            except BaseException:
+                self.breaker.failure()
+                raise
+        if response.status_code == 429 or response.status_code >= 500:
+            self.breaker.failure()
+            return None
+        if response.status_code != 200:
+            self.breaker.success()
+            return None
+        if not isinstance(data, dict):
+            logger.info(
+                "Places %s returned %s instead of an object",
+                endpoint,
+                type(data).__name__,
+            )
+            self.breaker.failure()
+            return None
+        if data.get("status") in UPSTREAM_ERROR_STATUSES:
+            self.breaker.failure()
+        else:
+            self.breaker.success()
+        return data
+
+    async def _text_search(self, query: str, api_key: str) -> Optional[Dict[str, Any]]:
+        """First text-search hit for ``query``, or None"""
+        data = await self._get(
+            "textsearch", {"query": query, "key": api_key, "fields": TEXT_SEARCH_FIELDS}
+        )
+        if data and data.get("status") == "OK" and data.get("results"):
+            return data["results"][0]
+        return None
+
+    async def fetch_details(
+        self, place_id: str, groups: Sequence[FieldGroup], api_key: str
+    ) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Fetch ``groups`` of one place with a Place Details request and cache
+        them. Returns the groups ({} when Google does not know the place), or
+        None when the lookup failed and nothing was learnt.
+        """
+        fields = ",".join(field for group in groups for field in group.google_fields)
+        data = await self._get(
+            "details", {"place_id": place_id, "key": api_key, "fields": fields}
+        )
+        if data is None:
+            return None
+        status = data.get("status")
+        if status == "OK":
+            fetched = _split_groups(data.get("result") or {}, groups)
+        elif status in NOT_FOUND_STATUSES:
+            fetched = {NOT_FOUND_GROUP: {}}
+        else:
+            # OVER_QUERY_LIMIT, REQUEST_DENIED, ...: transient or misconfigured
+            logger.warning(
+                "Place Details for %s failed: %s %s",
+                place_id,
+                status,
+                data.get("error_message", ""),
+            )
+            return None
+        if self._cache is not None:
+            await self._on_cache_thread(self._cache.put, place_id, fetched)
+        return {} if NOT_FOUND_GROUP in fetched else fetched
+
+    def _refresh(
+        self, place_id: str, groups: Sequence[FieldGroup], api_key: str
+    ) -> None:
+        """Re-fetch stale groups in the background, once per place at a time"""
+        if place_id in self._refreshing:
+            return
+
+        async def refresh() -> None:
+            try:
+                await self.fetch_details(place_id, groups, api_key)
+            except Exception as e:
+                logger.debug("Background refresh of %s failed: %s", place_id, e)
+            finally:
+                self._refreshing.pop(place_id, None)
+
+        self._refreshing[place_id] = asyncio.ensure_future(refresh())
+
+    async def known(
+        self,
+        place_ids: Sequence[Optional[str]],
+        seeds: Optional[Sequence[Optional[Mapping[str, Sequence[Any]]]]] = None,
+    ) -> Dict[str, CachedGroups]:
+        """
+        Groups already known for each place: the cache's merged with ``seeds``
+        (per business, as exported to the snapshot), the newer copy winning
+        """
+        cached: Dict[str, CachedGroups] = {}
+        if self._cache is not None:
+            ids = [place_id for place_id in place_ids if place_id]
+            cached = await self._on_cache_thread(self._cache.get_many, ids)
+        seeds = seeds if seeds is not None else [None] * len(place_ids)
+        for place_id, seed in zip(place_ids, seeds):
+            if place_id and seed:
+                cached[place_id] = merge_groups(cached.get(place_id), seed)
+        return cached
+
+    async def _lookup_place(
+        self, place_id: str, cached: CachedGroups, api_key: str
+    ) -> Dict[str, Any]:
+        """One place's enrichment fields: cached where possible, stale ones refreshed"""
+        now = time.time()
+        not_found = cached.get(NOT_FOUND_GROUP)
+        if not_found is not None and now - not_found[1] < NOT_FOUND_TTL_S:
+            return {}
+        missing = [group for group in FIELD_GROUPS if group.name not in cached]
+        stale = [
+            group
+            for group in FIELD_GROUPS
+            if group.name in cached and now - cached[group.name][1] >= group.ttl_s
+        ]
+        enhanced: Dict[str, Any] = {}
+        if missing:
+            # Nothing to serve yet for some fields: wait for them (and the stale ones).
+            try:
+                fetched = await self.fetch_details(place_id, missing + stale, api_key)
+            except CircuitOpenError:
+                # Serve whatever is cached, flagged as incomplete.
+                fetched, enhanced[ENRICHMENT_FLAG] = None, CIRCUIT_OPEN
+            if fetched is not None:
+                cached = {
+                    **cached,
+                    **{name: (fields, now) for name, fields in fetched.items()},
+                }
+                if not fetched:
+                    return {}
+        elif stale:
+            self._refresh(place_id, stale, api_key)
+        for group in FIELD_GROUPS:
+            if group.name in cached:
+                enhanced.update(cached[group.name][0])
+        return enhanced
+
+    async def lookup(
+        self,
+        business: Mapping[str, Any],
+        city: str,
+        api_key: str,
+        place_id: Optional[str] = None,
+        cached: Optional[CachedGroups] = None,
+    ) -> Dict[str, Any]:
+        """
+        Enrichment fields for one business: by ``place_id`` when it has one,
+        else the first text-search query that finds a place wins
+        """
+        if place_id:
+            return await self._lookup_place(place_id, cached or {}, api_key)
+        for query in search_queries(business["name"], business.get("address"), city):
+            place = await self._text_search(query, api_key)
+            if place is not None:
+                return place_fields(place)
+        return {}
+
+    async def _lookup_by_deadline(
+        self,
+        business: Mapping[str, Any],
+        city: str,
+        api_key: str,
+        place_id: Optional[str],
+        cached: Optional[CachedGroups],
+    ) -> Dict[str, Any]:
+        try:
+            return await asyncio.wait_for(
+                self.lookup(business, city, api_key, place_id, cached),
+                self.row_deadline_s,
+            )
+        except asyncio.TimeoutError:
+            logger.info(
+                "Places lookup for %r passed its %.1fs deadline",
+                business.get("name"),
+                self.row_deadline_s,
+            )
+        except CircuitOpenError:
+            return {ENRICHMENT_FLAG: CIRCUIT_OPEN}
+        except Exception:
+            logger.exception("Places lookup for %r failed", business.get("name"))
+        return {}
+
+    async def enrich_async(
+        self,
+        businesses: Sequence[Mapping[str, Any]],
+        city: str,
+        api_key: str,
+        place_ids: Optional[Sequence[Optional[str]]] = None,
+        seeds: Optional[Sequence[Optional[Mapping[str, Sequence[Any]]]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Enrichment fields for every business, looked up concurrently; {} where
+        none was found. Rows not done within the request budget come back
+        flagged ``OVER_BUDGET`` while their lookups finish in the background.
+        """
+        place_ids = (
+            list(place_ids) if place_ids is not None else [None] * len(businesses)
+        )
+        cached = await self.known(place_ids, seeds)
+        tasks = [
+            asyncio.ensure_future(
+                self._lookup_by_deadline(
+                    business,
+                    city,
+                    api_key,
+                    place_id,
+                    cached.get(place_id) if place_id else None,
+                )
+            )
+            for business, place_id in zip(businesses, place_ids)
+        ]
+        self.enrich_calls += 1
+        if not tasks:
+            return []
+        _, pending = await asyncio.wait(tasks, timeout=self.request_budget_s or None)
+        if pending:
+            self.budget_overruns += 1
+            self.rows_over_budget += len(pending)
+            logger.info(
+                "Places enrichment budget of %.1fs ran out with %d of %d rows pending",
+                self.request_budget_s,
+                len(pending),
+                len(tasks),
+            )
+            for task in pending:
+                # Strong references keep the tasks alive until they finish.
+                self._overrun.add(task)
+                task.add_done_callback(self._overrun.discard)
+        return [
+            task.result() if task.done() else {ENRICHMENT_FLAG: OVER_BUDGET}
+            for task in tasks
+        ]
+
+    def enrich(
+        self,
+        businesses: Sequence[Mapping[str, Any]],
+        city: str = "Oakland",
+        api_key: Optional[str] = None,
+        place_ids: Optional[Sequence[Optional[str]]] = None,
+        seeds: Optional[Sequence[Optional[Mapping[str, Sequence[Any]]]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Blocking ``enrich_async`` for tools: runs on the background loop, so
+        it also works from threads that have a loop of their own. Without an
+        API key (argument or ``GOOGLE_PLACES_API_KEY``) nothing is looked up.
+        ``seeds`` are the businesses' pre-warmed groups from the snapshot
+        (``BusinessStore.enrichment``).
+        """
+        api_key = api_key or os.getenv("GOOGLE_PLACES_API_KEY")
+        if not api_key or not businesses:
+            return [{} for _ in businesses]
+        loop = self._start()
+        return asyncio.run_coroutine_threadsafe(
+            self.enrich_async(businesses, city, api_key, place_ids, seeds), loop
+        ).result()
+
+    def stats(self) -> Dict[str, Any]:
+        """Request, budget and circuit breaker counters, for metrics scraping"""
+        return {
+            "requests": self.requests,
+            "enrich_calls": self.enrich_calls,
+            "request_budget_s": self.request_budget_s,
+            "budget_overruns": self.budget_overruns,
+            "rows_over_budget": self.rows_over_budget,
+            "background_lookups": len(self._overrun) + len(self._refreshing),
+            "breaker": self.breaker.stats(),
+        }
+
+    def close(self) -> None:
+        """Finish background refreshes, close the pool and cache, stop the loop"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+            if loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+    async def _close(self) -> None:
+        if self._refreshing or self._overrun:
+            await asyncio.gather(
+                *self._refreshing.values(), *self._overrun, return_exceptions=True
+            )
+        if self._client is not None:
+            await self._client.aclose()
+        if self._cache is not None:
+            await self._on_cache_thread(self._cache.close)
+            self._cache = None
+        if self._cache_thread is not None:
+            self._cache_thread.shutdown()
+            self._cache_thread = None
+
+
+# Process-wide enricher shared by every tool instance
+_enricher: Optional[PlacesEnricher] = None
+_enricher_lock = threading.Lock()
+
+
+def get_enricher() -> PlacesEnricher:
+    """Return the shared Places enricher, created on first use"""
+    global _enricher
+    if _enricher is None:
+        with _enricher_lock:
+            if _enricher is None:
+                _enricher = PlacesEnricher()
+    return _enricher
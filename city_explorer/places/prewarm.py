@@ -0,0 +1,397 @@
+"""
+Offline pre-warm of Google Places enrichment for whole cities.
+
+Search-time enrichment (``enrichment``) waits on Google only for businesses
+that have not been looked up yet. This job walks a city's whole directory
+ahead of traffic and fetches every business's missing or expired field
+groups by ``place_id`` into the ``PlaceCache``. At the end of each pass it
+exports what it knows into the city's snapshot (``attach_enrichment``), so
+every worker serves the enrichment from the snapshot, even one whose cache
+is cold.
+
+Requests are paced by a ``TokenBucket`` and capped by a ``DailyQuota`` per
+UTC day, shared by every city the job runs for. Progress is checkpointed
+after every chunk of rows (``data/places_prewarm/<city>.json``). A run cut
+short by the quota, a crash or Ctrl-C resumes where it stopped, and so does
+one stopped because Google's circuit breaker stayed open for longer than
+``BREAKER_WAIT_S``. Businesses whose groups are all fresh cost no requests,
+so passes after the first only pay for what has expired.
+
+Usage:
+    python -m city_explorer.places.prewarm [city ...] [--rate 5] [--burst 10]
+        [--daily-quota 5000] [--breaker-wait-s 120] [--restart] [--repeat-s 0]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from city_explorer.directory.registry import Dataset, get_registry
+from city_explorer.directory.snapshot import DATA_DIR, attach_enrichment
+from city_explorer.directory.store import BusinessStore
+
+from .breaker import CircuitOpenError
+from .enrichment import PlacesEnricher, due_groups
+
+logger = logging.getLogger(__name__)
+
+# Sustained Places requests per second, and how many may go out at once after a pause
+PREWARM_RATE = float(os.getenv("PLACES_PREWARM_RATE", "5"))
+PREWARM_BURST = int(os.getenv("PLACES_PREWARM_BURST", "10"))
+# Places requests the job may make per UTC day, across all cities
+DAILY_QUOTA = int(os.getenv("PLACES_DAILY_QUOTA", "5000"))
+# Longest a request waits for Google's open breaker before the run stops at its row
+BREAKER_WAIT_S = float(os.getenv("PLACES_PREWARM_BREAKER_WAIT_S", "120"))
+PREWARM_DIR = os.getenv("PLACES_PREWARM_DIR", os.path.join(DATA_DIR, "places_prewarm"))
+
+# Rows looked at between checkpoints
+CHUNK_ROWS = 200
+
+# ``business_status`` values not worth enriching
+SKIP_STATUSES = {"CLOSED_PERMANENTLY"}
+
+
+def _utc_day() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+def _write_json(path: str, value: Dict[str, Any]) -> None:
+    """Replace ``path`` atomically, so a crash never leaves half a checkpoint"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(value, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class TokenBucket:
+    """Request pacing: ``rate`` tokens a second, up to ``burst`` of them saved up"""
+
+    def __init__(self, rate: float, burst: int):
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive, got {rate}")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        """Wait for a token and take it"""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # No await between the check and the take: other tasks cannot interleave.
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class DailyQuota:
+    """Places requests left today (UTC), persisted so restarts cannot overspend"""
+
+    def __init__(self, limit: int, path: str = os.path.join(PREWARM_DIR, "quota.json")):
+        self.limit = limit
+        self.path = path
+        state = _read_json(path)
+        self.day = state.get("day", _utc_day())
+        self.used = int(state.get("used", 0))
+
+    @property
+    def remaining(self) -> int:
+        if self.day != _utc_day():
+            self.day, self.used = _utc_day(), 0
+        return max(0, self.limit - self.used)
+
+    def take(self) -> bool:
+        """Reserve one request; False once today's quota is spent"""
+        if self.remaining <= 0:
+            return False
+        self.used += 1
+        return True
+
+    def refund(self) -> None:
+        """Give back a reserved request that was never made"""
+        self.used = max(0, self.used - 1)
+
+    def save(self) -> None:
+        _write_json(
+            self.path, {"day": self.day, "used": self.used, "limit": self.limit}
+        )
+
+
+@dataclass
+class Checkpoint:
+    """Where a city's pre-warm pass stands"""
+
+    # Snapshot build the row positions refer to
+    build_id: Optional[str] = None
+    # Next row to look at
+    position: int = 0
+    fetched: int = 0
+    not_found: int = 0
+    failed: int = 0
+    # Rows without a place_id or permanently closed
+    skipped: int = 0
+    started_at: Optional[float] = None
+    completed_at: Optional[float] = None
+
+    @classmethod
+    def load(cls, path: str) -> "Checkpoint":
+        state = _read_json(path)
+        return cls(
+            **{name: state[name] for name in cls.__dataclass_fields__ if name in state}
+        )
+
+    def save(self, path: str) -> None:
+        _write_json(path, asdict(self))
+
+
+def checkpoint_path(slug: str) -> str:
+    return os.path.join(PREWARM_DIR, f"{slug}.json")
+
+
+async def export_enrichment(
+    enricher: PlacesEnricher, store: BusinessStore, snapshot_dir: str
+) -> str:
+    """
+    Write everything known for the snapshot's businesses into its enrichment
+    column; returns the new build id
+    """
+    rows = range(store.rows)
+    place_ids = [store.value(row, "place_id") for row in rows]
+    known = await enricher.known(place_ids, [store.enrichment(row) for row in rows])
+    enrichment = {
+        place_id: {
+            name: [fields, fetched_at] for name, (fields, fetched_at) in groups.items()
+        }
+        for place_id, groups in known.items()
+    }
+    return attach_enrichment(snapshot_dir, enrichment)
+
+
+async def prewarm_dataset(
+    dataset: Dataset,
+    enricher: PlacesEnricher,
+    api_key: str,
+    bucket: TokenBucket,
+    quota: DailyQuota,
+    restart: bool = False,
+    breaker_wait_s: float = BREAKER_WAIT_S,
+) -> Checkpoint:
+    """
+    Run (or resume) one pre-warm pass over a city's snapshot rows with an
+    open ``enricher``. Stops early when the daily quota runs out or Google
+    stays unavailable for ``breaker_wait_s``, leaving the checkpoint where
+    the next run picks up. Whatever was learnt is exported into the
+    snapshot either way.
+    """
+    store = dataset.store
+    path = checkpoint_path(dataset.source.slug)
+    state = Checkpoint.load(path)
+    if restart or state.completed_at is not None or state.build_id != store.version:
+        # A new pass. Row positions are only meaningful within one snapshot build.
+        state = Checkpoint(build_id=store.version, started_at=time.time())
+    fetched_before = state.fetched + state.not_found
+    exhausted = False
+    # Rows given up on because Google's breaker stayed open
+    stalled: List[int] = []
+
+    async def fetch(row: int, place_id: str, groups: List[Any]) -> None:
+        waited = 0.0
+        while True:
+            await bucket.acquire()
+            try:
+                result = await enricher.fetch_details(place_id, groups, api_key)
+                break
+            except CircuitOpenError:
+                # Google is failing: wait for the breaker's next probe rather
+                # than skip the row, but leave it to a later run after a while.
+                wait = max(enricher.breaker.retry_after(), 1.0)
+                if waited + wait > breaker_wait_s:
+                    quota.refund()
+                    stalled.append(row)
+                    return
+                waited += wait
+                await asyncio.sleep(wait)
+        if result is None:
+            state.failed += 1
+        elif result:
+            state.fetched += 1
+        else:
+            state.not_found += 1
+
+    while state.position < store.rows and not exhausted and not stalled:
+        rows = range(state.position, min(state.position + CHUNK_ROWS, store.rows))
+        place_ids = [store.value(row, "place_id") for row in rows]
+        known = await enricher.known(place_ids, [store.enrichment(row) for row in rows])
+        tasks = []
+        skipped = []
+        end = rows.stop
+        for row, place_id in zip(rows, place_ids):
+            if not place_id or store.value(row, "business_status") in SKIP_STATUSES:
+                skipped.append(row)
+                continue
+            groups = due_groups(known.get(place_id, {}))
+            if not groups:
+                continue
+            if not quota.take():
+                exhausted, end = True, row
+                break
+            tasks.append(fetch(row, place_id, groups))
+        await asyncio.gather(*tasks)
+        if stalled:
+            # Rows after the first stalled one are looked at again next run;
+            # those fetched meanwhile are fresh by then and cost nothing.
+            end = min(stalled)
+        state.skipped += sum(1 for row in skipped if row < end)
+        state.position = end
+        state.save(path)
+        quota.save()
+        logger.info(
+            "Pre-warmed %s rows %d-%d of %d (%d requests left today)",
+            dataset.source.slug,
+            rows.start,
+            end,
+            store.rows,
+            quota.remaining,
+        )
+
+    if exhausted:
+        logger.warning(
+            "Daily Places quota spent; %s pre-warm resumes at row %d",
+            dataset.source.slug,
+            state.position,
+        )
+    elif stalled:
+        logger.warning(
+            "Google Places unavailable for %.0fs; %s pre-warm resumes at row %d",
+            breaker_wait_s,
+            dataset.source.slug,
+            state.position,
+        )
+    else:
+        state.completed_at = time.time()
+        # The next pass starts over (on the exported build, if there is one).
+        state.position = 0
+    if state.fetched + state.not_found > fetched_before:
+        # Same rows in the same order, so the position stays valid on the new build.
+        state.build_id = await export_enrichment(
+            enricher, store, dataset.source.snapshot_dir
+        )
+    state.save(path)
+    return state
+
+
+async def prewarm(
+    cities: List[str],
+    api_key: str,
+    rate: float = PREWARM_RATE,
+    burst: int = PREWARM_BURST,
+    daily_quota: int = DAILY_QUOTA,
+    restart: bool = False,
+    enricher: Optional[PlacesEnricher] = None,
+    breaker_wait_s: float = BREAKER_WAIT_S,
+) -> Dict[str, Checkpoint]:
+    """One pre-warm pass over each of ``cities``, sharing one rate limit and quota"""
+    bucket = TokenBucket(rate, burst)
+    quota = DailyQuota(daily_quota)
+    registry = get_registry()
+    results: Dict[str, Checkpoint] = {}
+    async with enricher or PlacesEnricher() as opened:
+        for city in cities:
+            dataset = registry.dataset(city)
+            # Pick up the build the previous pass exported.
+            dataset.reload()
+            results[city] = await prewarm_dataset(
+                dataset, opened, api_key, bucket, quota, restart, breaker_wait_s
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "cities", nargs="*", help="cities to pre-warm (default: every city)"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=PREWARM_RATE, help="Places requests per second"
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=PREWARM_BURST,
+        help="requests allowed at once after a pause",
+    )
+    parser.add_argument(
+        "--daily-quota",
+        type=int,
+        default=DAILY_QUOTA,
+        help="Places requests per UTC day",
+    )
+    parser.add_argument(
+        "--breaker-wait-s",
+        type=float,
+        default=BREAKER_WAIT_S,
+        help="how long to wait for Google to recover "
+        "before stopping at the current row",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="ignore checkpoints and start each city over",
+    )
+    parser.add_argument(
+        "--repeat-s",
+        type=float,
+        default=0,
+        help="run again this long after each pass (0: once)",
+    )
+    args = parser.parse_args()
+
+    api_key = os.getenv("GOOGLE_PLACES_API_KEY")
+    if not api_key:
+        parser.error("GOOGLE_PLACES_API_KEY is not set")
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+    )
+    cities = args.cities or get_registry().cities()
+    restart = args.restart
+    while True:
+        results = asyncio.run(
+            prewarm(
+                cities,
+                api_key,
+                args.rate,
+                args.burst,
+                args.daily_quota,
+                restart,
+                breaker_wait_s=args.breaker_wait_s,
+            )
+        )
+        for city, state in results.items():
+            print(f"{city}: {json.dumps(asdict(state))}")
+        if args.repeat_s <= 0:
+            break
+        restart = False
+        time.sleep(args.repeat_s)
+
+
+if __name__ == "__main__":
+    main()
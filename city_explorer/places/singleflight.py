@@ -0,0 +1,113 @@
+"""
+In-process coalescing of identical concurrent upstream calls.
+
+Popular businesses and cities are asked about by many users at once, and
+each of those searches would otherwise make the same Google Places or
+OpenTripMap request. A ``SingleFlight`` (for blocking code) or
+``AsyncSingleFlight`` (for the enrichment event loop) lets only the first
+caller for a key make the call. Callers arriving while it is in flight wait
+for it and share its result, or its exception. Nothing is kept once the
+call finishes: caching is the ``PlaceCache``'s job.
+
+``flight_meter`` counts, per upstream, the calls asked for against the ones
+that went out, for metrics scraping.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class FlightMeter:
+    """Per-upstream counters of calls asked for and calls saved by coalescing"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._upstreams: Dict[str, Dict[str, int]] = {}
+
+    def record(self, upstream: str, shared: bool) -> None:
+        with self._lock:
+            counters = self._upstreams.setdefault(
+                upstream, {"calls": 0, "upstream_calls": 0, "coalesced": 0}
+            )
+            counters["calls"] += 1
+            counters["coalesced" if shared else "upstream_calls"] += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Calls, calls made upstream and calls saved for each upstream"""
+        with self._lock:
+            return {
+                upstream: {
+                    **counters,
+                    "saved_pct": round(
+                        100 * counters["coalesced"] / counters["calls"], 1
+                    ),
+                }
+                for upstream, counters in sorted(self._upstreams.items())
+            }
+
+
+# Process-wide meter shared by every coalescing group
+flight_meter = FlightMeter()
+
+
+class SingleFlight:
+    """Coalesces identical concurrent blocking calls across threads"""
+
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, "Future[Any]"] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """``fn()``, or the result of the same call in flight under ``key``"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if future is None:
+                future = self._calls[key] = Future()
+        flight_meter.record(self.upstream, shared=not leader)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                del self._calls[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._calls[key]
+        future.set_result(result)
+        return result
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces identical concurrent calls on one event loop. The shared call
+    runs as its own task: a caller that gives up (e.g. at its deadline)
+    does not cancel it for the others.
+    """
+
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """``await fn()``, or the result of the same call in flight under ``key``"""
+        task = self._calls.get(key)
+        flight_meter.record(self.upstream, shared=task is not None)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: "asyncio.Future[Any]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Retrieve it, in case every caller gave up before it finished.
+            task.exception()
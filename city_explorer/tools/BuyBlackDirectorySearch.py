@@ -1,79 +1,115 @@
 from agency_swarm.tools import BaseTool
 from pydantic import Field
-import pandas as pd
-import os
-import hashlib
 import json
-from functools import lru_cache
+import time
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple
 
-# Global cache for loaded data
-_data_cache = None
-_cache_file = None
+from city_explorer.directory import SearchQuery, get_engine, parse_open_at
+from city_explorer.directory.tool_output import compact_businesses, dumps, token_meter
 
-@lru_cache(maxsize=32)
-def _get_filtered_data(category: str, keyword: str, limit: int):
-    """Cached search function"""
-    global _data_cache
-
-    if _data_cache is None:
-        # Load data once and cache it
-        csv_path = os.path.join(os.path.dirname(__file__), '../data/Oakland_Identifies_as_Black_Owned_nominees.csv')
-        _data_cache = pd.read_csv(csv_path, low_memory=False)
-
-    df = _data_cache
-
-    # Filter by category
-    mask = df['category'].str.contains(category, case=False, na=False) | df['type'].str.contains(category, case=False, na=False)
-    filtered = df[mask]
+def search_directory_json(query: SearchQuery, category_rows=None):
+    """
+    Run a search and return (JSON array of business objects as bytes,
+    SearchResult); raises ValueError on bad arguments. The objects are joined
+    from fragments pre-rendered when the engine loaded.
+    """
+    # Indexed filter and ranking over the shared memory-mapped snapshot;
+    # ranked row ids are cached by the engine per normalized query
+    engine = get_engine(query.city)
+    result = engine.search(query, category_rows)
+    return engine.records.render(result), result
 
-    # If keyword provided, further filter
-    if keyword and keyword.strip():
-        search_cols = ['name', 'subtypes', 'full_address', 'description', 'about']
-        search_mask = pd.Series(False, index=filtered.index)
-        for col in search_cols:
-            if col in filtered.columns:
-                search_mask |= filtered[col].astype(str).str.contains(keyword, case=False, na=False)
-        filtered = filtered[search_mask]
+def search_directory(query: SearchQuery):
+    """Run a search and return (business dicts, SearchResult); raises ValueError on bad arguments"""
+    businesses, result = search_directory_json(query)
+    return json.loads(businesses), result
 
-    # Sort by rating (if exists)
-    if 'rating' in filtered.columns:
-        filtered = filtered.sort_values(by='rating', ascending=False)
+def search_directory_batch(queries: Sequence[SearchQuery]) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Run several searches together. Each city's distinct categories are
+    matched in one pass up front; returns one {'businesses', 'result',
+    'error', 'elapsed_ms'} entry per query, in order, with 'businesses' as
+    a JSON array in bytes, and the milliseconds spent on the shared category
+    matching.
+    """
+    started = time.perf_counter()
+    category_rows = {}
+    for city in dict.fromkeys(query.city for query in queries):
+        try:
+            engine = get_engine(city)
+        except ValueError:
+            # Reported on each of the city's queries below.
+            continue
+        categories = [query.category for query in queries if query.city == city]
+        category_rows[city] = engine.category_masks(categories)
+    shared_ms = (time.perf_counter() - started) * 1000
 
-    sample = filtered.head(limit)
-    return sample
+    entries = []
+    for query in queries:
+        started = time.perf_counter()
+        entry: Dict[str, Any] = {'businesses': b'[]', 'result': None, 'error': None}
+        try:
+            rows = category_rows.get(query.city, {}).get(query.category.strip().lower())
+            entry['businesses'], entry['result'] = search_directory_json(query, rows)
+        except ValueError as e:
+            entry['error'] = str(e)
+        entry['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        entries.append(entry)
+    return entries, round(shared_ms, 3)
 
 class BuyBlackDirectorySearchSimple(BaseTool):
     """
-    Search Oakland Black-owned businesses from the provided CSV file by category, keyword, or business type.
+    Search Black-owned businesses in a city's directory (Oakland by default) by category, keyword, or business type.
     Optimized with caching for faster responses.
     """
     category: str = Field(..., description="Business category or type to search (e.g. 'restaurant', 'bakery', 'accountant')")
-    keyword: str = Field("", description="Optional search keyword for further refinement (name, address, subtypes, etc.)")
+    city: str = Field("Oakland", description="City whose directory to search (e.g. 'Oakland').")
+    keyword: str = Field("", description="Optional search keyword for further refinement (name, address, subtypes, etc.). Misspelt names still find the closest matches, flagged with 'approximate_match'.")
     limit: int = Field(5, description="Maximum number of results to return (reduced for faster responses).")
+    sort: Literal["relevance", "rating", "distance", "least_busy"] = Field("relevance", description="'relevance' ranks by keyword match and review-weighted rating; 'rating' ranks by review-weighted rating only; 'distance' ranks nearest first (requires lat/lon); 'least_busy' ranks by typical crowd level at open_at (default now).")
+    lat: Optional[float] = Field(None, description="Optional latitude to search near, e.g. 37.8024 for Lake Merritt. Use together with lon.")
+    lon: Optional[float] = Field(None, description="Optional longitude to search near, e.g. -122.2583 for Lake Merritt. Use together with lat.")
+    radius_m: Optional[float] = Field(None, description="Optional search radius in meters around lat/lon (e.g. 1000 for 'within 1 km').")
+    open_at: Optional[str] = Field(None, description="Optional: only return businesses open at this time. Use 'now' or a local ISO datetime like '2025-06-14T18:30'. Results then include 'open_until' instead of raw hours.")
+    max_busyness: Optional[int] = Field(None, description="Optional: to avoid crowds, exclude places typically busier than this percentage (0-100) at open_at (default now).")
+    attributes: List[str] = Field(default_factory=list, description="Optional structured amenities that must all apply, e.g. ['wheelchair accessible', 'vegan', 'takeout', 'women-owned'].")
+    fields: List[Literal["reviews", "phone", "website", "google_maps", "hours", "description"]] = Field(default_factory=list, description="Optional extra fields the question needs beyond name, type, address and rating (a description snippet is added for keyword or amenity searches). Links come back as short refs the website expands.")
+    compact: bool = Field(True, description="Return compact, token-budgeted results. Set to false only when every raw field is needed.")
+
+    def query(self) -> SearchQuery:
+        """The validated engine query for these arguments"""
+        open_at = self.open_at
+        if open_at is None and (self.sort == "least_busy" or self.max_busyness is not None):
+            open_at = "now"
+        return SearchQuery(
+            category=self.category,
+            keyword=self.keyword,
+            limit=self.limit,
+            sort=self.sort,
+            lat=self.lat,
+            lon=self.lon,
+            radius_m=self.radius_m,
+            open_at=parse_open_at(open_at) if open_at else None,
+            open_at_input=open_at or None,
+            max_busyness=self.max_busyness,
+            attributes=tuple(self.attributes),
+            city=self.city,
+        )
 
     def run(self):
         try:
-            # Use cached search function for faster responses
-            sample = _get_filtered_data(self.category, self.keyword, self.limit)
+            query = self.query()
+            businesses, result = search_directory_json(query)
+            if not result.rows:
+                return f"No results found for category '{self.category}' with keyword '{self.keyword}'."
+            if not self.compact:
+                return json.loads(businesses)
 
-            # Format output
-            results = []
-            for _, row in sample.iterrows():
-                business = {
-                    'name': row.get('name', ''),
-                    'type': row.get('category', ''),
-                    'address': row.get('full_address', ''),
-                    'phone': row.get('phone', ''),
-                    'website': row.get('site', ''),
-                    'hours': row.get('working_hours', ''),
-                    'rating': row.get('rating', ''),
-                    'reviews': row.get('reviews', ''),
-                    'description': row.get('description', ''),
-                    'google_maps': row.get('location_link', '')
-                }
-                results.append(business)
-            
-            return results if results else f"No results found for category '{self.category}' with keyword '{self.keyword}'."
+            # Only the fields the question needs, within the token budget
+            items = compact_businesses(json.loads(businesses), query, self.fields)
+            output = dumps({"businesses": items, "total_found": result.total})
+            token_meter.record("BuyBlackDirectorySearch", output, businesses.decode("utf-8"))
+            return output
             
         except Exception as e:
             return f"Error searching businesses: {str(e)}"
@@ -4,6 +4,20 @@ import requests
 import json
 import os
 
+from city_explorer.directory.tool_output import compact_landmarks, dumps, token_meter
+from city_explorer.places.singleflight import SingleFlight
+
+# Identical OpenTripMap calls in flight at once (many users asking about one city) share one request
+_opentripmap = SingleFlight("opentripmap")
+
+
+def _get_opentripmap(url, params):
+    """GET an OpenTripMap endpoint, coalesced with identical concurrent calls; the JSON body, or None unless 200"""
+    def fetch():
+        response = requests.get(url, params=params, timeout=10)
+        return response.json() if response.status_code == 200 else None
+    return _opentripmap.do((url, tuple(sorted(params.items()))), fetch)
+
 class LandmarkDiscovery(BaseTool):
     """
     Find cultural landmarks and notable places in a specified city using OpenTripMap API or similar services.
@@ -11,6 +25,7 @@ class LandmarkDiscovery(BaseTool):
     city: str = Field(..., description="The city to search for landmarks")
     landmark_type: str = Field("cultural", description="Type of landmark to find (cultural, historical, museum, etc.)")
     limit: int = Field(10, description="Maximum number of landmarks to return")
+    compact: bool = Field(True, description="Return compact, token-budgeted results. Set to false only when full descriptions are needed.")
 
     def run(self):
         """
@@ -20,12 +35,19 @@ class LandmarkDiscovery(BaseTool):
             # Try OpenTripMap API first (requires API key in environment)
             api_key = os.getenv("OPENTRIPMAP_API_KEY")
             if api_key:
-                return self._search_opentripmap(api_key)
+                landmarks = self._search_opentripmap(api_key)
             else:
                 # Fallback to basic search without API
-                return self._fallback_landmark_search()
+                landmarks = self._fallback_landmark_search()
         except Exception as e:
             return f"Error searching landmarks: {str(e)}"
+        if not self.compact:
+            return landmarks
+
+        # Short addresses and kinds, descriptions cut to the token budget
+        output = dumps(compact_landmarks(landmarks))
+        token_meter.record("LandmarkDiscovery", output, dumps(landmarks))
+        return output
 
     def _search_opentripmap(self, api_key):
         """Search using OpenTripMap API"""
@@ -37,9 +59,8 @@ class LandmarkDiscovery(BaseTool):
                 "apikey": api_key
             }
             
-            response = requests.get(url, params=params, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
+            data = _get_opentripmap(url, params)
+            if data is not None:
                 lat = data.get('lat')
                 lon = data.get('lon')
                 
@@ -54,9 +75,8 @@ class LandmarkDiscovery(BaseTool):
                     "limit": self.limit
                 }
                 
-                search_response = requests.get(search_url, params=search_params, timeout=10)
-                if search_response.status_code == 200:
-                    landmarks = search_response.json()
+                landmarks = _get_opentripmap(search_url, search_params)
+                if landmarks is not None:
                     return self._format_opentripmap_results(landmarks)
             
             return self._fallback_landmark_search()
@@ -14,6 +14,7 @@ class ItineraryBuilder(BaseTool):
     budget_level: str = Field("medium", description="Budget level: 'budget', 'medium', 'luxury'")
     selected_locations: List[Dict[str, Any]] = Field(default=[], description="Pre-selected businesses/landmarks to include")
     start_time: str = Field("09:00", description="Preferred start time for each day (24-hour format)")
+    avoid_crowds: bool = Field(False, description="Prefer Black-owned spots that are typically less busy at the planned time")
 
     def run(self):
         """
@@ -76,7 +77,7 @@ class ItineraryBuilder(BaseTool):
             current_time = self._add_time(current_time, 3)
         
         # Lunch (12:00-13:30)
-        lunch_activity = self._get_lunch_activity()
+        lunch_activity = self._get_lunch_activity(day_number)
         if lunch_activity:
             activities.append({
                 "time": "12:00",
@@ -150,8 +151,13 @@ class ItineraryBuilder(BaseTool):
                 "cost": "Free"
             }
 
-    def _get_lunch_activity(self) -> Dict[str, Any]:
+    def _get_lunch_activity(self, day_number: int = 1) -> Dict[str, Any]:
         """Get lunch recommendation"""
+        if self.avoid_crowds:
+            quiet_spot = self._get_least_busy_spot("restaurant", day_number, "12:00")
+            if quiet_spot:
+                return quiet_spot
+
         lunch_options = [
             {
                 "name": "Miss Ollie's",
@@ -197,6 +203,30 @@ class ItineraryBuilder(BaseTool):
             "cost": "$25-75"
         }
 
+    def _get_least_busy_spot(self, category: str, day_number: int, slot_time: str) -> Dict[str, Any]:
+        """Pick the directory business open and least busy at a slot, if crowd data exists"""
+        try:
+            from city_explorer.directory import SearchQuery, get_engine
+
+            slot_date = datetime.now() + timedelta(days=day_number - 1)
+            slot = datetime.combine(slot_date.date(), datetime.strptime(slot_time, "%H:%M").time())
+            # Cities without a directory raise here and keep the default plan
+            engine = get_engine(self.city)
+            result = engine.search(SearchQuery(category=category, open_at=slot, sort="least_busy", limit=1))
+            if not result.rows or not result.busyness or result.busyness[0] is None:
+                return {}
+
+            row = result.rows[0]
+            return {
+                "name": engine.store.value(row, "name"),
+                "location": engine.store.value(row, "full_address") or self.city,
+                "description": f"Typically {result.busyness[0]}% busy at {slot_time}; open until {result.open_until[0]}",
+                "cost": "$15-25" if self.budget_level != "budget" else "$12-20"
+            }
+        except Exception:
+            # Crowd data is an optional refinement; keep the default plan
+            return {}
+
     def _add_time(self, time_str: str, hours: int) -> str:
         """Add hours to a time string"""
         time_obj = datetime.strptime(time_str, "%H:%M")
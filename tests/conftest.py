@@ -0,0 +1,155 @@
+"""Shared fixtures"""
+
+import json
+
+import pandas as pd
+import pytest
+
+from city_explorer.directory.engine import DirectoryEngine
+from city_explorer.directory.snapshot import DEFAULT_CSV, build_snapshot
+from city_explorer.directory.store import BusinessStore
+from tests.places_stub import stub_server
+
+WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def _hours(**days) -> str:
+    return json.dumps({day: days.get(day.lower(), "Closed") for day in WEEK})
+
+
+def _crowds(percentage: int) -> str:
+    return json.dumps(
+        [
+            {
+                "day_text": day,
+                "popular_times": [
+                    {"hour": hour, "percentage": percentage} for hour in range(24)
+                ],
+            }
+            for day in WEEK
+        ]
+    )
+
+
+# A handful of Oakland businesses, each picked to exercise one index
+TINY_DIRECTORY = [
+    {
+        "name": "Sweet Bakery",
+        "category": "Bakery",
+        "type": "Bakery",
+        "subtypes": "Bakery, Cafe",
+        "borough": "Downtown",
+        "rating": 5.0,
+        "reviews": 1,
+        "reviews_per_score_5": 1,
+        "latitude": 37.8000,
+        "longitude": -122.2700,
+        "working_hours": _hours(**{day.lower(): "9AM-5PM" for day in WEEK}),
+        "popular_times": _crowds(80),
+        "about": json.dumps(
+            {"Service options": {"Delivery": True}, "Crowd": {"Women-owned": True}}
+        ),
+        "description": "Cakes and pies",
+        "place_id": "place-sweet",
+        "query": "bakery, Oakland",
+    },
+    {
+        "name": "Golden Crust Bakery",
+        "category": "Bakery",
+        "type": "Bakery",
+        "subtypes": "Bakery",
+        "borough": "Downtown",
+        "rating": 4.8,
+        "reviews": 900,
+        "reviews_per_score_5": 720,
+        "reviews_per_score_4": 180,
+        "latitude": 37.8100,
+        "longitude": -122.2700,
+        "working_hours": _hours(friday="6PM-2AM", saturday="6PM-2AM"),
+        "popular_times": _crowds(10),
+        "about": json.dumps({"Service options": {"Delivery": True, "Dine-in": False}}),
+        "description": "Bread baked overnight",
+        "place_id": "place-golden",
+        "query": "bakery, Oakland",
+    },
+    {
+        "name": "Corner Cafe",
+        "category": "Cafe",
+        "type": "Cafe",
+        "subtypes": "Cafe, Bakery",
+        "borough": "Uptown",
+        "rating": 4.0,
+        "reviews": 50,
+        "reviews_per_score_4": 50,
+        "latitude": 37.9000,
+        "longitude": -122.2700,
+        "working_hours": _hours(**{day.lower(): "7AM-3PM" for day in WEEK}),
+        "about": json.dumps({"Crowd": {"Women-owned": True}}),
+        "description": "Coffee and a bakery case",
+        "place_id": "place-corner",
+        "query": "cafe, Oakland",
+    },
+    {
+        "name": "Old Mill Bakery",
+        "category": "Bakery",
+        "type": "Bakery",
+        "subtypes": "Bakery",
+        "borough": "Uptown",
+        "rating": 4.5,
+        "reviews": 20,
+        "reviews_per_score_5": 10,
+        "reviews_per_score_4": 10,
+        "latitude": 37.8050,
+        "longitude": -122.2700,
+        "business_status": "CLOSED_PERMANENTLY",
+        "place_id": "place-mill",
+        "query": "bakery, Oakland",
+    },
+]
+
+
+@pytest.fixture
+def tiny_csv(tmp_path):
+    """``TINY_DIRECTORY`` as an Outscraper-style CSV"""
+    rows = [
+        {"time_zone": "America/Los_Angeles", "business_status": "OPERATIONAL", **row}
+        for row in TINY_DIRECTORY
+    ]
+    path = tmp_path / "Tiny_nominees.csv"
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def tiny_engine(tiny_csv, tmp_path):
+    """A directory engine over ``TINY_DIRECTORY``; row ids follow its order"""
+    snapshot_dir = build_snapshot(str(tiny_csv), str(tmp_path / "snapshots" / "tiny"))
+    return DirectoryEngine(BusinessStore(snapshot_dir).map_all())
+
+
+@pytest.fixture(scope="session")
+def oakland_engine(tmp_path_factory):
+    """A directory engine over the bundled Oakland CSV, shared by read-only tests"""
+    snapshot_dir = build_snapshot(
+        DEFAULT_CSV, str(tmp_path_factory.mktemp("snapshots") / "oakland")
+    )
+    return DirectoryEngine(BusinessStore(snapshot_dir).map_all())
+
+
+@pytest.fixture
+def places_server():
+    """
+    Start stub Places servers with ``places_server(latency_s, misses=None)``;
+    all are stopped afterwards
+    """
+    servers = []
+
+    def start(latency_s: float = 0.02, misses=None):
+        server = stub_server(latency_s, misses)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
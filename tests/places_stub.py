@@ -0,0 +1,97 @@
+"""A local stand-in for the Google Places API, for tests and benchmarks"""
+
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# Lookups of businesses whose name starts with this take 50 times the latency.
+STALL_NAME_PREFIX = "STALL "
+
+
+def first_query_misses(query: str) -> bool:
+    """About a third of businesses miss on their first (name + city) query"""
+    return query.endswith(" Oakland") and zlib.crc32(query.encode()) % 3 == 0
+
+
+class StubPlacesServer(ThreadingHTTPServer):
+    """Answers text search and Place Details on a free port, recording requests"""
+
+    def __init__(self, latency_s: float, misses: Callable[[str], bool]):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency_s = latency_s
+        self.misses = misses
+        # (endpoint, query or place_id) of every request, in arrival order
+        self.requests: List[tuple] = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real API
+    protocol_version = "HTTP/1.1"
+    server: StubPlacesServer
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        query = params.get("query", params.get("place_id", [""]))[0]
+        endpoint = url.path.rsplit("/", 2)[-2]
+        with self.server.lock:
+            self.server.requests.append((endpoint, query))
+            self.server.in_flight += 1
+            self.server.peak_in_flight = max(
+                self.server.peak_in_flight, self.server.in_flight
+            )
+        try:
+            time.sleep(
+                self.server.latency_s
+                * (50 if query.startswith(STALL_NAME_PREFIX) else 1)
+            )
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+        place = {
+            "name": query,
+            "rating": 4.5,
+            "user_ratings_total": 120,
+            "formatted_phone_number": "(510) 555-0100",
+            "opening_hours": {"weekday_text": ["Monday: 9 AM - 5 PM"]},
+            "photos": [{"photo_reference": "ref"}],
+        }
+        if endpoint == "details":
+            body = {"status": "OK", "result": place}
+        elif self.server.misses(query):
+            body = {"status": "ZERO_RESULTS", "results": []}
+        else:
+            body = {"status": "OK", "results": [place]}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the lookup at its deadline.
+            pass
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+def stub_server(
+    latency_s: float, misses: Optional[Callable[[str], bool]] = None
+) -> StubPlacesServer:
+    """A stub Places server serving from a daemon thread; stop it with ``shutdown``"""
+    server = StubPlacesServer(latency_s, misses or first_query_misses)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
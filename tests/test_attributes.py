@@ -0,0 +1,74 @@
+"""Attribute filters over packed bitsets"""
+
+import json
+
+import numpy as np
+import pytest
+
+from city_explorer.directory.attributes import AttributeIndex, build_attribute_bitsets
+from city_explorer.directory.query import SearchQuery
+
+FLAGS = [
+    "Delivery",
+    "Takeout",
+    "Wheelchair accessible entrance",
+    "Wheelchair accessible restroom",
+]
+
+
+def _about(rng, rows):
+    values = []
+    for _ in range(rows):
+        flags = {name: bool(rng.random() < 0.4) for name in FLAGS}
+        values.append(
+            json.dumps({"Service options": flags}) if rng.random() < 0.9 else None
+        )
+    return values
+
+
+def _brute(values, wanted):
+    def has(raw, term):
+        about = json.loads(raw)["Service options"] if raw else {}
+        return any(
+            value and term.lower() in name.lower() for name, value in about.items()
+        )
+
+    return [
+        row for row, raw in enumerate(values) if all(has(raw, term) for term in wanted)
+    ]
+
+
+def test_filters_and_every_term_across_byte_boundaries():
+    values = _about(np.random.default_rng(1), 37)
+    names, groups, bitsets = build_attribute_bitsets(values)
+    index = AttributeIndex(bitsets, names, groups, len(values))
+    for wanted in (
+        ["delivery"],
+        ["Delivery", "takeout"],
+        ["wheelchair"],
+        ["takeout", "wheelchair accessible restroom"],
+    ):
+        assert index.rows(wanted).tolist() == _brute(values, wanted), wanted
+
+
+def test_edits_set_and_clear_bits(tiny_engine):
+    index = tiny_engine.attributes
+    size = index.size
+    index.add_row(size, [("Service options", "Delivery"), ("Payments", "Cash only")])
+    assert index.rows(["delivery"]).tolist() == [0, 1, size]
+    assert index.rows(["cash only"]).tolist() == [size]
+    index.clear_row(0)
+    assert index.rows(["delivery"]).tolist() == [1, size]
+    assert {a["name"]: a["count"] for a in index.counts()}["Delivery"] == 2
+
+
+def test_search_requires_every_attribute(tiny_engine):
+    both = SearchQuery(category="", attributes=("Delivery", "women-owned"), limit=10)
+    assert tiny_engine.search(both).rows == [0]
+    delivery = SearchQuery(
+        category="", attributes=("delivery",), sort="rating", limit=10
+    )
+    assert tiny_engine.search(delivery).rows == [1, 0]
+    # Flags set to false are not attributes.
+    with pytest.raises(ValueError, match="Unknown attribute 'dine-in'"):
+        tiny_engine.search(SearchQuery(category="", attributes=("dine-in",)))
@@ -0,0 +1,63 @@
+"""Prefix completions over business names and facet labels"""
+
+from city_explorer.directory.autocomplete import Autocomplete
+
+ENTRIES = [
+    ("Golden Crust Bakery", "business", 900.0),
+    ("Sweet Bakery", "business", 1.0),
+    ("Bakery", "category", 901.0),
+    ("Bakery", "subtype", 950.0),
+    ("Bay Fish Market", "business", 40.0),
+    ("Sweet Bakery", "business", 3.0),
+]
+
+
+def _texts(suggestions):
+    return [(s["kind"], s["text"]) for s in suggestions]
+
+
+def test_completes_the_start_of_any_word_by_popularity():
+    autocomplete = Autocomplete(ENTRIES)
+    assert _texts(autocomplete.suggest("ba", limit=10)) == [
+        ("subtype", "Bakery"),
+        ("category", "Bakery"),
+        ("business", "Golden Crust Bakery"),
+        ("business", "Bay Fish Market"),
+        ("business", "Sweet Bakery"),
+    ]
+    assert _texts(autocomplete.suggest("  CRUST ")) == [
+        ("business", "Golden Crust Bakery")
+    ]
+    # Only word starts: "rust" is inside "Crust".
+    assert autocomplete.suggest("rust") == []
+    assert autocomplete.suggest("sweet b")[0]["popularity"] == 3
+
+
+def test_limit_and_kinds():
+    autocomplete = Autocomplete(ENTRIES)
+    assert _texts(autocomplete.suggest("ba", limit=2)) == [
+        ("subtype", "Bakery"),
+        ("category", "Bakery"),
+    ]
+    assert _texts(autocomplete.suggest("ba", limit=2, kinds=["business"])) == [
+        ("business", "Golden Crust Bakery"),
+        ("business", "Bay Fish Market"),
+    ]
+    assert autocomplete.suggest("", limit=5) == []
+    assert autocomplete.suggest("ba", limit=0) == []
+
+
+def test_added_labels_are_suggested_and_discarded_ones_hidden():
+    autocomplete = Autocomplete(ENTRIES)
+    autocomplete.add("Bayside Bagels", "business", 2000.0)
+    assert _texts(autocomplete.suggest("ba", limit=1)) == [
+        ("business", "Bayside Bagels")
+    ]
+    assert _texts(autocomplete.suggest("bag")) == [("business", "Bayside Bagels")]
+
+    # "Sweet Bakery" was listed twice; it stays until both are gone.
+    autocomplete.discard("Sweet Bakery", "business")
+    assert _texts(autocomplete.suggest("sweet")) == [("business", "Sweet Bakery")]
+    autocomplete.discard("Sweet Bakery", "business")
+    autocomplete.discard("Bayside Bagels", "business")
+    assert autocomplete.suggest("sweet") == [] and autocomplete.suggest("bag") == []
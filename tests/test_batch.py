@@ -0,0 +1,60 @@
+"""Batched searches against one query at a time"""
+
+from dataclasses import replace
+from datetime import datetime
+
+import numpy as np
+
+from city_explorer.directory.query import SearchQuery
+
+QUERIES = [
+    SearchQuery(category="restaurant", limit=10),
+    SearchQuery(category="Restaurant ", keyword="soul", limit=5),
+    SearchQuery(category="bakery", sort="rating", limit=20),
+    SearchQuery(
+        category="store", keyword="hair", attributes=("women-owned",), limit=10
+    ),
+    SearchQuery(
+        category="salon",
+        lat=37.8044,
+        lon=-122.2712,
+        radius_m=3000,
+        sort="distance",
+        limit=10,
+    ),
+    SearchQuery(
+        category="cafe",
+        open_at=datetime(2025, 6, 14, 9, 30),
+        sort="least_busy",
+        limit=10,
+    ),
+    SearchQuery(category="", keyword="catering", limit=50),
+    SearchQuery(category="no such category", limit=5),
+]
+
+
+def test_category_masks_match_each_category_alone(oakland_engine):
+    masks = oakland_engine.category_masks([query.category for query in QUERIES])
+    assert len(masks) == len(QUERIES) - 1
+    for query in QUERIES:
+        expected = oakland_engine.category_rows(query.category)
+        np.testing.assert_array_equal(masks[query.category.strip().lower()], expected)
+
+
+def test_batched_searches_equal_searches_one_at_a_time(oakland_engine):
+    masks = oakland_engine.category_masks([query.category for query in QUERIES])
+    for query in QUERIES:
+        oakland_engine.cache.invalidate()
+        batched = oakland_engine.search(query, masks[query.category.strip().lower()])
+        oakland_engine.cache.invalidate()
+        alone = oakland_engine.search(query)
+        assert batched == alone, query
+        assert alone.total or query is QUERIES[-1]
+        if alone.next_cursor:
+            next_page = replace(query, cursor=alone.next_cursor)
+            assert (
+                oakland_engine.search(
+                    next_page, masks[query.category.strip().lower()]
+                ).rows
+                == oakland_engine.search(next_page).rows
+            )
@@ -0,0 +1,186 @@
+"""Circuit breaker states and how the Places enricher reports to it"""
+
+import httpx
+import pytest
+
+from city_explorer.places import (
+    CircuitBreaker,
+    CircuitOpenError,
+    PlaceCache,
+    PlacesEnricher,
+)
+from city_explorer.places.breaker import CLOSED, HALF_OPEN, OPEN
+from city_explorer.places.enrichment import CIRCUIT_OPEN, ENRICHMENT_FLAG, OVER_BUDGET
+from tests.places_stub import STALL_NAME_PREFIX
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _enricher(handler, breaker: CircuitBreaker) -> PlacesEnricher:
+    return PlacesEnricher(
+        base_url="http://places.test",
+        cache_path=None,
+        request_budget_s=None,
+        transport=httpx.MockTransport(handler),
+        breaker=breaker,
+    )
+
+
+def test_opens_after_consecutive_failures_and_probes_once():
+    clock = FakeClock()
+    breaker = CircuitBreaker(
+        "places", failure_threshold=3, reset_timeout_s=10, clock=clock
+    )
+    breaker.failure()
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    breaker.failure()
+    assert breaker.state == CLOSED
+    breaker.failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError, match="retry in 10.0s"):
+        breaker.check()
+
+    clock.now = 10
+    # One probe goes through; everyone else keeps failing fast while it is out.
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.failure()
+    assert breaker.state == OPEN and breaker.retry_after() == 10
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == CLOSED and breaker.allow()
+    assert breaker.stats() == {
+        "state": CLOSED,
+        "consecutive_failures": 0,
+        "trips": 1,
+        "rejected": 2,
+        "probes": 2,
+    }
+
+
+def test_probe_that_never_reports_back_is_replaced():
+    clock = FakeClock()
+    breaker = CircuitBreaker(
+        "places", failure_threshold=1, reset_timeout_s=10, clock=clock
+    )
+    breaker.failure()
+    clock.now = 10
+    assert breaker.allow()
+    clock.now = 15
+    assert not breaker.allow()
+    clock.now = 20
+    assert breaker.allow()
+
+
+def test_undecodable_body_counts_as_a_failure():
+    clock = FakeClock()
+    breaker = CircuitBreaker(
+        "places", failure_threshold=1, reset_timeout_s=10, clock=clock
+    )
+    breaker.failure()
+    clock.now = 10
+    # A truncated 200 body, as when the upstream drops the connection mid-response
+    enricher = _enricher(
+        lambda request: httpx.Response(200, content=b'{"status": "OK", "res'), breaker
+    )
+    try:
+        enriched = enricher.enrich(
+            [{"name": "Sweet Bakery"}], api_key="stub", place_ids=["place-sweet"]
+        )
+    finally:
+        enricher.close()
+
+    assert enriched == [{}]
+    assert enricher.requests == 1
+    # The probe reported back: the breaker reopened instead of waiting on it.
+    assert breaker.state == OPEN
+    assert breaker.retry_after() == 10
+
+
+def test_rows_over_budget_come_back_flagged(places_server):
+    server = places_server(latency_s=0.02)
+    enricher = PlacesEnricher(
+        base_url=server.base_url, cache_path=None, request_budget_s=0.3
+    )
+    place_ids = ["place-0", STALL_NAME_PREFIX + "place-1", "place-2"]
+    try:
+        enriched = enricher.enrich(
+            [{"name": f"Business {i}"} for i in range(3)],
+            api_key="stub",
+            place_ids=place_ids,
+        )
+        stats = enricher.stats()
+    finally:
+        enricher.close()
+
+    assert enriched[1] == {ENRICHMENT_FLAG: OVER_BUDGET}
+    assert enriched[0]["google_rating"] == enriched[2]["google_rating"] == 4.5
+    assert (
+        stats["budget_overruns"],
+        stats["rows_over_budget"],
+        stats["background_lookups"],
+    ) == (1, 1, 1)
+
+
+def test_open_circuit_answers_from_the_cache(places_server, tmp_path):
+    server = places_server()
+    cache_path = str(tmp_path / "places.sqlite")
+    cache = PlaceCache(cache_path)
+    cache.put(
+        "place-sweet",
+        {
+            "hours": {"current_hours": ["Monday: 9 AM - 5 PM"]},
+            "rating": {"google_rating": 4.0, "google_review_count": 3},
+            "contact": {},
+            "photos": {},
+        },
+    )
+    cache.put(
+        "place-golden", {"rating": {"google_rating": 4.8, "google_review_count": 900}}
+    )
+    cache.close()
+    breaker = CircuitBreaker("places", failure_threshold=1, reset_timeout_s=60)
+    breaker.failure()
+    enricher = PlacesEnricher(
+        base_url=server.base_url,
+        cache_path=cache_path,
+        request_budget_s=None,
+        breaker=breaker,
+    )
+    try:
+        enriched = enricher.enrich(
+            [
+                {"name": "Sweet Bakery"},
+                {"name": "Golden Crust Bakery"},
+                {"name": "Corner Cafe"},
+            ],
+            api_key="stub",
+            place_ids=["place-sweet", "place-golden", "place-corner"],
+        )
+    finally:
+        enricher.close()
+
+    assert server.requests == []
+    assert enriched == [
+        {
+            "current_hours": ["Monday: 9 AM - 5 PM"],
+            "google_rating": 4.0,
+            "google_review_count": 3,
+        },
+        {
+            "google_rating": 4.8,
+            "google_review_count": 900,
+            ENRICHMENT_FLAG: CIRCUIT_OPEN,
+        },
+        {ENRICHMENT_FLAG: CIRCUIT_OPEN},
+    ]
@@ -0,0 +1,64 @@
+"""Bounds, eviction order and counters of the ranked-result cache"""
+
+import numpy as np
+
+from city_explorer.directory.cache import ResultCache
+
+
+def _rows(count: int) -> np.ndarray:
+    return np.arange(count, dtype=np.int32)
+
+
+def test_evicts_least_recently_used_beyond_max_entries():
+    cache: ResultCache = ResultCache(max_entries=2, max_bytes=1 << 20)
+    cache.put("a", _rows(1))
+    cache.put("b", _rows(1))
+    assert cache.get("a") is not None
+    cache.put("c", _rows(1))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicts_by_bytes_held_in_arrays():
+    cache: ResultCache = ResultCache(max_entries=100, max_bytes=1000)
+    cache.put("a", (_rows(100), None))
+    cache.put("b", (_rows(100), np.zeros(25)))
+    assert cache.stats()["bytes"] == 1000
+    cache.put("c", _rows(10))
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 640
+    # Bigger than the whole budget: served by the caller, never stored
+    cache.put("huge", _rows(1000))
+    assert cache.get("huge") is None
+    assert len(cache) == 2
+
+
+def test_replacing_a_key_releases_its_bytes():
+    cache: ResultCache = ResultCache(max_entries=10, max_bytes=1000)
+    cache.put("a", _rows(200))
+    cache.put("a", _rows(10))
+    assert cache.stats()["bytes"] == 40
+    assert cache.stats()["evictions"] == 0
+
+
+def test_get_or_compute_counts_hits_and_misses():
+    cache: ResultCache = ResultCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return _rows(3)
+
+    for _ in range(3):
+        cache.get_or_compute("q", compute)
+    assert len(calls) == 1
+    cache.invalidate()
+    cache.get_or_compute("q", compute)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"], len(calls)) == (
+        2,
+        2,
+        1,
+        2,
+    )
@@ -0,0 +1,62 @@
+"""Least-busy ordering and busyness caps from the popular-times matrix"""
+
+import json
+from datetime import datetime
+
+import numpy as np
+
+from city_explorer.directory.crowds import UNKNOWN, parse_popular_times
+from city_explorer.directory.query import SearchQuery
+from city_explorer.directory.ranking import top_k
+
+# A Friday
+FRIDAY_1PM = datetime(2025, 6, 13, 13, 0)
+
+
+def test_popular_times_decode_monday_first():
+    grid = parse_popular_times(
+        json.dumps(
+            [
+                {
+                    "day_text": "Sunday",
+                    "popular_times": [{"hour": 18, "percentage": 64}],
+                },
+                {
+                    "day_text": "Monday",
+                    "popular_times": [{"hour": 9, "percentage": 140}],
+                },
+            ]
+        )
+    )
+    assert grid[6, 18] == 64
+    assert grid[0, 9] == 100
+    assert grid[0, 10] == UNKNOWN
+    assert parse_popular_times("not json") is None
+
+
+def test_quietest_first_with_rating_breaking_ties_and_unknowns_last(tiny_engine):
+    rows = np.array([0, 1, 2])
+    # Row 1 has the best smoothed rating, row 2 the worst.
+    busyness = np.array([10, 10, UNKNOWN], dtype=np.uint8)
+    scores = tiny_engine.ranker.scores(rows, sort="least_busy", busyness=busyness)
+    assert rows[top_k(scores, 3)].tolist() == [1, 0, 2]
+    busyness = np.array([5, 90, 30], dtype=np.uint8)
+    scores = tiny_engine.ranker.scores(rows, sort="least_busy", busyness=busyness)
+    assert rows[top_k(scores, 3)].tolist() == [0, 2, 1]
+
+
+def test_least_busy_search(tiny_engine):
+    query = SearchQuery(category="", sort="least_busy", open_at=FRIDAY_1PM, limit=10)
+    result = tiny_engine.search(query)
+    # Only the bakery and the cafe are open; the cafe has no popular times.
+    assert result.rows == [0, 2]
+    assert result.busyness == [80, None]
+
+
+def test_max_busyness_keeps_businesses_without_data(tiny_engine):
+    query = SearchQuery(category="", max_busyness=50, open_at=FRIDAY_1PM, limit=10)
+    assert tiny_engine.search(query).rows == [2]
+    evening = SearchQuery(
+        category="", max_busyness=50, open_at=FRIDAY_1PM.replace(hour=20), limit=10
+    )
+    assert tiny_engine.search(evening).rows == [1]
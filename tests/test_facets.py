@@ -0,0 +1,43 @@
+"""Facet counts over the directory and over a search's matches"""
+
+from city_explorer.directory.ingest import business_id
+from city_explorer.directory.query import SearchQuery
+
+
+def _counts(listing):
+    return {
+        facet: {entry["value"]: entry["count"] for entry in entries}
+        for facet, entries in listing.items()
+    }
+
+
+def test_counts_leave_out_closed_businesses(tiny_engine):
+    counts = _counts(tiny_engine.facets.counts())
+    assert counts["category"] == {"Bakery": 2, "Cafe": 1}
+    assert counts["subtypes"] == {"Bakery": 3, "Cafe": 2}
+    assert counts["borough"] == {"Downtown": 2, "Uptown": 1}
+
+
+def test_search_facets_count_every_match_not_just_the_page(tiny_engine):
+    result = tiny_engine.search(
+        SearchQuery(category="", keyword="bakery", facets=True, limit=1)
+    )
+    assert len(result.rows) == 1
+    assert _counts(result.facets)["category"] == {"Bakery": 2, "Cafe": 1}
+
+
+def test_counts_follow_edits(tiny_engine):
+    tiny_engine.upsert(
+        business_id("place-sweet"), {"category": "Cafe", "subtypes": "Cafe, Patisserie"}
+    )
+    counts = _counts(tiny_engine.facets.counts())
+    assert counts["category"] == {"Bakery": 1, "Cafe": 2}
+    assert counts["subtypes"] == {"Bakery": 2, "Cafe": 2, "Patisserie": 1}
+    assert counts["borough"] == {"Downtown": 2, "Uptown": 1}
+
+    tiny_engine.delete(business_id("place-corner"))
+    counts = _counts(tiny_engine.facets.counts())
+    assert counts["category"] == {"Bakery": 1, "Cafe": 1}
+    assert counts["borough"] == {"Downtown": 2}
+    result = tiny_engine.search(SearchQuery(category="cafe", facets=True))
+    assert _counts(result.facets)["subtypes"] == {"Cafe": 1, "Patisserie": 1}
@@ -0,0 +1,44 @@
+"""Typo-tolerant name matching"""
+
+from city_explorer.directory.fuzzy import FuzzyIndex, trigrams
+from city_explorer.directory.query import SearchQuery
+
+
+def test_trigrams_are_padded_like_pg_trgm():
+    assert trigrams("brown") == {"  b", " br", "bro", "row", "own", "wn "}
+
+
+def test_misspelt_words_find_names_and_subtypes():
+    index = FuzzyIndex(
+        {
+            "name": ["Golden Crust", "Sweet Spot"],
+            "subtypes": ["Bakery", "Ice cream shop"],
+        },
+        2,
+    )
+    rows, scores = index.search("goldn crust")
+    assert rows.tolist() == [0]
+    assert 0.3 <= scores[0] < 1.0
+    assert index.search("ice creem")[0].tolist() == [1]
+    assert index.search("zzzz")[0].tolist() == []
+
+    index.add_row(2, {"name": "Golden Gate Deli"})
+    assert index.search("goldan")[0].tolist() == [0, 2]
+
+
+def test_search_falls_back_to_fuzzy_matches_only_when_nothing_contains_the_keyword(
+    tiny_engine,
+):
+    result = tiny_engine.search(
+        SearchQuery(category="", keyword="goldn crst", limit=10)
+    )
+    assert result.fuzzy
+    assert result.rows == [1]
+
+    typo = tiny_engine.search(SearchQuery(category="", keyword="bakey", limit=10))
+    assert typo.fuzzy
+    # Name hits come before the subtype-only hit, which counts a little less.
+    assert sorted(typo.rows[:2]) == [0, 1] and typo.rows[2:] == [2]
+
+    exact = tiny_engine.search(SearchQuery(category="", keyword="golden", limit=10))
+    assert not exact.fuzzy
@@ -0,0 +1,72 @@
+"""Radius and nearest-first searches over the grid index"""
+
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from city_explorer.directory.geo import GeoIndex, METRES_PER_DEGREE, haversine_m
+from city_explorer.directory.query import SearchQuery
+
+
+def _random_points(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    lats = 37.80 + rng.normal(0, 0.03, n)
+    lons = -122.27 + rng.normal(0, 0.03, n)
+    lats[::97] = np.nan
+    return lats, lons
+
+
+def test_haversine_of_a_hundredth_of_a_degree_of_latitude():
+    assert haversine_m(37.80, -122.27, np.array([37.81]), np.array([-122.27]))[
+        0
+    ] == pytest.approx(0.01 * METRES_PER_DEGREE)
+
+
+def test_within_matches_a_brute_force_scan():
+    lats, lons = _random_points()
+    index = GeoIndex(lats, lons)
+    for radius in (50.0, 400.0, 1500.0, 8000.0):
+        rows, dist = index.within(37.801, -122.268, radius)
+        brute = haversine_m(37.801, -122.268, lats, lons)
+        assert rows.tolist() == np.flatnonzero(brute <= radius).tolist()
+        np.testing.assert_allclose(dist, brute[rows])
+
+
+def test_nearest_matches_a_brute_force_sort():
+    lats, lons = _random_points()
+    index = GeoIndex(lats, lons)
+    allowed = np.zeros(len(lats), dtype=bool)
+    allowed[::3] = True
+    rows, dist = index.nearest(37.79, -122.30, 25, allowed)
+    brute = haversine_m(37.79, -122.30, lats, lons)
+    brute[~allowed | np.isnan(brute)] = np.inf
+    np.testing.assert_allclose(dist, np.sort(brute)[:25])
+    assert set(rows.tolist()) <= set(np.flatnonzero(allowed).tolist())
+
+
+def test_radius_search_filters_and_reports_distances(tiny_engine):
+    query = SearchQuery(
+        category="",
+        lat=37.8000,
+        lon=-122.2700,
+        radius_m=1500,
+        sort="distance",
+        limit=10,
+    )
+    result = tiny_engine.search(query)
+    # The closed bakery at 560 m and the cafe 11 km north are left out.
+    assert result.rows == [0, 1]
+    assert result.distance_m == pytest.approx([0.0, 0.01 * METRES_PER_DEGREE])
+    assert result.total == 2
+
+
+def test_nearest_first_without_a_radius_pages_through_everything(tiny_engine):
+    query = SearchQuery(
+        category="", lat=37.9000, lon=-122.2700, sort="distance", limit=2
+    )
+    first = tiny_engine.search(query)
+    assert first.rows == [2, 1]
+    second = tiny_engine.search(replace(query, cursor=first.next_cursor))
+    assert second.rows == [0]
+    assert second.distance_m == pytest.approx([0.1 * METRES_PER_DEGREE])
@@ -0,0 +1,73 @@
+"""Open-at filtering over weekly minute intervals"""
+
+import json
+from datetime import datetime, timezone
+
+from city_explorer.directory.hours import (
+    MINUTES_PER_DAY,
+    MINUTES_PER_WEEK,
+    parse_range,
+    parse_working_hours,
+)
+from city_explorer.directory.query import SearchQuery
+
+# 2025-06-13 is a Friday.
+FRIDAY = 13
+
+
+def _at(day: int, hour: int, minute: int = 0) -> datetime:
+    return datetime(2025, 6, day, hour, minute)
+
+
+def test_parse_range_handles_midnight_and_shared_meridiems():
+    assert parse_range("5PM-2AM") == [(17 * 60, 26 * 60)]
+    assert parse_range("5-9PM") == [(17 * 60, 21 * 60)]
+    assert parse_range("11-2PM") == [(11 * 60, 14 * 60)]
+    assert parse_range("9AM-12PM, 1-5PM") == [(9 * 60, 12 * 60), (13 * 60, 17 * 60)]
+    assert parse_range("Closed") == []
+    assert parse_range("Open 24 hours") == [(0, MINUTES_PER_DAY)]
+
+
+def test_sunday_night_wraps_to_monday_morning():
+    weekly = parse_working_hours(json.dumps({"Sunday": "10PM-3AM"}))
+    sunday = 6 * MINUTES_PER_DAY
+    assert weekly == [(sunday + 22 * 60, MINUTES_PER_WEEK), (0, 3 * 60)]
+
+
+def test_open_across_midnight(tiny_engine):
+    open_rows = {
+        _at(FRIDAY, 17, 59): [],
+        _at(FRIDAY, 18): [1],
+        # Friday's 6PM-2AM is still open early Saturday, and Saturday's into Sunday.
+        _at(FRIDAY + 1, 1, 59): [1],
+        _at(FRIDAY + 1, 2): [],
+        _at(FRIDAY + 2, 1): [1],
+        # Sunday is a closed day, so nothing carries into Monday.
+        _at(FRIDAY + 3, 1): [],
+    }
+    for moment, expected in open_rows.items():
+        result = tiny_engine.search(
+            SearchQuery(category="bakery", open_at=moment, limit=10)
+        )
+        assert result.rows == expected, moment
+
+
+def test_closed_days_and_closing_times(tiny_engine):
+    # Golden Crust is closed on Sundays; the other two keep daytime hours every day.
+    result = tiny_engine.search(
+        SearchQuery(category="", open_at=_at(FRIDAY + 2, 10), sort="rating", limit=10)
+    )
+    assert result.rows == [0, 2]
+    assert result.open_until == ["5:00 PM", "3:00 PM"]
+    late = tiny_engine.search(
+        SearchQuery(category="", open_at=_at(FRIDAY, 23), limit=10)
+    )
+    assert late.open_until == ["2:00 AM"]
+
+
+def test_aware_times_are_read_in_each_business_time_zone(tiny_engine):
+    # 08:30 UTC on Saturday is 01:30 in Oakland, Friday night's late opening.
+    moment = datetime(2025, 6, FRIDAY + 1, 8, 30, tzinfo=timezone.utc)
+    assert tiny_engine.search(
+        SearchQuery(category="", open_at=moment, limit=10)
+    ).rows == [1]
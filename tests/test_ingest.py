@@ -0,0 +1,98 @@
+"""Ingest-time merging of duplicate businesses"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from city_explorer.directory.ingest import business_id, business_keys, canonicalize
+
+
+def _frame(rows):
+    return pd.DataFrame(
+        rows, columns=["name", "phone", "reviews", "place_id", "google_id", "query"]
+    )
+
+
+def test_rows_sharing_a_place_id_merge_into_one_business():
+    df = _frame(
+        [
+            ["Sweet Bakery", None, 10, "p1", "g1", "bakery, Oakland"],
+            ["Corner Cafe", "555-0102", 5, "p2", None, "cafe, Oakland"],
+            ["Sweet Bakery (new)", "555-0101", 12, "p1", "g1", "black-owned, Oakland"],
+            ["Sweet Bakery", None, 3, "p1", None, "bakery, Oakland"],
+        ]
+    )
+    merged = canonicalize(df)
+    # First-appearance order, one row per place
+    assert merged["place_id"].tolist() == ["p1", "p2"]
+    sweet = merged.iloc[0]
+    # The freshest duplicate (most reviews) wins field by field.
+    assert (sweet["name"], sweet["phone"], sweet["reviews"]) == (
+        "Sweet Bakery (new)",
+        "555-0101",
+        12,
+    )
+    # Tags keep every source query once, in CSV order.
+    assert json.loads(sweet["tags"]) == ["bakery, Oakland", "black-owned, Oakland"]
+    assert json.loads(merged.iloc[1]["tags"]) == ["cafe, Oakland"]
+
+
+def test_missing_values_are_filled_from_older_duplicates():
+    df = _frame(
+        [
+            ["Sweet Bakery", "555-0101", 3, "p1", None, "a"],
+            ["Sweet Bakery", None, 10, "p1", None, "b"],
+        ]
+    )
+    assert canonicalize(df).iloc[0]["phone"] == "555-0101"
+
+
+def test_ids_are_stable_across_row_order():
+    df = _frame(
+        [
+            ["Sweet Bakery", None, 10, "p1", None, "a"],
+            ["Corner Cafe", None, 5, "p2", None, "b"],
+            ["Fish Market", None, 5, None, "g3", "c"],
+        ]
+    )
+    ids = dict(zip(canonicalize(df)["name"], canonicalize(df)["id"]))
+    shuffled = canonicalize(df.iloc[::-1])
+    assert dict(zip(shuffled["name"], shuffled["id"])) == ids
+    assert ids["Sweet Bakery"] == business_id("p1")
+    assert ids["Fish Market"] == business_id("g3")
+    assert canonicalize(df)["id"].dtype == np.int64
+
+
+def test_rows_sharing_either_id_are_one_business():
+    df = _frame(
+        [
+            ["Sweet Bakery", None, 10, "p1", None, "a"],
+            ["Sweet Bakery", "555-0101", 4, None, "g1", "b"],
+            ["Sweet Bakery", None, 2, "p1", "g1", "c"],
+            # Linked to the rows above only through g1
+            ["Sweet Bakery", None, 1, "p0", "g1", "d"],
+            ["Corner Cafe", None, 5, None, "g2", "e"],
+        ]
+    )
+    keys = business_keys(df)
+    assert keys.tolist() == ["p0", "p0", "p0", "p0", "g2"]
+    merged = canonicalize(df)
+    assert len(merged) == 2
+    assert json.loads(merged.iloc[0]["tags"]) == ["a", "b", "c", "d"]
+    assert merged.iloc[0]["phone"] == "555-0101"
+
+
+def test_rows_without_ids_are_keyed_by_name_and_address():
+    df = pd.DataFrame(
+        {
+            "name": ["Fish Market", "fish  market", "Fish Market", "Corner Cafe"],
+            "full_address": ["1 Main St", "1 MAIN ST", "9 Bay Rd", None],
+            "reviews": [1, 2, 3, 4],
+        }
+    )
+    keys = business_keys(df).tolist()
+    assert keys[0] == keys[1]
+    assert len(set(keys)) == 3
+    # The same rows in another order keep their keys.
+    assert business_keys(df.iloc[::-1]).tolist() == keys[::-1]
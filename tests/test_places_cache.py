@@ -0,0 +1,156 @@
+"""Per-group TTLs and stale-while-revalidate of the Places enrichment cache"""
+
+import time
+
+import httpx
+
+from city_explorer.places import PlaceCache, PlacesEnricher
+from city_explorer.places.enrichment import (
+    DAY_S,
+    FIELD_GROUPS,
+    NOT_FOUND_GROUP,
+    due_groups,
+    merge_groups,
+)
+
+PLACE = {
+    "rating": 4.9,
+    "user_ratings_total": 10,
+    "formatted_phone_number": "(510) 555-0199",
+    "website": "https://sweet.example",
+    "opening_hours": {"weekday_text": ["Monday: 8 AM - 6 PM"]},
+    "photos": [{"photo_reference": "fresh"}],
+}
+
+
+class RecordingPlaces:
+    """Place Details answered in-process, recording the fields each request asked for"""
+
+    def __init__(self) -> None:
+        self.fields = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.fields.append(request.url.params["fields"])
+        return httpx.Response(200, json={"status": "OK", "result": PLACE})
+
+
+def _enricher(cache_path, places: RecordingPlaces) -> PlacesEnricher:
+    return PlacesEnricher(
+        base_url="http://places.test",
+        cache_path=str(cache_path),
+        request_budget_s=None,
+        transport=httpx.MockTransport(places),
+    )
+
+
+def test_each_group_expires_on_its_own_ttl():
+    now = 100 * DAY_S
+    cached = {group.name: ({}, now - group.ttl_s + 60) for group in FIELD_GROUPS}
+    assert due_groups(cached, now) == []
+    cached["hours"] = ({}, now - 2 * DAY_S)
+    del cached["photos"]
+    assert [group.name for group in due_groups(cached, now)] == ["hours", "photos"]
+    # Google did not know the place a day ago: nothing is due.
+    assert due_groups({NOT_FOUND_GROUP: ({}, now - DAY_S)}, now) == []
+
+
+def test_newer_copy_of_a_group_wins():
+    merged = merge_groups(
+        {
+            "hours": ({"current_hours": ["old"]}, 1.0),
+            "rating": ({"google_rating": 4.0}, 5.0),
+        },
+        None,
+        {
+            "hours": ({"current_hours": ["new"]}, 2.0),
+            "rating": ({"google_rating": 3.0}, 4.0),
+        },
+    )
+    assert merged == {
+        "hours": ({"current_hours": ["new"]}, 2.0),
+        "rating": ({"google_rating": 4.0}, 5.0),
+    }
+
+
+def test_stale_groups_are_served_then_refreshed_in_the_background(tmp_path):
+    cache_path = tmp_path / "places.sqlite"
+    cache = PlaceCache(str(cache_path))
+    cache.put(
+        "place-sweet",
+        {
+            "rating": {"google_rating": 4.0, "google_review_count": 3},
+            "contact": {"google_phone": "(510) 555-0100"},
+            "photos": {},
+        },
+    )
+    cache.put(
+        "place-sweet",
+        {"hours": {"current_hours": ["Monday: 9 AM - 5 PM"]}},
+        fetched_at=time.time() - 2 * DAY_S,
+    )
+    cache.close()
+    places = RecordingPlaces()
+    enricher = _enricher(cache_path, places)
+    try:
+        enriched = enricher.enrich(
+            [{"name": "Sweet Bakery"}], api_key="stub", place_ids=["place-sweet"]
+        )
+    finally:
+        # Waits for the background refresh.
+        enricher.close()
+
+    # Answered from the cache, stale hours included
+    assert enriched == [
+        {
+            "google_rating": 4.0,
+            "google_review_count": 3,
+            "google_phone": "(510) 555-0100",
+            "current_hours": ["Monday: 9 AM - 5 PM"],
+        }
+    ]
+    # and only the stale group was asked for again.
+    assert places.fields == ["opening_hours"]
+    cache = PlaceCache(str(cache_path))
+    try:
+        refreshed = cache.get("place-sweet")
+    finally:
+        cache.close()
+    assert refreshed["hours"][0] == {"current_hours": ["Monday: 8 AM - 6 PM"]}
+    assert time.time() - refreshed["hours"][1] < 60
+    assert refreshed["rating"][0]["google_rating"] == 4.0
+
+
+def test_missing_groups_are_fetched_before_answering(tmp_path):
+    cache_path = tmp_path / "places.sqlite"
+    cache = PlaceCache(str(cache_path))
+    cache.put(
+        "place-sweet", {"rating": {"google_rating": 4.0, "google_review_count": 3}}
+    )
+    cache.close()
+    places = RecordingPlaces()
+    enricher = _enricher(cache_path, places)
+    try:
+        enriched = enricher.enrich(
+            [{"name": "Sweet Bakery"}], api_key="stub", place_ids=["place-sweet"]
+        )
+        again = enricher.enrich(
+            [{"name": "Sweet Bakery"}], api_key="stub", place_ids=["place-sweet"]
+        )
+    finally:
+        enricher.close()
+
+    assert places.fields == ["opening_hours,formatted_phone_number,website,photos"]
+    assert (
+        enriched
+        == again
+        == [
+            {
+                "google_rating": 4.0,
+                "google_review_count": 3,
+                "current_hours": ["Monday: 8 AM - 6 PM"],
+                "google_phone": "(510) 555-0199",
+                "google_website": "https://sweet.example",
+                "photo_references": ["fresh"],
+            }
+        ]
+    )
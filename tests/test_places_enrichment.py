@@ -0,0 +1,92 @@
+"""Concurrent Google Places enrichment against a local stub server"""
+
+import time
+
+from city_explorer.places import PlacesEnricher
+from tests.places_stub import STALL_NAME_PREFIX
+
+
+def _enricher(server, **options) -> PlacesEnricher:
+    options = {"cache_path": None, "request_budget_s": None, **options}
+    return PlacesEnricher(base_url=server.base_url, **options)
+
+
+def _businesses(count: int):
+    return [{"name": f"Business {i}", "address": f"{i} Main St"} for i in range(count)]
+
+
+def test_lookups_fan_out_up_to_the_concurrency_cap(places_server):
+    server = places_server(latency_s=0.05)
+    enricher = _enricher(server, max_concurrency=3)
+    try:
+        # Open the pool and its connections first; only the lookups are timed.
+        enricher.enrich(
+            _businesses(3), api_key="stub", place_ids=["warm-0", "warm-1", "warm-2"]
+        )
+        server.requests.clear()
+        started = time.perf_counter()
+        enriched = enricher.enrich(
+            _businesses(12), api_key="stub", place_ids=[f"place-{i}" for i in range(12)]
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        enricher.close()
+
+    assert [e["google_rating"] for e in enriched] == [4.5] * 12
+    assert len(server.requests) == enricher.requests - 3 == 12
+    assert server.peak_in_flight == 3
+    # Four waves of three, not twelve requests one after another
+    assert elapsed < 12 * 0.05
+
+
+def test_stalled_row_is_cancelled_at_its_deadline(places_server):
+    server = places_server(latency_s=0.05)
+    enricher = _enricher(server, row_deadline_s=0.5)
+    businesses = _businesses(4)
+    place_ids = [f"place-{i}" for i in range(4)]
+    place_ids[1] = STALL_NAME_PREFIX + place_ids[1]
+    try:
+        started = time.perf_counter()
+        enriched = enricher.enrich(businesses, api_key="stub", place_ids=place_ids)
+        elapsed = time.perf_counter() - started
+    finally:
+        enricher.close()
+
+    assert enriched[1] == {}
+    assert all(enriched[i]["google_rating"] == 4.5 for i in (0, 2, 3))
+    # The stalled request would take 2.5s; its row gave up at 0.5s.
+    assert elapsed < 2
+
+
+def test_text_search_falls_back_to_less_specific_queries(places_server):
+    server = places_server(misses=lambda query: query != "Zyzzyva Bakery")
+    enricher = _enricher(server)
+    try:
+        enriched = enricher.enrich(
+            [{"name": "Zyzzyva Bakery", "address": "1 Main St"}], api_key="stub"
+        )
+    finally:
+        enricher.close()
+
+    assert enriched[0]["google_phone"] == "(510) 555-0100"
+    assert server.requests == [
+        ("textsearch", "Zyzzyva Bakery Oakland"),
+        ("textsearch", "Zyzzyva Bakery 1 Main St"),
+        ("textsearch", "Zyzzyva Bakery"),
+    ]
+
+
+def test_business_no_query_finds_is_left_unenriched(places_server):
+    server = places_server(misses=lambda query: True)
+    enricher = _enricher(server)
+    try:
+        enriched = enricher.enrich([{"name": "Zyzzyva Bakery"}], api_key="stub")
+    finally:
+        enricher.close()
+
+    assert enriched == [{}]
+    assert [query for _, query in server.requests] == [
+        "Zyzzyva Bakery Oakland",
+        "Zyzzyva Bakery",
+        "Zyzzyva Bakery bakery Oakland",
+    ]
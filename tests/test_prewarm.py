@@ -0,0 +1,109 @@
+"""Rate limiting, daily quota and checkpointed resumption of Places pre-warm"""
+
+import asyncio
+import json
+import shutil
+import time
+
+import pytest
+
+from city_explorer.directory.registry import CSV_SUFFIX, DatasetRegistry
+from city_explorer.places import PlacesEnricher, prewarm
+from city_explorer.places.prewarm import (
+    Checkpoint,
+    DailyQuota,
+    TokenBucket,
+    prewarm_dataset,
+)
+
+
+def test_token_bucket_paces_requests_after_a_burst():
+    bucket = TokenBucket(rate=20, burst=2)
+
+    async def take(count: int) -> float:
+        started = time.perf_counter()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.perf_counter() - started
+
+    # Two at once, then one every 50ms
+    assert asyncio.run(take(2)) < 0.05
+    assert 0.18 < asyncio.run(take(4)) < 0.5
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0, burst=1)
+
+
+def test_daily_quota_persists_and_resets_each_day(tmp_path):
+    path = str(tmp_path / "quota.json")
+    quota = DailyQuota(3, path)
+    assert [quota.take() for _ in range(4)] == [True, True, True, False]
+    quota.refund()
+    quota.save()
+
+    reopened = DailyQuota(3, path)
+    assert reopened.remaining == 1
+
+    with open(path, "w") as f:
+        json.dump({"day": "2000-01-01", "used": 3}, f)
+    assert DailyQuota(3, path).remaining == 3
+
+
+@pytest.fixture
+def dataset(tiny_csv, tmp_path, monkeypatch):
+    """The tiny directory as a city, with checkpoints under the test's directory"""
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    shutil.copy(tiny_csv, data_dir / f"Tiny{CSV_SUFFIX}")
+    monkeypatch.setattr(prewarm, "PREWARM_DIR", str(tmp_path / "prewarm"))
+    # One row per checkpoint
+    monkeypatch.setattr(prewarm, "CHUNK_ROWS", 1)
+    return DatasetRegistry(str(data_dir)).dataset("tiny")
+
+
+def _run(dataset, server, cache_path, quota: DailyQuota) -> Checkpoint:
+    async def run() -> Checkpoint:
+        enricher = PlacesEnricher(
+            base_url=server.base_url, cache_path=cache_path, request_budget_s=None
+        )
+        async with enricher:
+            return await prewarm_dataset(
+                dataset, enricher, "stub", TokenBucket(1000, 10), quota
+            )
+
+    return asyncio.run(run())
+
+
+def test_run_cut_short_by_the_quota_resumes_at_its_checkpoint(
+    dataset, places_server, tmp_path
+):
+    server = places_server(latency_s=0)
+    cache_path = str(tmp_path / "places.sqlite")
+
+    state = _run(
+        dataset, server, cache_path, DailyQuota(2, str(tmp_path / "quota.json"))
+    )
+    assert [place_id for _, place_id in server.requests] == [
+        "place-sweet",
+        "place-golden",
+    ]
+    assert (state.position, state.fetched, state.completed_at) == (2, 2, None)
+    # What was fetched went into a new snapshot build.
+    assert state.build_id != dataset.store.version
+    assert Checkpoint.load(prewarm.checkpoint_path("tiny")) == state
+
+    dataset.reload()
+    assert dataset.store.enrichment(0)["rating"][0] == {
+        "google_rating": 4.5,
+        "google_review_count": 120,
+    }
+    server.requests.clear()
+    state = _run(
+        dataset,
+        server,
+        cache_path,
+        DailyQuota(10, str(tmp_path / "quota-tomorrow.json")),
+    )
+    # Only the row the quota stopped at; the closed bakery is skipped.
+    assert server.requests == [("details", "place-corner")]
+    assert (state.position, state.fetched, state.skipped) == (0, 3, 1)
+    assert state.completed_at is not None
@@ -0,0 +1,43 @@
+"""Cursors of directory searches"""
+
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from city_explorer.directory.query import SearchQuery, decode_cursor, encode_cursor
+
+
+def _now_query(moment: datetime) -> SearchQuery:
+    return SearchQuery(
+        category="restaurant", sort="least_busy", open_at=moment, open_at_input="now"
+    )
+
+
+def test_now_cursor_resumes_at_the_first_page_moment():
+    first = datetime(2025, 6, 14, 18, 29, tzinfo=timezone.utc)
+    cursor = encode_cursor(_now_query(first), 5, "v1")
+
+    # The next page is asked for after the minute rolled over.
+    later = replace(_now_query(first + timedelta(minutes=1)), cursor=cursor)
+    query, offset = decode_cursor(later, "v1")
+    assert offset == 5
+    assert query.open_at == first
+    assert query.normalized() == _now_query(first).normalized()
+
+
+def test_cursor_from_a_fixed_time_does_not_fit_another_time():
+    first = SearchQuery(
+        category="restaurant",
+        open_at=datetime(2025, 6, 14, 18, 30),
+        open_at_input="2025-06-14T18:30",
+    )
+    cursor = encode_cursor(first, 5)
+    other = replace(
+        first,
+        open_at=datetime(2025, 6, 14, 19, 30),
+        open_at_input="2025-06-14T19:30",
+        cursor=cursor,
+    )
+    with pytest.raises(ValueError, match="does not belong"):
+        decode_cursor(other)
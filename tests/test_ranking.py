@@ -0,0 +1,14 @@
+"""Page selection over ranked directory matches"""
+
+import numpy as np
+
+from city_explorer.directory.ranking import top_k
+
+
+def test_top_k_matches_a_stable_sort_with_ties():
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 5, size=200).astype(np.float64)
+    scores[::17] = -np.inf
+    full = np.argsort(-scores, kind="stable")
+    for k in (0, 1, 7, 50, 199, 200, 250):
+        assert top_k(scores, k).tolist() == full[:k].tolist()
@@ -0,0 +1,70 @@
+"""Pre-rendered result records against serializing each business on the fly"""
+
+from datetime import datetime
+
+from starlette.responses import JSONResponse
+
+from city_explorer.directory.ingest import business_id
+from city_explorer.directory.query import SearchQuery
+from city_explorer.directory.records import (
+    DEFAULT_STATUS,
+    HEAD_FIELDS,
+    HOURS_FIELD,
+    TAIL_FIELDS,
+)
+
+
+def _business(store, row, hours=True, **extras):
+    """A result object built the slow way, from one store row"""
+    fields = HEAD_FIELDS + ([HOURS_FIELD] if hours else []) + TAIL_FIELDS
+    business = {key: store.value(row, column) for key, column in fields}
+    status = store.value(row, "business_status")
+    if status and status != DEFAULT_STATUS:
+        business["business_status"] = status
+    return {**business, **extras}
+
+
+def test_every_fragment_is_byte_identical_to_a_json_response(oakland_engine):
+    store, records = oakland_engine.store, oakland_engine.records
+    for row in range(len(store)):
+        assert records.fragment(row) == JSONResponse(_business(store, row)).body
+
+
+def test_rendered_pages_splice_in_per_query_extras(oakland_engine):
+    store = oakland_engine.store
+    query = SearchQuery(
+        category="restaurant",
+        lat=37.8044,
+        lon=-122.2712,
+        open_at=datetime(2025, 6, 14, 12),
+        sort="least_busy",
+        limit=10,
+    )
+    result = oakland_engine.search(query)
+    assert result.rows
+    expected = [
+        _business(
+            store,
+            row,
+            hours=False,
+            distance_m=round(distance),
+            open_until=until,
+            busyness_pct=busyness,
+        )
+        for row, distance, until, busyness in zip(
+            result.rows, result.distance_m, result.open_until, result.busyness
+        )
+    ]
+    assert oakland_engine.records.render(result) == JSONResponse(expected).body
+
+
+def test_edited_rows_are_rendered_again(tiny_engine):
+    row = tiny_engine.upsert(
+        business_id("place-sweet"),
+        {"phone": "(510) 555-0199", "business_status": "CLOSED_TEMPORARILY"},
+    )
+    assert (
+        tiny_engine.records.fragment(row)
+        == JSONResponse(_business(tiny_engine.store, row)).body
+    )
+    assert tiny_engine.records.business(row)["business_status"] == "CLOSED_TEMPORARILY"
@@ -0,0 +1,66 @@
+"""Lazy per-city loading and eviction under the memory budget"""
+
+import shutil
+
+import pytest
+
+from city_explorer.directory.memory import snapshot_bytes
+from city_explorer.directory.query import SearchQuery
+from city_explorer.directory.registry import CSV_SUFFIX, DatasetRegistry
+
+
+@pytest.fixture
+def cities_dir(tiny_csv, tmp_path):
+    """A data directory with the tiny directory as two cities"""
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for city in ("Alpha", "Beta_Town"):
+        shutil.copy(tiny_csv, data_dir / f"{city}{CSV_SUFFIX}")
+    return data_dir
+
+
+def test_cities_are_discovered_without_loading(cities_dir):
+    registry = DatasetRegistry(str(cities_dir))
+    assert registry.cities() == ["alpha", "beta_town"]
+    assert not any(city["loaded"] for city in registry.stats())
+    assert not (cities_dir / "snapshots").exists()
+
+    registry.engine("Beta Town")
+    assert [city["loaded"] for city in registry.stats()] == [False, True]
+    with pytest.raises(ValueError, match="Available cities: Alpha, Beta Town"):
+        registry.dataset("Gamma")
+
+
+def test_footprint_counts_the_engine_heap_and_live_rows(cities_dir):
+    registry = DatasetRegistry(str(cities_dir))
+    dataset = registry.dataset("alpha")
+    assert dataset.footprint() == 0
+    dataset.store
+    mapped = snapshot_bytes(dataset.source.snapshot_dir)["mapped_bytes"]
+    assert dataset.footprint() == mapped
+
+    dataset.engine
+    built = dataset.footprint()
+    assert built > mapped
+    dataset.upsert(
+        {"name": "New Bakery", "description": "x" * 10000}, place_id="place-new"
+    )
+    assert dataset.footprint() > built + 10000
+
+
+def test_least_recently_used_city_is_evicted_over_budget(cities_dir):
+    registry = DatasetRegistry(str(cities_dir))
+    alpha = registry.engine("alpha")
+    one_city = registry.dataset("alpha").footprint()
+    registry.memory_budget = int(one_city * 1.5)
+
+    beta = registry.engine("beta_town")
+    assert [city["loaded"] for city in registry.stats()] == [False, True]
+    # Alpha's engine keeps working for whoever still holds it.
+    query = SearchQuery(category="bakery")
+    assert alpha.search(query).total == beta.search(query).total == 2
+
+    # The city being asked for is kept even when it alone is over budget.
+    registry.memory_budget = 1
+    registry.engine("alpha")
+    assert [city["loaded"] for city in registry.stats()] == [True, False]
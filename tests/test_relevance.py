@@ -0,0 +1,40 @@
+"""BM25F keyword relevance and the Bayesian rating prior"""
+
+import numpy as np
+import pytest
+
+from city_explorer.directory.query import SearchQuery
+from city_explorer.directory.ranking import BAYES_CONFIDENCE, TEXT_WEIGHT
+
+
+def test_rating_prior_shrinks_few_reviews_towards_the_mean(tiny_engine):
+    ranker = tiny_engine.ranker
+    # Every row's histogram, the closed one's included
+    prior = (5 + 720 * 5 + 180 * 4 + 50 * 4 + 10 * 5 + 10 * 4) / (1 + 900 + 50 + 20)
+    assert ranker.rating_prior == pytest.approx(prior)
+    assert ranker.smoothed_rating[0] == pytest.approx(
+        (BAYES_CONFIDENCE * prior + 5) / (BAYES_CONFIDENCE + 1)
+    )
+
+    # A 5.0 from one review ranks below a 4.8 from nine hundred.
+    result = tiny_engine.search(SearchQuery(category="", sort="rating", limit=10))
+    assert result.rows == [1, 0, 2]
+
+
+def test_name_hits_outrank_description_hits(tiny_engine):
+    result = tiny_engine.search(SearchQuery(category="", keyword="bakery", limit=10))
+    assert sorted(result.rows[:2]) == [0, 1]
+    assert result.rows[2] == 2
+    scores = tiny_engine.ranker.bm25("bakery", tiny_engine.keyword_rows("bakery"))
+    assert scores[2] < min(scores[0], scores[1])
+
+
+def test_relevance_blends_normalized_text_score_with_rating(tiny_engine):
+    ranker = tiny_engine.ranker
+    rows = tiny_engine.keyword_rows("bakery")
+    text = ranker.bm25("bakery", rows)
+    expected = (
+        TEXT_WEIGHT * text / text.max()
+        + (1 - TEXT_WEIGHT) * ranker.smoothed_rating[rows] / 5
+    )
+    np.testing.assert_allclose(ranker.scores(rows, "bakery"), expected)
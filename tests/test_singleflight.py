@@ -0,0 +1,122 @@
+"""Coalescing of identical concurrent upstream calls"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from city_explorer.places import (
+    AsyncSingleFlight,
+    PlacesEnricher,
+    SingleFlight,
+    flight_meter,
+)
+
+
+def test_concurrent_threads_share_one_call():
+    flights = SingleFlight("test_threads")
+    calls = []
+    started = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return {"name": "Sweet Bakery"}
+
+    results = []
+    leader = threading.Thread(
+        target=lambda: results.append(flights.do("place-sweet", fetch))
+    )
+    leader.start()
+    started.wait()
+    followers = [
+        threading.Thread(
+            target=lambda: results.append(flights.do("place-sweet", fetch))
+        )
+        for _ in range(4)
+    ]
+    for thread in followers:
+        thread.start()
+    for thread in [leader, *followers]:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"name": "Sweet Bakery"}] * 5 and all(
+        result is results[0] for result in results
+    )
+    assert flight_meter.stats()["test_threads"] == {
+        "calls": 5,
+        "upstream_calls": 1,
+        "coalesced": 4,
+        "saved_pct": 80.0,
+    }
+    # Nothing is kept once the call is done.
+    flights.do("place-sweet", fetch)
+    assert len(calls) == 2
+
+
+def test_every_waiting_caller_sees_the_exception():
+    flights = AsyncSingleFlight("test_errors")
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        return await asyncio.gather(
+            *(flights.do("key", fail) for _ in range(3)), return_exceptions=True
+        )
+
+    errors = asyncio.run(run())
+    assert len(calls) == 1
+    assert [str(error) for error in errors] == ["upstream down"] * 3
+
+    def fail_now():
+        raise RuntimeError("upstream down")
+
+    flights_sync = SingleFlight("test_errors")
+    with pytest.raises(RuntimeError, match="upstream down"):
+        flights_sync.do("key", fail_now)
+    # The failed call is forgotten: the next caller tries again.
+    assert flights_sync.do("key", lambda: "recovered") == "recovered"
+
+
+def test_caller_giving_up_does_not_cancel_the_shared_call():
+    flights = AsyncSingleFlight("test_cancel")
+
+    async def fetch():
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def run():
+        impatient = asyncio.ensure_future(
+            asyncio.wait_for(flights.do("key", fetch), 0.02)
+        )
+        patient = asyncio.ensure_future(flights.do("key", fetch))
+        with pytest.raises(asyncio.TimeoutError):
+            await impatient
+        return await patient
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_rows_for_the_same_place_make_one_request(places_server):
+    server = places_server(latency_s=0.05)
+    enricher = PlacesEnricher(
+        base_url=server.base_url, cache_path=None, request_budget_s=None
+    )
+    try:
+        enriched = enricher.enrich(
+            [{"name": "Sweet Bakery"}] * 3,
+            api_key="stub",
+            place_ids=["place-sweet"] * 3,
+        )
+    finally:
+        enricher.close()
+
+    assert server.requests == [("details", "place-sweet")]
+    assert [row["google_rating"] for row in enriched] == [4.5] * 3
@@ -0,0 +1,49 @@
+"""Keyword lookups in the inverted token index"""
+
+import numpy as np
+
+from city_explorer.directory.text_index import TextIndex, tokenize
+
+FIELDS = {
+    "name": ["Sweet Bakery", "Bay Fish Market", "The Bake Shop", None],
+    "description": [
+        "Cakes & pies since 1990",
+        "Fresh fish daily",
+        "Sourdough, cakes",
+        "Tacos",
+    ],
+}
+
+
+def _text_of(row, field):
+    return FIELDS[field][row]
+
+
+def test_tokenize_lowercases_words_and_drops_punctuation():
+    assert tokenize("Cakes & Pies, since 1990!") == ["cakes", "pies", "since", "1990"]
+
+
+def test_keywords_match_substrings_of_tokens_across_fields():
+    index = TextIndex(FIELDS, rows=4)
+    assert index.search("bak", _text_of).tolist() == [0, 2]
+    assert index.search("AKERY", _text_of).tolist() == [0]
+    assert index.search("cakes", _text_of).tolist() == [0, 2]
+    assert index.search("ta", _text_of).tolist() == [3]
+    assert index.search("pizza", _text_of).tolist() == []
+
+
+def test_phrases_are_verified_against_the_source_text():
+    index = TextIndex(FIELDS, rows=4)
+    # Both words occur in row 0, but only row 2 has them together.
+    assert index.search("bake shop", _text_of).tolist() == [2]
+    assert index.search("cakes & pies", _text_of).tolist() == [0]
+
+
+def test_appended_rows_are_found():
+    index = TextIndex(FIELDS, rows=4)
+    index.add_row(4, {"name": "Bakeless Kitchen", "description": "Vegan cakes"})
+    assert index.search("bake", _text_of).tolist() == [0, 2, 4]
+    assert index.search("vegan", _text_of).tolist() == [4]
+    rows, freqs = index.fragment_postings("cakes")
+    assert rows.tolist() == [0, 2, 4]
+    np.testing.assert_array_equal(freqs, [[0, 1], [0, 1], [0, 1]])
@@ -0,0 +1,118 @@
+"""Compact, token-budgeted search results for tools"""
+
+import json
+import re
+
+import pytest
+
+from city_explorer.directory.query import SearchQuery
+from city_explorer.directory.tool_output import (
+    BASE_FIELDS,
+    compact_businesses,
+    count_tokens,
+    dumps,
+    expand_link,
+    link_ref,
+    short_hours,
+)
+
+
+def _page(engine, query):
+    return json.loads(engine.records.render(engine.search(query)))
+
+
+def test_only_wanted_fields_are_projected(oakland_engine):
+    query = SearchQuery(category="restaurant", limit=5)
+    items = compact_businesses(_page(oakland_engine, query), query)
+    assert items and all(set(item) <= set(BASE_FIELDS) for item in items)
+    assert all(
+        not re.search(r"[A-Z]{2} \d{5}$", item["address"])
+        for item in items
+        if "address" in item
+    )
+
+    items = compact_businesses(
+        _page(oakland_engine, query), query, fields=["phone", "hours"]
+    )
+    assert any("phone" in item for item in items)
+    assert all("description" not in item for item in items)
+    with pytest.raises(ValueError, match="Unknown fields"):
+        compact_businesses([], query, fields=["photos"])
+
+
+def _business(i, description):
+    return {
+        "id": i,
+        "name": f"Business {i}",
+        "type": "Bakery",
+        "address": f"{i} Main St, Oakland, CA 94612",
+        "rating": 4.5,
+        "description": description,
+    }
+
+
+def test_text_searches_carry_a_description():
+    query = SearchQuery(category="", keyword="bread")
+    items = compact_businesses([_business(1, "Bread baked overnight")], query)
+    assert items == [
+        {
+            "id": 1,
+            "name": "Business 1",
+            "type": "Bakery",
+            "address": "1 Main St, Oakland",
+            "rating": 4.5,
+            "description": "Bread baked overnight",
+        }
+    ]
+    assert (
+        "description"
+        not in compact_businesses(
+            [_business(1, "Bread")], SearchQuery(category="bakery")
+        )[0]
+    )
+
+
+def test_link_refs_round_trip(oakland_engine):
+    query = SearchQuery(category="restaurant", limit=10)
+    businesses = _page(oakland_engine, query)
+    items = compact_businesses(businesses, query, fields=["website", "google_maps"])
+    for business, item in zip(businesses, items):
+        for field in ("website", "google_maps"):
+            if business.get(field):
+                assert item[field] == link_ref(business["id"], field)
+                assert expand_link(oakland_engine, item[field]) == business[field]
+    assert expand_link(oakland_engine, "zzzzzzzz.m") is None
+    assert expand_link(oakland_engine, "not a ref") is None
+
+
+def test_descriptions_are_cut_to_fit_the_budget():
+    query = SearchQuery(category="", keyword="bread")
+    businesses = [
+        _business(i, "Fresh sourdough and rye bread every morning. " * 20)
+        for i in range(10)
+    ]
+    bare = count_tokens(
+        dumps(compact_businesses(businesses, SearchQuery(category="bakery")))
+    )
+    for budget in (bare + 200, bare + 400, 2000):
+        items = compact_businesses(businesses, query, max_tokens=budget)
+        assert count_tokens(dumps(items)) <= budget
+        assert all(item["description"].endswith("…") for item in items)
+    # Too little room for a useful snippet: leave descriptions out
+    items = compact_businesses(businesses, query, max_tokens=bare + 10)
+    assert all("description" not in item for item in items)
+
+
+def test_short_hours_folds_equal_days():
+    hours = json.dumps(
+        {
+            "Monday": "9AM-5PM",
+            "Tuesday": "9AM-5PM",
+            "Wednesday": "9AM-5PM",
+            "Thursday": "9AM-5PM",
+            "Friday": "9AM-9PM",
+            "Saturday": "Closed",
+            "Sunday": "Closed",
+        }
+    )
+    assert short_hours(hours) == "Mon-Thu 9AM-5PM; Fri 9AM-9PM; Sat-Sun Closed"
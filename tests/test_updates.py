@@ -0,0 +1,244 @@
+"""
+Change log numbering, compaction and catch-up of live directory edits,
+and searches running during them
+"""
+
+import os
+import shutil
+import sys
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from city_explorer.directory.ingest import business_id
+from city_explorer.directory.query import SearchQuery
+from city_explorer.directory.registry import CSV_SUFFIX, DatasetRegistry
+from city_explorer.directory.snapshot import (
+    DATA_DIR,
+    KEEP_VERSIONS,
+    VERSIONS_SUFFIX,
+    build_snapshot,
+    read_meta,
+)
+from city_explorer.directory.updates import ChangeLog, read_source, write_source
+
+SOURCE_CSV = os.path.join(DATA_DIR, f"Oakland{CSV_SUFFIX}")
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """A data directory with a copy of the Oakland CSV, no snapshot or log yet"""
+    shutil.copy(SOURCE_CSV, tmp_path / f"Oakland{CSV_SUFFIX}")
+    return tmp_path
+
+
+@pytest.fixture
+def edited_business(data_dir):
+    """A business whose phone number appears once in the CSV: (business id, phone)"""
+    df = read_source(str(data_dir / f"Oakland{CSV_SUFFIX}"))
+    raw = (data_dir / f"Oakland{CSV_SUFFIX}").read_bytes()
+    for place_id, phone in zip(df["place_id"], df["phone"]):
+        if (
+            place_id
+            and phone
+            and raw.count(phone.encode()) == 1
+            and (df["place_id"] == place_id).sum() == 1
+        ):
+            return business_id(place_id), phone
+    pytest.skip("No business with a unique phone number in the sample data")
+
+
+def test_sequence_numbers_keep_increasing_after_truncate(tmp_path):
+    log = ChangeLog(str(tmp_path / "wal" / "oakland.jsonl"))
+    assert [log.append("upsert", 1, {"phone": str(n)})["seq"] for n in range(3)] == [
+        1,
+        2,
+        3,
+    ]
+    log.truncate(3)
+    assert log.entries() == []
+    assert log.append("upsert", 1, {"phone": "4"})["seq"] == 4
+    # A second log object (another worker) numbers from the same place.
+    assert ChangeLog(log.path).append("delete", 1)["seq"] == 5
+
+
+def test_edits_after_compaction_are_applied(data_dir, edited_business):
+    bid, _ = edited_business
+    dataset = DatasetRegistry(str(data_dir)).dataset("oakland")
+
+    assert dataset.upsert({"phone": "111"}, business_id=bid) == bid
+    assert dataset.compact() is not None
+    assert dataset.pending_changes() == 0
+    assert dataset.upsert({"phone": "222"}, business_id=bid) == bid
+
+    store = dataset.store
+    assert store.value(store.row_of(bid), "phone") == "222"
+    # A worker starting now replays the post-compaction edit on the new snapshot.
+    fresh = DatasetRegistry(str(data_dir)).dataset("oakland").store
+    assert fresh.value(fresh.row_of(bid), "phone") == "222"
+
+
+def test_source_csv_round_trips_byte_for_byte(data_dir):
+    csv_path = str(data_dir / f"Oakland{CSV_SUFFIX}")
+    original = (data_dir / f"Oakland{CSV_SUFFIX}").read_bytes()
+    write_source(read_source(csv_path), csv_path)
+    assert (data_dir / f"Oakland{CSV_SUFFIX}").read_bytes() == original
+
+
+def test_compaction_changes_only_edited_cells(data_dir, edited_business):
+    bid, phone = edited_business
+    original = (data_dir / f"Oakland{CSV_SUFFIX}").read_bytes()
+    dataset = DatasetRegistry(str(data_dir)).dataset("oakland")
+
+    new_phone = "+1 510-555-0199"
+    dataset.upsert({"phone": new_phone}, business_id=bid)
+    dataset.compact()
+
+    expected = original.replace(phone.encode(), new_phone.encode())
+    assert (data_dir / f"Oakland{CSV_SUFFIX}").read_bytes() == expected
+
+
+def test_searches_during_live_edits(data_dir):
+    engine = DatasetRegistry(str(data_dir)).dataset("oakland").engine
+    store = engine.store
+    template = {**store.details(3), **store.record(3)}
+    moment = datetime(2024, 5, 6, 18, tzinfo=timezone.utc)
+    queries = [
+        SearchQuery(category="", open_at=moment, sort="least_busy", facets=True),
+        SearchQuery(
+            category="store",
+            keyword="african",
+            open_at=moment,
+            lat=37.84,
+            lon=-122.27,
+            radius_m=5000,
+        ),
+        SearchQuery(
+            category="",
+            keyword="afriacn",
+            attributes=("black-owned",),
+            lat=37.84,
+            lon=-122.27,
+        ),
+    ]
+    # Switch threads as often as possible, so searches land inside edits.
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    stop = threading.Event()
+    errors = []
+
+    def search():
+        while not stop.is_set():
+            for query in queries:
+                try:
+                    engine.search(query)
+                    engine.autocomplete.suggest("afr")
+                except Exception as e:  # noqa: BLE001 - reported by the assertion below
+                    errors.append(e)
+                    return
+
+    readers = [threading.Thread(target=search) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    try:
+        for n in range(150):
+            # New labels, attributes and words grow every index, not just its rows.
+            engine.upsert(
+                10**15 + n,
+                {
+                    **template,
+                    "name": f"Store {n} African",
+                    "category": f"Store {n}",
+                    "about": '{"From the business": {"Feature %d": true}}' % n,
+                },
+            )
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+        sys.setswitchinterval(switch_interval)
+    assert not errors, errors[0]
+    assert engine.search(SearchQuery(category="store 149")).total == 1
+
+
+def test_ranking_computed_during_an_edit_is_not_cached(data_dir, edited_business):
+    bid, _ = edited_business
+    engine = DatasetRegistry(str(data_dir)).dataset("oakland").engine
+    query = SearchQuery(category="")
+    row = engine.store.row_of(bid)
+    rank = engine._rank
+
+    def rank_then_close(*args):
+        # The edit lands after this ranking read the indexes, before it is cached.
+        ranking = rank(*args)
+        engine.upsert(bid, {"business_status": "CLOSED_PERMANENTLY"})
+        return ranking
+
+    engine._rank = rank_then_close
+    assert row in engine.ranked(query).rows
+    engine._rank = rank
+    assert row not in engine.ranked(query).rows
+    assert engine.store.row_of(bid) not in engine.ranked(query).rows
+
+
+def test_retired_business_takes_its_suggestions_along(data_dir):
+    dataset = DatasetRegistry(str(data_dir)).dataset("oakland")
+    base = dataset.engine.autocomplete.suffixes
+    fields = {
+        "name": "Zyzzyva Bakery",
+        "category": "Zyzzyva kitchen",
+        "subtypes": "Zyzzyva kitchen, Qwerty deli",
+    }
+    first = dataset.upsert(fields, place_id="test-zyzzyva-1")
+    second = dataset.upsert(
+        {**fields, "name": "Zyzzyva Annex"}, place_id="test-zyzzyva-2"
+    )
+
+    autocomplete = dataset.engine.autocomplete
+    assert autocomplete.suffixes is base
+    suggested = {(s["kind"], s["text"]) for s in autocomplete.suggest("zyzz", limit=10)}
+    assert suggested == {
+        ("business", "Zyzzyva Bakery"),
+        ("business", "Zyzzyva Annex"),
+        ("category", "Zyzzyva kitchen"),
+        ("subtype", "Zyzzyva kitchen"),
+    }
+
+    # The category is still carried by the second business.
+    assert dataset.delete(first)
+    suggested = {(s["kind"], s["text"]) for s in autocomplete.suggest("zyzz", limit=10)}
+    assert ("business", "Zyzzyva Bakery") not in suggested
+    assert ("category", "Zyzzyva kitchen") in suggested
+
+    assert (
+        dataset.upsert({"business_status": "CLOSED_PERMANENTLY"}, business_id=second)
+        == second
+    )
+    assert autocomplete.suggest("zyzz", limit=10) == []
+    assert autocomplete.suggest("qwerty", limit=10) == []
+
+
+def test_snapshot_never_goes_missing_during_rebuilds(data_dir):
+    csv_path = str(data_dir / f"Oakland{CSV_SUFFIX}")
+    snapshot_dir = str(data_dir / "snapshots" / "oakland")
+    build_snapshot(csv_path, snapshot_dir)
+    done = threading.Event()
+    missing = []
+
+    def read():
+        while not done.is_set():
+            if read_meta(snapshot_dir) is None:
+                missing.append(True)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        for _ in range(3):
+            build_snapshot(csv_path, snapshot_dir)
+    finally:
+        done.set()
+        reader.join()
+    assert not missing
+    assert os.path.islink(snapshot_dir)
+    assert len(os.listdir(f"{snapshot_dir}{VERSIONS_SUFFIX}")) == KEEP_VERSIONS